@@ -1,26 +1,51 @@
 # /core/config_manager.py
 import configparser
 import os
+import threading
 
 CONFIG_FILE = 'config.ini'
 ACCOUNTS_FILE = 'accounts.ini'
 
+# File ini đã đọc: đường dẫn -> (mtime, ConfigParser); chỉ đọc lại khi file thay đổi
+_parsed = {}
+_parsed_lock = threading.Lock()
+
+def _read(path):
+    """ConfigParser của file ini (None nếu không có file), giữ lại giữa các lần gọi trong tiến trình."""
+    try: mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError: return None
+    with _parsed_lock:
+        cached = _parsed.get(path)
+        if cached and cached[0] == mtime: return cached[1]
+        config = configparser.ConfigParser()
+        config.read(path)
+        _parsed[path] = (mtime, config)
+        return config
+
 def get_category_config(category_name):
     """Đọc cấu hình cho một danh mục từ config.ini."""
-    if not os.path.exists(CONFIG_FILE):
-        return None
-    config = configparser.ConfigParser()
-    config.read(CONFIG_FILE)
-    if category_name in config:
+    config = _read(CONFIG_FILE)
+    if config is not None and category_name in config:
         return dict(config[category_name])
     return None
 
+def get_categories():
+    """Tên các danh mục trong config.ini (section có excel_file), theo thứ tự trong file."""
+    config = _read(CONFIG_FILE)
+    if config is None: return []
+    return [name for name in config.sections() if 'excel_file' in config[name]]
+
 def get_account_creds(service_name):
     """Đọc thông tin tài khoản cho một dịch vụ từ accounts.ini."""
-    if not os.path.exists(ACCOUNTS_FILE):
-        return None
-    config = configparser.ConfigParser()
-    config.read(ACCOUNTS_FILE)
-    if service_name in config:
+    config = _read(ACCOUNTS_FILE)
+    if config is not None and service_name in config:
         return dict(config[service_name])
     return None
+
+def get_settings(section_name, defaults=None):
+    """Đọc một section cài đặt chung (không phải danh mục) từ config.ini, trộn với giá trị mặc định."""
+    settings = dict(defaults or {})
+    config = _read(CONFIG_FILE)
+    if config is not None and section_name in config:
+        settings.update(dict(config[section_name]))
+    return settings
@@ -0,0 +1,57 @@
+# /core/content_index.py
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from . import probe_cache
+
+# Hash mẫu đọc phần đầu và phần cuối file, mỗi phần SAMPLE_SIZE byte
+SAMPLE_SIZE = 1024 * 1024
+CHUNK_SIZE = 8 * 1024 * 1024
+MODES = ['sample', 'full']
+# Giá trị mặc định cho section [content_index] trong config.ini
+DEFAULT_SETTINGS = {'mode': 'sample', 'workers': 4}
+
+def sample_hash(file_path):
+    """Hash nhanh từ kích thước + phần đầu + phần cuối file (đọc tối đa 2 * SAMPLE_SIZE byte dù file lớn cỡ nào)."""
+    size = os.path.getsize(file_path)
+    h = hashlib.sha1(str(size).encode())
+    with open(file_path, 'rb') as f:
+        h.update(f.read(SAMPLE_SIZE))
+        if size > SAMPLE_SIZE:
+            f.seek(max(SAMPLE_SIZE, size - SAMPLE_SIZE))
+            h.update(f.read(SAMPLE_SIZE))
+    return h.hexdigest()
+
+def full_hash(file_path):
+    h = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''): h.update(chunk)
+    return h.hexdigest()
+
+def file_hashes(file_path, mode='sample', ident=None):
+    """
+    (hash mẫu, hash toàn bộ hoặc None) của một file. Kết quả được lưu trong cache probe nên chỉ tính
+    lại khi file đổi kích thước/mtime/inode; file chỉ đổi tên không bị đọc lại.
+    """
+    if mode not in MODES: raise ValueError(f"Chế độ hash không hợp lệ: {mode}")
+    cache = probe_cache.get_cache()
+    sample = cache.get(file_path, 'hash:sample', lambda: sample_hash(file_path), ident)
+    full = cache.get(file_path, 'hash:full', lambda: full_hash(file_path), ident) if mode == 'full' else None
+    return sample, full
+
+def index_files(paths, mode='sample', workers=DEFAULT_SETTINGS['workers'], identities=None):
+    """
+    Hash song song nhiều file; trả về dict đường dẫn -> (hash mẫu, hash toàn bộ). File không đọc được bị bỏ qua.
+    identities: dict đường dẫn -> định danh file đã biết (vd. từ dir_scanner), để khỏi stat lại từng file.
+    """
+    identities = identities or {}
+
+    def index(path):
+        try: return path, file_hashes(path, mode, identities.get(path))
+        except OSError as e:
+            print(f" -> Không hash được {os.path.basename(path)}: {e}")
+            return path, None
+
+    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+        return {path: hashes for path, hashes in pool.map(index, paths) if hashes}
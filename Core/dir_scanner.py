@@ -0,0 +1,174 @@
+# /core/dir_scanner.py
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# Có thể đổi qua biến môi trường (dùng chung cho cả khi chạy worker dạng subprocess)
+SNAPSHOT_FILE = os.environ.get('JAVSHARE_SCAN_SNAPSHOT', 'scan_snapshot.db')
+# Giá trị mặc định cho section [scanner] trong config.ini
+DEFAULT_SETTINGS = {'trust_dir_mtime': 'auto', 'settle_seconds': 60}
+# Filesystem mà mtime thư mục không chắc đổi khi file bên trong đổi (Drive FUSE, ổ mạng): 'auto' sẽ không tin mtime
+UNTRUSTED_FS_PREFIXES = ('fuse', 'nfs', 'cifs', 'smb', '9p', 'sshfs', 'davfs')
+# Độ phân giải mtime thô nhất thường gặp (FAT, một số FUSE): thư mục vừa đổi trong khoảng này thì luôn quét lại
+MTIME_GRANULARITY = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    directory TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    scanned_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    dev INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    PRIMARY KEY (directory, name)
+);
+"""
+
+class Entry(namedtuple('Entry', 'path size mtime_ns dev inode')):
+    @property
+    def identity(self):
+        """Cùng dạng với probe_cache.file_identity, dùng được để tra cache mà không cần stat lại."""
+        return self.dev, self.inode, self.size, self.mtime_ns
+
+# entries: tên -> Entry của mọi file hiện có; added/changed/removed: tên file thay đổi so với lần quét trước
+Scan = namedtuple('Scan', 'entries added changed removed')
+
+def _entry(path, st):
+    return Entry(path, st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino)
+
+def _unescape_mount(field):
+    # /proc/mounts ghi khoảng trắng, tab... trong đường dẫn dạng \040
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), field)
+
+def fs_type(path):
+    """Loại filesystem chứa path (đọc /proc/mounts, lấy điểm mount dài nhất khớp); None nếu không xác định được."""
+    path = os.path.realpath(path)
+    best, best_type = '', None
+    try:
+        with open('/proc/mounts', encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3: continue
+                mount_point = _unescape_mount(fields[1])
+                if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) and len(mount_point) >= len(best):
+                    best, best_type = mount_point, fields[2]
+    except OSError: return None
+    return best_type
+
+def trusts_dir_mtime(path):
+    """mtime thư mục có đổi đáng tin cậy khi file bên trong đổi không (không với FUSE/ổ mạng hoặc không rõ loại)."""
+    kind = fs_type(path)
+    return kind is not None and not kind.startswith(UNTRUSTED_FS_PREFIXES)
+
+class DirScanner:
+    """
+    Liệt kê file trong thư mục bằng os.scandir và lưu ảnh chụp (tên, kích thước, mtime, inode) vào SQLite.
+    Nếu mtime của thư mục không đổi từ lần quét trước thì không đọc lại thư mục, chỉ stat lại các file còn
+    đang được ghi (mtime trong vòng settle_seconds lúc quét). trust_dir_mtime: True/False, hoặc 'auto' để chỉ
+    làm vậy trên filesystem cục bộ.
+    Trên FUSE (Drive)/ổ mạng, mtime thư mục không chắc đổi nên thư mục luôn được đọc lại, nhưng mỗi stat là
+    một lần gọi từ xa: file có cùng tên và inode (scandir trả về sẵn, không tốn stat) với ảnh chụp và đã ghi
+    xong được dùng lại, chỉ file mới, bị thay (inode khác) hoặc còn đang ghi mới bị stat. File bị ghi đè tại
+    chỗ (cùng inode) sau khi đã ghi xong thì không được nhận ra ở đó.
+    """
+
+    def __init__(self, path=SNAPSHOT_FILE, trust_dir_mtime='auto', settle_seconds=DEFAULT_SETTINGS['settle_seconds']):
+        self.path = path
+        self.trust_dir_mtime = trust_dir_mtime
+        # Kết quả 'auto' theo từng thư mục
+        self.trusted = {}
+        self.settle_seconds = float(settle_seconds)
+        self.lock = threading.Lock()
+        # Ảnh chụp đã đọc/ghi trong tiến trình này: thư mục -> ((mtime thư mục, thời điểm quét), entries)
+        self.snapshots = {}
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.executescript(SCHEMA)
+
+    def _load(self, directory):
+        if directory in self.snapshots: return self.snapshots[directory]
+        with self.lock:
+            row = self.conn.execute('SELECT mtime_ns, scanned_at FROM dirs WHERE directory=?', (directory,)).fetchone()
+            rows = self.conn.execute('SELECT name, size, mtime_ns, dev, inode FROM entries WHERE directory=?', (directory,)).fetchall()
+        return row, {name: Entry(os.path.join(directory, name), *rest) for name, *rest in rows}
+
+    def _list(self, directory, old, settled_before):
+        # Ổ cục bộ (inode của file vừa xoá được dùng lại ngay) thì stat hết, stat ở đó rất rẻ
+        if self._trusted(directory): old = {}
+        entries = {}
+        with os.scandir(directory) as it:
+            for e in it:
+                known = old.get(e.name)
+                try:
+                    if known and e.inode() == known.inode and known.mtime_ns / 1e9 <= settled_before:
+                        entries[e.name] = known
+                    elif e.is_file(): entries[e.name] = _entry(e.path, e.stat())
+                except OSError: pass  # File bị xoá trong lúc quét
+        return entries
+
+    def _restat(self, entries, names):
+        for name in names:
+            try: entries[name] = _entry(entries[name].path, os.stat(entries[name].path))
+            except FileNotFoundError: del entries[name]
+
+    def _trusted(self, directory):
+        if self.trust_dir_mtime != 'auto': return bool(self.trust_dir_mtime)
+        if directory not in self.trusted: self.trusted[directory] = trusts_dir_mtime(directory)
+        return self.trusted[directory]
+
+    def scan(self, directory):
+        """Quét thư mục, cập nhật ảnh chụp và trả về Scan (mọi file hiện có và các file thay đổi từ lần quét trước)."""
+        directory = os.path.abspath(directory)
+        dir_mtime = os.stat(directory).st_mtime_ns
+        now = time.time()
+        row, old = self._load(directory)
+
+        settled_before = row[1] - self.settle_seconds if row else float('-inf')
+        if (self._trusted(directory) and row and row[0] == dir_mtime
+                and dir_mtime / 1e9 < row[1] - MTIME_GRANULARITY):
+            entries = dict(old)
+            self._restat(entries, [n for n, e in old.items() if e.mtime_ns / 1e9 > settled_before])
+        else:
+            entries = self._list(directory, old, settled_before)
+
+        added = sorted(n for n in entries if n not in old)
+        changed = sorted(n for n in entries if n in old and entries[n] != old[n])
+        removed = sorted(n for n in old if n not in entries)
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)', (directory, dir_mtime, now))
+            self.conn.executemany('DELETE FROM entries WHERE directory=? AND name=?', [(directory, n) for n in removed])
+            self.conn.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                                  [(directory, n) + tuple(entries[n][1:]) for n in added + changed])
+        self.snapshots[directory] = ((dir_mtime, now), entries)
+        return Scan(dict(entries), added, changed, removed)
+
+    def close(self):
+        with self.lock: self.conn.close()
+
+_scanner = None
+_scanner_lock = threading.Lock()
+
+def get_scanner(settings=None):
+    """Scanner dùng chung trong tiến trình; lần gọi đầu quyết định cấu hình (section [scanner])."""
+    global _scanner
+    with _scanner_lock:
+        if _scanner is None:
+            options = dict(DEFAULT_SETTINGS, **(settings or {}))
+            trust = str(options['trust_dir_mtime']).lower()
+            _scanner = DirScanner(trust_dir_mtime='auto' if trust == 'auto' else trust in ('1', 'true', 'yes', 'on'),
+                                  settle_seconds=options['settle_seconds'])
+        return _scanner
+
+def list_files(directory, suffix=None):
+    """Đường dẫn đầy đủ của các file trong thư mục (lọc theo phần mở rộng nếu có), sắp theo tên."""
+    entries = get_scanner().scan(directory).entries
+    return [entries[n].path for n in sorted(entries) if suffix is None or n.endswith(suffix)]
@@ -1,14 +1,26 @@
 # /core/excel_handler.py
-import pandas as pd
 import openpyxl
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
+from openpyxl.worksheet.cell_range import CellRange
+import posixpath
 import tempfile
 import shutil
 import os
+import zipfile
+import xml.etree.ElementTree as ET
 from threading import Lock
 
 # Lock để tránh xung đột khi nhiều thread cùng ghi vào file Excel
 lock = Lock()
 
+# Cache kết quả read_table: (đường dẫn, sheet, bảng) -> (mtime, size, rows)
+_table_cache = {}
+
+NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+NS_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
 def _load_workbook_and_sheet(file_path, sheet_name, table_name):
     """Hàm nội bộ để mở workbook, sheet và kiểm tra sự tồn tại của bảng."""
     if not os.path.exists(file_path):
@@ -24,57 +36,216 @@ def _load_workbook_and_sheet(file_path, sheet_name, table_name):
         
     return wb, ws, ws.tables[table_name]
 
+def _read_rels(zf, part):
+    """Đọc file .rels của một part trong gói xlsx: {rId: đường dẫn part đích}."""
+    folder, name = posixpath.split(part)
+    rels_path = posixpath.join(folder, '_rels', name + '.rels')
+    if rels_path not in zf.namelist(): return {}
+    rels = {}
+    for rel in ET.fromstring(zf.read(rels_path)).iter(f'{NS_PKG_REL}Relationship'):
+        target = rel.get('Target')
+        rels[rel.get('Id')] = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(folder, target))
+    return rels
+
+def _open_table(zf, sheet_name, table_name):
+    """
+    Tìm part XML của sheet và vùng (vd 'A1:C100') của bảng bằng cách đọc trực tiếp gói xlsx.
+    Trả về (sheet_part, ref, workbook_part, workbook_rels).
+    """
+    workbook_part = next(t for t in _read_rels(zf, '').values() if t.endswith('workbook.xml'))
+    workbook_rels = _read_rels(zf, workbook_part)
+    sheet_part = None
+    for sheet in ET.fromstring(zf.read(workbook_part)).iter(f'{NS_MAIN}sheet'):
+        if sheet.get('name') == sheet_name: sheet_part = workbook_rels[sheet.get(f'{NS_REL}id')]
+    if sheet_part is None:
+        raise ValueError(f"Không tìm thấy sheet '{sheet_name}'")
+    for target in _read_rels(zf, sheet_part).values():
+        if posixpath.basename(posixpath.dirname(target)) != 'tables' or target not in zf.namelist(): continue
+        table = ET.fromstring(zf.read(target))
+        if table_name in (table.get('displayName'), table.get('name')):
+            return sheet_part, table.get('ref'), workbook_part, workbook_rels
+    raise ValueError(f"Không tìm thấy bảng '{table_name}'")
+
+def _read_shared_strings(zf, workbook_rels):
+    path = next((t for t in workbook_rels.values() if t.endswith('sharedStrings.xml')), None)
+    if path is None or path not in zf.namelist(): return []
+    strings = []
+    with zf.open(path) as f:
+        for _, el in ET.iterparse(f):
+            if el.tag != f'{NS_MAIN}si': continue
+            # Bỏ qua phần phiên âm (rPh) giống openpyxl
+            parts = [el.find(f'{NS_MAIN}t')] + [r.find(f'{NS_MAIN}t') for r in el.iter(f'{NS_MAIN}r')]
+            strings.append(''.join(t.text or '' for t in parts if t is not None))
+            el.clear()
+    return strings
+
+def _read_date_styles(zf, workbook_rels):
+    """Tập chỉ số style (thuộc tính s của ô) có định dạng ngày giờ."""
+    path = next((t for t in workbook_rels.values() if t.endswith('styles.xml')), None)
+    if path is None or path not in zf.namelist(): return set()
+    root = ET.fromstring(zf.read(path))
+    formats = dict(BUILTIN_FORMATS)
+    for fmt in root.iter(f'{NS_MAIN}numFmt'):
+        formats[int(fmt.get('numFmtId'))] = fmt.get('formatCode')
+    cell_xfs = root.find(f'{NS_MAIN}cellXfs')
+    if cell_xfs is None: return set()
+    return {i for i, xf in enumerate(cell_xfs) if is_date_format(formats.get(int(xf.get('numFmtId', 0)), ''))}
+
+def _column_index(coordinate):
+    """'AB12' -> 28."""
+    index = 0
+    for ch in coordinate:
+        if ch.isdigit(): break
+        index = index * 26 + ord(ch) - 64
+    return index
+
+def iter_table(file_path, sheet_name, table_name):
+    """
+    Đọc lần lượt từng dòng của bảng (dictionary), stream thẳng XML của sheet: chỉ lấy giá trị,
+    không tạo Cell/Workbook của openpyxl, dừng ngay sau dòng cuối của bảng.
+    Ô công thức trả về giá trị đã tính được lưu trong file.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File không tồn tại: {file_path}")
+    with zipfile.ZipFile(file_path) as zf:
+        sheet_part, ref, workbook_part, workbook_rels = _open_table(zf, sheet_name, table_name)
+        ref = CellRange(ref)
+        shared_strings = _read_shared_strings(zf, workbook_rels)
+        date_styles = _read_date_styles(zf, workbook_rels)
+        pr = ET.fromstring(zf.read(workbook_part)).find(f'{NS_MAIN}workbookPr')
+        epoch = CALENDAR_MAC_1904 if pr is not None and pr.get('date1904') in ('1', 'true') else CALENDAR_WINDOWS_1900
+
+        tag_row, tag_v, tag_t = f'{NS_MAIN}row', f'{NS_MAIN}v', f'{NS_MAIN}t'
+        width = ref.max_col - ref.min_col + 1
+        header, row_num = None, ref.min_row - 1
+        with zf.open(sheet_part) as f:
+            for _, el in ET.iterparse(f):
+                if el.tag != tag_row: continue
+                current = int(el.get('r') or row_num + 1)
+                if current < ref.min_row: el.clear(); continue
+                if current > ref.max_row: break
+                values, col = [None] * width, ref.min_col - 1
+                for c in el:
+                    r = c.get('r')
+                    col = _column_index(r) if r else col + 1
+                    if not ref.min_col <= col <= ref.max_col: continue
+                    kind = c.get('t', 'n')
+                    if kind == 'inlineStr':
+                        value = ''.join(t.text or '' for t in c.iter(tag_t))
+                    else:
+                        v = c.find(tag_v)
+                        value = v.text if v is not None else None
+                        if value is None: pass
+                        elif kind == 's': value = shared_strings[int(value)]
+                        elif kind == 'b': value = value == '1'
+                        elif kind == 'd': value = from_ISO8601(value)
+                        elif kind == 'n':
+                            value = float(value) if any(ch in value for ch in '.Ee') else int(value)
+                            if c.get('s') and int(c.get('s')) in date_styles: value = from_excel(value, epoch)
+                    values[col - ref.min_col] = value
+                el.clear()
+                if header is None:
+                    header = values
+                    row_num = current
+                    continue
+                # Dòng trống giữa bảng không có thẻ <row> trong XML
+                for _ in range(row_num + 1, current): yield dict.fromkeys(header)
+                row_num = current
+                yield dict(zip(header, values))
+        if header is not None:
+            for _ in range(row_num + 1, ref.max_row + 1): yield dict.fromkeys(header)
+
 def read_table(file_path, sheet_name, table_name):
-    """Đọc toàn bộ dữ liệu từ một bảng trong Excel và trả về list của dictionary."""
+    """
+    Đọc toàn bộ dữ liệu từ một bảng trong Excel và trả về list của dictionary.
+    Kết quả được cache và chỉ đọc lại khi mtime hoặc dung lượng file thay đổi.
+    """
     with lock:
-        _, ws, table = _load_workbook_and_sheet(file_path, sheet_name, table_name)
-        data_range = ws[table.ref]
-        rows = list(data_range)
-        header = [cell.value for cell in rows[0]]
-        data = [[cell.value for cell in row] for row in rows[1:]]
-        df = pd.DataFrame(data, columns=header)
-        return df.to_dict(orient='records')
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File không tồn tại: {file_path}")
+        st = os.stat(file_path)
+        key = (os.path.abspath(file_path), sheet_name, table_name)
+        cached = _table_cache.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            rows = cached[2]
+        else:
+            rows = list(iter_table(file_path, sheet_name, table_name))
+            _table_cache[key] = (st.st_mtime_ns, st.st_size, rows)
+        # Trả về bản sao để người gọi sửa dict không làm hỏng cache
+        return [dict(row) for row in rows]
 
-def update_cell(file_path, sheet_name, table_name, row_index, column_name, new_value):
-    """Cập nhật một ô cụ thể trong bảng, dựa vào chỉ số dòng và tên cột."""
+def _table_range(table):
+    return CellRange(table.ref)
+
+def _table_columns(ws, table):
+    """Tên các cột (dòng header) của bảng."""
+    ref = _table_range(table)
+    header = next(ws.iter_rows(min_row=ref.min_row, max_row=ref.min_row, min_col=ref.min_col, max_col=ref.max_col, values_only=True))
+    return list(header)
+
+def _save_workbook(wb, file_path):
+    """Lưu an toàn vào file tạm rồi di chuyển để tránh mất dữ liệu."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx', prefix='excel_') as tmp:
+        wb.save(tmp.name)
+    shutil.move(tmp.name, file_path)
+
+def update_cells(file_path, sheet_name, table_name, column_name, values_by_row):
+    """Cập nhật nhiều ô của cùng một cột ({chỉ số dòng: giá trị}) với một lần mở/lưu workbook."""
     with lock:
         wb, ws, table = _load_workbook_and_sheet(file_path, sheet_name, table_name)
-        header_range = ws[table.ref.split(':')[0]]
-        columns = [cell.value for cell in header_range[0]]
+        columns = _table_columns(ws, table)
         
         if column_name not in columns:
             raise ValueError(f"Không tìm thấy cột '{column_name}' trong bảng.")
 
-        col_index = columns.index(column_name) + table.ref_range.min_col
-        # +2 vì: +1 để bỏ qua header của bảng, +1 nữa vì row_index bắt đầu từ 0
-        actual_row = table.ref_range.min_row + row_index + 1
-        ws.cell(row=actual_row, column=col_index, value=new_value)
+        ref = _table_range(table)
+        col_index = columns.index(column_name) + ref.min_col
+        for row_index, new_value in values_by_row.items():
+            # +2 vì: +1 để bỏ qua header của bảng, +1 nữa vì row_index bắt đầu từ 0
+            actual_row = ref.min_row + row_index + 1
+            ws.cell(row=actual_row, column=col_index, value=new_value)
         
-        # Lưu an toàn vào file tạm rồi di chuyển để tránh mất dữ liệu
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx', prefix='excel_') as tmp:
-            wb.save(tmp.name)
-        shutil.move(tmp.name, file_path)
+        _save_workbook(wb, file_path)
         return True
 
-def write_row(file_path, sheet_name, table_name, data_dict):
-    """Ghi một dòng mới (dạng dictionary) vào cuối của một bảng."""
+def update_cell(file_path, sheet_name, table_name, row_index, column_name, new_value):
+    """Cập nhật một ô cụ thể trong bảng, dựa vào chỉ số dòng và tên cột."""
+    return update_cells(file_path, sheet_name, table_name, column_name, {row_index: new_value})
+
+def write_rows(file_path, sheet_name, table_name, rows, skip_existing=None):
+    """
+    Ghi nhiều dòng (list dictionary) vào cuối bảng với một lần mở/lưu workbook, trả về số dòng đã ghi.
+    skip_existing là list tên cột: dòng nào có cùng giá trị các cột này với một dòng đã có trong bảng thì bỏ qua.
+    """
     with lock:
         wb, ws, table = _load_workbook_and_sheet(file_path, sheet_name, table_name)
-        header_range = ws[table.ref.split(':')[0]]
-        columns = [cell.value for cell in header_range[0]]
-        
-        next_row_num = table.ref_range.max_row + 1
-        
-        for col_name, value in data_dict.items():
-            if col_name in columns:
-                col_idx = columns.index(col_name) + table.ref_range.min_col
-                ws.cell(row=next_row_num, column=col_idx, value=value)
-
-        # Mở rộng vùng tham chiếu của bảng để bao gồm dòng mới
-        max_col_letter = openpyxl.utils.get_column_letter(table.ref_range.max_col)
-        table.ref = f"{table.ref_range.min_col_letter}{table.ref_range.min_row}:{max_col_letter}{next_row_num}"
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx', prefix='excel_') as tmp:
-            wb.save(tmp.name)
-        shutil.move(tmp.name, file_path)
-        return True
+        columns = _table_columns(ws, table)
+        ref = _table_range(table)
+
+        if skip_existing:
+            key_idx = [columns.index(c) for c in skip_existing]
+            existing = {
+                tuple(values[i] for i in key_idx)
+                for values in ws.iter_rows(min_row=ref.min_row + 1, max_row=ref.max_row, min_col=ref.min_col, max_col=ref.max_col, values_only=True)
+            }
+            rows = [r for r in rows if tuple(r.get(c) for c in skip_existing) not in existing]
+        if not rows: return 0
+
+        next_row_num = ref.max_row + 1
+        for data_dict in rows:
+            for col_name, value in data_dict.items():
+                if col_name in columns:
+                    ws.cell(row=next_row_num, column=columns.index(col_name) + ref.min_col, value=value)
+            next_row_num += 1
+
+        # Mở rộng vùng tham chiếu của bảng để bao gồm các dòng mới
+        get_letter = openpyxl.utils.get_column_letter
+        table.ref = f"{get_letter(ref.min_col)}{ref.min_row}:{get_letter(ref.max_col)}{next_row_num - 1}"
+
+        _save_workbook(wb, file_path)
+        return len(rows)
+
+def write_row(file_path, sheet_name, table_name, data_dict):
+    """Ghi một dòng mới (dạng dictionary) vào cuối của một bảng."""
+    write_rows(file_path, sheet_name, table_name, [data_dict])
+    return True
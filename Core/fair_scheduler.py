@@ -0,0 +1,86 @@
+# /core/fair_scheduler.py
+import threading
+from contextlib import contextmanager, nullcontext
+
+# Giá trị mặc định cho section [scheduler] trong config.ini: số tải về / chia file chạy cùng lúc cho mọi danh mục
+DEFAULT_LIMITS = {'max_downloads': 2, 'max_splits': 1}
+RESOURCES = {'download': 'max_downloads', 'split': 'max_splits'}
+
+class FairShare:
+    """
+    Chia lượt theo trọng số giữa các danh mục (start-time fair queueing): mỗi lần được cấp, danh mục
+    "trả" 1/weight; danh mục trả ít nhất trong số đang chờ được cấp trước. Danh mục đứng yên không
+    tích luỹ lượt, nên khi quay lại không chiếm hết tài nguyên của các danh mục khác.
+    """
+
+    def __init__(self, weights=None):
+        self.weights = {c: max(float(w), 1e-3) for c, w in (weights or {}).items()}
+        self.finish = {}
+        self.clock = 0.0
+
+    def _start(self, category):
+        return max(self.finish.get(category, 0.0), self.clock)
+
+    def pick(self, categories):
+        """Danh mục được cấp tiếp theo trong số `categories` (cùng lượt thì giữ thứ tự truyền vào)."""
+        return min(categories, key=self._start)
+
+    def charge(self, category):
+        start = self._start(category)
+        self.clock = start
+        self.finish[category] = start + 1.0 / self.weights.get(category, 1.0)
+
+class FairScheduler:
+    """Giới hạn chung số tác vụ mỗi loại tài nguyên (tải về, chia file) và chia slot theo trọng số danh mục."""
+
+    def __init__(self, limits=None, weights=None):
+        limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.limits = {r: max(1, int(limits[key])) for r, key in RESOURCES.items()}
+        self.shares = {r: FairShare(weights) for r in RESOURCES}
+        self.running = {r: 0 for r in RESOURCES}
+        self.waiting = {r: {} for r in RESOURCES}
+        self.cond = threading.Condition()
+
+    def _ready(self, resource, category):
+        waiting = self.waiting[resource]
+        return (self.running[resource] < self.limits[resource]
+                and self.shares[resource].pick(list(waiting)) == category)
+
+    def acquire(self, resource, category):
+        with self.cond:
+            waiting = self.waiting[resource]
+            waiting[category] = waiting.get(category, 0) + 1
+            while not self._ready(resource, category): self.cond.wait()
+            waiting[category] -= 1
+            if not waiting[category]: del waiting[category]
+            self.running[resource] += 1
+            self.shares[resource].charge(category)
+            # Có thể còn slot trống cho danh mục khác đang chờ
+            self.cond.notify_all()
+
+    def release(self, resource):
+        with self.cond:
+            self.running[resource] -= 1
+            self.cond.notify_all()
+
+    @contextmanager
+    def slot(self, resource, category):
+        self.acquire(resource, category)
+        try: yield
+        finally: self.release(resource)
+
+# Scheduler dùng chung khi chạy nhiều danh mục trong một tiến trình (--category all); None: không giới hạn
+_scheduler = None
+
+def configure(limits=None, weights=None):
+    global _scheduler
+    _scheduler = FairScheduler(limits, weights)
+    return _scheduler
+
+def enabled():
+    return _scheduler is not None
+
+def slot(resource, category):
+    """Chờ tới lượt `category` dùng `resource` ('download' hoặc 'split'); không chặn gì nếu chưa configure()."""
+    if _scheduler is None or category is None: return nullcontext()
+    return _scheduler.slot(resource, category)
@@ -3,19 +3,307 @@ import os
 import argparse
 import json
 import subprocess
-import math
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING
+
+try:
+    from . import joiner, probe_cache
+except ImportError:
+    import joiner
+    import probe_cache
+
+if TYPE_CHECKING:
+    from core.worker_runner import SplitResult
+
+# Dự phòng cho header/index container của từng phần khi ước tính dung lượng
+SIZE_MARGIN = 0.01
+# Cắt thủ công bằng stream copy bị giới hạn bởi đĩa hơn CPU: quá vài phần đọc song song chỉ làm đĩa seek nhiều hơn
+MAX_PARALLEL_PARTS = 4
+# Số lần lập lại kế hoạch (siết ngân sách) nếu có phần thực tế vẫn vượt giới hạn
+MAX_PLAN_ATTEMPTS = 3
 
 def get_video_duration(file_path):
-    """Sử dụng ffprobe để lấy thời lượng video (giây)."""
+    """Thời lượng video (giây) từ ffprobe, qua cache probe (không chạy lại ffprobe nếu file không đổi)."""
+    return probe_cache.get_duration(file_path)
+
+def reference_stream(file_path):
+    """Chỉ số luồng dùng để chọn điểm cắt: luồng video đầu tiên, hoặc luồng đầu tiên nếu file không có video."""
+    streams = probe_cache.probe_info(file_path).get('streams', [])
+    if not streams: raise RuntimeError(f"Không đọc được luồng nào trong {file_path}.")
+    return next((s['index'] for s in streams if s.get('codec_type') == 'video'), streams[0]['index'])
+
+def read_packet_index(file_path):
+    """
+    Kích thước mọi gói và mốc thời gian các keyframe (một lần ffprobe, không giải mã; có cache probe).
+    Trả về dict {size, duration, payload_bytes, keyframes: [[giây, số byte dữ liệu trước keyframe], ...]}.
+    """
+    return probe_cache.get_cache().get(file_path, 'packets', lambda: scan_packets(file_path))
+
+def scan_packets(file_path):
+    """Đọc chỉ mục gói trực tiếp bằng ffprobe (không qua cache)."""
+    stream = reference_stream(file_path)
     command = [
-        'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-        '-of', 'default=noprint_wrappers=1:nokey=1', file_path
+        'ffprobe', '-v', 'error', '-show_entries', 'packet=stream_index,pts_time,size,flags:format=start_time,duration',
+        '-of', 'csv', file_path,
     ]
+    keyframes, total, start_time, duration = [], 0, 0.0, None
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) as process:
+        # Gói được in theo thứ tự trong file nên tổng dồn chính là lượng dữ liệu nằm trước mỗi keyframe
+        for line in process.stdout:
+            fields = line.rstrip('\n').split(',')
+            if fields[0] == 'packet' and len(fields) >= 5:
+                if int(fields[1]) == stream and 'K' in fields[4] and fields[2] != 'N/A':
+                    keyframes.append([float(fields[2]), total])
+                total += int(fields[3])
+            elif fields[0] == 'format':
+                if fields[1] != 'N/A': start_time = float(fields[1])
+                if fields[2] != 'N/A': duration = float(fields[2])
+    if process.returncode != 0 or not keyframes or duration is None:
+        raise RuntimeError(f"ffprobe không đọc được chỉ mục gói của {file_path}.")
+    # ffmpeg dời mốc thời gian đầu vào về 0 (trừ start_time), segment muxer so sánh trên mốc đã dời
+    for keyframe in keyframes: keyframe[0] = round(keyframe[0] - start_time, 6)
+    return {"size": os.path.getsize(file_path), "duration": duration, "payload_bytes": total, "keyframes": keyframes}
+
+def concat_packet_index(files):
+    """Chỉ mục gói của file nối (không có trên đĩa) ghép từ chỉ mục từng file, dời thời gian/byte theo các file trước nó."""
+    keyframes, duration, payload, size = [], 0.0, 0, 0
+    for file_path in files:
+        index = read_packet_index(file_path)
+        keyframes += [[round(t + duration, 6), b + payload] for t, b in index['keyframes']]
+        duration += index['duration']
+        payload += index['payload_bytes']
+        size += index['size']
+    return {"size": size, "duration": duration, "payload_bytes": payload, "keyframes": keyframes}
+
+def plan_split(index, max_bytes, margin=SIZE_MARGIN, keep=()):
+    """
+    Chọn điểm cắt trên keyframe sao cho mỗi phần (ước tính) không vượt max_bytes, với số phần ít nhất
+    (tham lam: kéo dài mỗi phần tới keyframe xa nhất còn vừa). Trả về dict kế hoạch, chuyển được sang JSON.
+    keep: các điểm cắt (chỉ số keyframe) đã chốt từ kế hoạch trước, chỉ lập kế hoạch cho phần sau đó.
+    """
+    # Dung lượng file ≈ dữ liệu gói * overhead của container; chừa thêm margin cho header/index từng phần
+    overhead = index['size'] / max(index['payload_bytes'], 1)
+    budget = max_bytes / (overhead * (1 + margin))
+    bounds = index['keyframes'] + [[index['duration'], index['payload_bytes']]]
+    cuts = list(keep)
+    start_bytes = bounds[cuts[-1]][1] if cuts else 0
+    for i in range(cuts[-1] + 1 if cuts else 1, len(bounds)):
+        if bounds[i][1] - start_bytes <= budget: continue
+        # Phần hiện tại phải kết thúc ở keyframe i-1; đoạn (i-1, i) phải tự vừa ngân sách
+        if bounds[i][1] - bounds[i - 1][1] > budget:
+            raise RuntimeError(f"Đoạn giữa hai keyframe tại {bounds[i - 1][0]:.2f}s lớn hơn giới hạn, không thể cắt trên keyframe.")
+        cuts.append(i - 1)
+        start_bytes = bounds[i - 1][1]
+
+    edges = [[0.0, 0]] + [bounds[i] for i in cuts] + [bounds[-1]]
+    parts = [{"start": a[0], "end": b[0], "estimated_bytes": int((b[1] - a[1]) * overhead)} for a, b in zip(edges, edges[1:])]
+    return {
+        "max_bytes": int(max_bytes), "source_bytes": index['size'], "overhead": round(overhead, 6), "margin": margin,
+        # Mốc truyền cho segment muxer: giữa keyframe cần cắt và keyframe liền trước, để lệch mốc thời gian
+        # giữa ffprobe và muxer (độ trễ B-frame, start_time) nhỏ hơn nửa GOP vẫn rơi đúng keyframe đã chọn
+        "cut_times": [round((bounds[i - 1][0] + bounds[i][0]) / 2, 3) if i else bounds[i][0] for i in cuts],
+        "cut_keyframes": cuts, "parts": parts,
+    }
+
+def notify_part(on_part, part_path, position, total):
+    """Báo một phần đã cắt xong; lỗi trong callback không làm hỏng việc chia."""
+    if not on_part: return
+    try: on_part(part_path, position, total)
+    except Exception as e: print(f" -> Lỗi trong callback hoàn thành phần: {e}", file=sys.stderr)
+
+def split_to_size(file_path, max_bytes, index=None, concat_list=None, on_part=None):
+    """
+    Chia theo kế hoạch từ chỉ mục gói. Mỗi phần được kiểm tra dung lượng ngay khi ghi xong rồi báo qua
+    on_part(đường dẫn, thứ tự, tổng số phần theo kế hoạch). Nếu có phần vượt giới hạn, các phần trước nó
+    được giữ nguyên (có thể đang upload), phần còn lại được lập kế hoạch lại với margin chặt hơn và cắt lại.
+    """
+    index = index or read_packet_index(file_path)
+    base_name, extension = os.path.splitext(file_path)
+    margin, done, keep = SIZE_MARGIN, [], []
+    for attempt in range(MAX_PLAN_ATTEMPTS):
+        plan = plan_split(index, max_bytes, margin, keep)
+        total = len(plan['parts'])
+        print(f"Kế hoạch chia: {total} phần, cắt tại {plan['cut_times']}", file=sys.stderr)
+        # Lần cắt lại ghi ra tên tạm để không đụng vào các phần đã xong
+        pattern = part_path_pattern(f"{base_name}.retry{extension}" if done else file_path)
+        oversized = None
+        segments = run_segments(file_path, plan['cut_times'], concat_list, pattern)
+        try:
+            for position, path in segments:
+                # Phần trùng với phần đã giữ từ lần trước
+                if position <= len(done): os.remove(path); continue
+                size = os.path.getsize(path)
+                if size > max_bytes: oversized = size; break
+                final_path = f"{base_name}_part{position}{extension}"
+                if path != final_path: os.replace(path, final_path)
+                done.append(final_path)
+                notify_part(on_part, final_path, position, total)
+        finally:
+            # Dừng ffmpeg (nếu còn chạy) rồi xoá phần vượt giới hạn và các phần dở dang
+            segments.close()
+            for position in range(len(done) + 1, total + 2):
+                if os.path.exists(pattern % position): os.remove(pattern % position)
+        if oversized is None:
+            if not done: raise RuntimeError("ffmpeg không tạo ra phần nào.")
+            return plan, done
+        keep = plan['cut_keyframes'][:len(done)]
+        margin = (1 + margin) * oversized / max_bytes - 1 + SIZE_MARGIN
+        print(f"Phần {len(done) + 1} lớn hơn giới hạn ({oversized} byte), lập lại kế hoạch với margin {margin:.3f}...", file=sys.stderr)
+    raise RuntimeError(f"Không chia được file thành các phần nhỏ hơn {max_bytes} byte.")
+
+def part_path_pattern(file_path):
+    """Mẫu tên các phần cho segment muxer: <tên>_part%d<đuôi> (giữ cách đặt tên _partN như trước)."""
+    base_name, extension = os.path.splitext(file_path)
+    return f"{base_name.replace('%', '%%')}_part%d{extension}"
+
+def segment_command(file_path, cut_times, concat_list=None, pattern=None):
+    """
+    Lệnh ffmpeg cắt file thành len(cut_times)+1 phần trong một lần đọc; cut_times là mốc (giây) bắt đầu phần 2, 3, ...
+    Nếu có concat_list, đầu vào là các file trong danh sách đó (concat demuxer) và file_path chỉ dùng để đặt tên phần.
+    pattern: mẫu tên phần (mặc định <tên>_part%d<đuôi>).
+    """
+    source = ['-f', 'concat', '-safe', '0', '-i', concat_list] if concat_list else ['-i', file_path]
+    return [
+        'ffmpeg', '-v', 'error', '-nostdin', *source, '-c', 'copy',
+        '-f', 'segment', '-segment_times', ','.join(f"{t:.3f}" for t in cut_times),
+        '-reset_timestamps', '1', '-segment_start_number', '1',
+        # In tên từng phần ra stdout ngay khi phần đó được ghi xong
+        '-segment_list', 'pipe:1', '-segment_list_type', 'flat',
+        '-y', pattern or part_path_pattern(file_path),
+    ]
+
+def run_segments(file_path, cut_times, concat_list=None, pattern=None):
+    """Chạy segment muxer, lần lượt trả về (thứ tự, đường dẫn) của từng phần ngay khi phần đó được ghi xong."""
+    command = segment_command(file_path, cut_times, concat_list, pattern)
+    folder = os.path.dirname(file_path)
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as process:
+        try:
+            # -segment_list pipe:1 in tên một phần sau khi phần đó đã được đóng
+            names = (line.strip() for line in process.stdout if line.strip())
+            for position, name in enumerate(names, 1):
+                yield position, os.path.join(folder, name)
+            stderr = process.stderr.read()
+            if process.wait(): raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+        finally:
+            # Người gọi dừng giữa chừng (phần vượt giới hạn) hoặc có lỗi: dừng ffmpeg
+            if process.poll() is None: process.kill()
+
+def default_workers():
+    """Số ffmpeg chạy song song mặc định: theo số CPU, không quá MAX_PARALLEL_PARTS (giới hạn đĩa)."""
+    return max(1, min(os.cpu_count() or 1, MAX_PARALLEL_PARTS))
+
+def cut_command(file_path, start, end, part_path):
+    """Lệnh cắt đoạn [start, end) bằng stream copy; -ss đặt trước -i để ffmpeg seek thẳng tới keyframe thay vì đọc từ đầu file."""
+    return [
+        'ffmpeg', '-v', 'error', '-nostdin', '-ss', f"{start:.3f}", '-i', file_path,
+        '-t', f"{end - start:.3f}", '-c', 'copy', '-avoid_negative_ts', 'make_zero', '-y', part_path,
+    ]
+
+def split_by_times(file_path, start_times, workers=None, on_part=None):
+    """
+    Cắt các đoạn giữa những mốc thời gian, mỗi đoạn một tiến trình ffmpeg chạy song song; trả về các phần theo thứ tự.
+    on_part(đường dẫn, thứ tự, tổng số phần) được gọi ngay khi từng phần cắt xong.
+    """
+    duration = get_video_duration(file_path)
+    if duration is None:
+        raise RuntimeError("Không thể lấy thời lượng video để chia thủ công.")
+
+    # Sắp xếp các mốc thời gian và thêm tổng thời lượng vào cuối để biết điểm kết thúc
+    split_points = sorted(start_times) + [duration]
+    base_name, extension = os.path.splitext(file_path)
+    jobs = [(start, end, f"{base_name}_part{i + 1}{extension}")
+            for i, (start, end) in enumerate(zip(split_points, split_points[1:])) if start < end]
+
+    errors, reported = [], set()
+    with ThreadPoolExecutor(max_workers=workers or default_workers()) as pool:
+        futures = {}
+        for position, (start, end, part_path) in enumerate(jobs, 1):
+            print(f"Đang tạo phần {position} (từ {start:.2f}s đến {end:.2f}s)...", file=sys.stderr)
+            future = pool.submit(subprocess.run, cut_command(file_path, start, end, part_path), check=True, capture_output=True, text=True)
+            futures[future] = (position, part_path)
+        for future in as_completed(futures):
+            position, part_path = futures[future]
+            if future.exception(): errors.append(future.exception()); continue
+            if not errors:
+                notify_part(on_part, part_path, position, len(jobs))
+                reported.add(part_path)
+    if errors:
+        # Không để lại các phần dở dang (trừ phần đã báo ra ngoài); file gốc vẫn còn nguyên
+        for _, _, part_path in jobs:
+            if part_path not in reported and os.path.exists(part_path): os.remove(part_path)
+        raise errors[0]
+    return [part_path for _, _, part_path in jobs]
+
+def join_and_split(files_to_join, output_file, max_size_gb, on_part=None):
+    """
+    Nối rồi chia tự động trong một lần đọc: concat demuxer đưa thẳng vào segment muxer nên file nối
+    không bao giờ được ghi ra đĩa. Tên phần và kết quả giống hệt nối bằng joiner rồi chia theo output_file;
+    các file nguồn bị xoá sau khi chia xong.
+    """
+    if not files_to_join or len(files_to_join) < 2:
+        raise ValueError("Cần ít nhất 2 file để thực hiện việc nối.")
+    max_size_bytes = max_size_gb * 1024 * 1024 * 1024
+    for file_path in files_to_join:
+        if not os.path.exists(file_path): raise FileNotFoundError(f"File không tồn tại: {file_path}")
+
+    # File nối vừa giới hạn thì không cần chia: nối bình thường như trước
+    if sum(os.path.getsize(f) for f in files_to_join) <= max_size_bytes:
+        result = joiner.join_files(files_to_join, output_file, delete_parts=True)
+        return {"status": "unsplit", "files": [result['output_path']]}
+
+    print(f"Tổng dung lượng lớn hơn {max_size_gb}GB. Nối và chia trong một lần...", file=sys.stderr)
+    joiner.warn_if_incompatible(files_to_join)
+    concat_list = joiner.write_concat_list(files_to_join)
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        return float(result.stdout.strip())
-    except Exception as e:
-        return None
+        _, part_paths = split_to_size(output_file, max_size_bytes, concat_packet_index(files_to_join), concat_list, on_part)
+    finally:
+        os.remove(concat_list)
+
+    for file_path in files_to_join: os.remove(file_path)
+    return {"status": "auto_split", "files": part_paths}
+
+def split_video(file_path, max_size_gb=None, start_times=None, workers=None, join_files=None, on_part=None) -> 'SplitResult':
+    """
+    Chia video theo mốc thời gian hoặc dung lượng tối đa, trả về SplitResult (join_files: nối các file này thành
+    file_path rồi chia). on_part(đường dẫn, thứ tự, tổng số phần) được gọi ngay khi từng phần cắt xong; file gốc
+    chỉ bị xoá sau khi mọi phần đều thành công.
+    """
+    if join_files:
+        if not max_size_gb: raise ValueError("Nối và chia trong một lần cần --max-size-gb.")
+        return join_and_split(join_files, file_path, max_size_gb, on_part)
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File không tồn tại: {file_path}")
+
+    part_paths = []
+    status = ""
+
+    # --- CHẾ ĐỘ 1: CHIA THỦ CÔNG THEO MỐC THỜI GIAN ---
+    if start_times:
+        print(f"Phát hiện chế độ chia thủ công theo các mốc thời gian: {start_times}", file=sys.stderr)
+        part_paths = split_by_times(file_path, start_times, workers, on_part)
+        status = "manual_split"
+
+    # --- CHẾ ĐỘ 2: CHIA TỰ ĐỘNG THEO DUNG LƯỢNG ---
+    elif max_size_gb:
+        file_size_bytes = os.path.getsize(file_path)
+        max_size_bytes = max_size_gb * 1024 * 1024 * 1024
+
+        if file_size_bytes <= max_size_bytes:
+            return {"status": "unsplit", "files": [file_path]}
+
+        print(f"File lớn hơn {max_size_gb}GB. Bắt đầu chia tự động...", file=sys.stderr)
+        # Điểm cắt lấy từ chỉ mục gói (dung lượng thật, trên keyframe) thay vì chia đều thời lượng
+        _, part_paths = split_to_size(file_path, max_size_bytes, on_part=on_part)
+
+        status = "auto_split"
+
+    else:
+        raise ValueError("Phải cung cấp --max-size-gb hoặc --start-times.")
+
+    # Sau khi chia xong (ở cả 2 chế độ), xóa file gốc
+    os.remove(file_path)
+    return {"status": status, "files": part_paths}
 
 def main():
     parser = argparse.ArgumentParser(description="Chia video theo dung lượng tối đa hoặc các mốc thời gian.")
@@ -23,84 +311,19 @@ def main():
     parser.add_argument("--file-path", required=True, help="Đường dẫn file video cần xử lý.")
     parser.add_argument("--max-size-gb", type=int, help="CHẾ ĐỘ TỰ ĐỘNG: Dung lượng tối đa (GB) cho mỗi phần.")
     parser.add_argument("--start-times", nargs='+', type=float, help="CHẾ ĐỘ THỦ CÔNG: Danh sách các mốc thời gian bắt đầu (giây) để chia.")
-    
+    parser.add_argument("--workers", type=int, help="CHẾ ĐỘ THỦ CÔNG: Số phần được cắt song song (mặc định: min(số CPU, 4)).")
+    parser.add_argument("--join-files-json", help="Chuỗi JSON danh sách file cần nối (theo thứ tự) thành --file-path rồi chia tự động, không ghi file nối ra đĩa.")
+    parser.add_argument("--plan-only", action='store_true', help="Chỉ in kế hoạch chia theo --max-size-gb (JSON), không chia file.")
+
     args = parser.parse_args()
-    
+
     try:
-        if not os.path.exists(args.file_path):
-            raise FileNotFoundError(f"File không tồn tại: {args.file_path}")
-
-        base_name, extension = os.path.splitext(args.file_path)
-        part_paths = []
-        status = ""
-
-        # --- CHẾ ĐỘ 1: CHIA THỦ CÔNG THEO MỐC THỜI GIAN ---
-        if args.start_times:
-            print(f"Phát hiện chế độ chia thủ công theo các mốc thời gian: {args.start_times}")
-            duration = get_video_duration(args.file_path)
-            if duration is None:
-                raise RuntimeError("Không thể lấy thời lượng video để chia thủ công.")
-            
-            # Sắp xếp các mốc thời gian và thêm tổng thời lượng vào cuối để biết điểm kết thúc
-            split_points = sorted(args.start_times) + [duration]
-            
-            for i in range(len(split_points) - 1):
-                start = split_points[i]
-                end = split_points[i+1]
-                
-                if start >= end: continue
-
-                part_path = f"{base_name}_part{i + 1}{extension}"
-                part_paths.append(part_path)
-                
-                # Dùng -to để cắt chính xác hơn giữa hai mốc thời gian
-                command = [
-                    'ffmpeg', '-i', args.file_path,
-                    '-ss', str(start), '-to', str(end),
-                    '-c', 'copy', '-y', part_path
-                ]
-                print(f"Đang tạo phần {i + 1} (từ {start:.2f}s đến {end:.2f}s)...")
-                subprocess.run(command, check=True, capture_output=True, text=True)
-
-            status = "manual_split"
-
-        # --- CHẾ ĐỘ 2: CHIA TỰ ĐỘNG THEO DUNG LƯỢNG ---
-        elif args.max_size_gb:
-            file_size_bytes = os.path.getsize(args.file_path)
-            max_size_bytes = args.max_size_gb * 1024 * 1024 * 1024
-
-            if file_size_bytes <= max_size_bytes:
-                print(json.dumps({"status": "unsplit", "files": [args.file_path]}))
-                return
-
-            print(f"File lớn hơn {args.max_size_gb}GB. Bắt đầu chia tự động...")
-            duration = get_video_duration(args.file_path)
-            if duration is None:
-                raise RuntimeError("Không thể lấy thời lượng video để chia tự động.")
-            
-            num_parts = math.ceil(file_size_bytes / max_size_bytes)
-            duration_per_part = duration / num_parts
-            
-            for i in range(num_parts):
-                part_path = f"{base_name}_part{i + 1}{extension}"
-                part_paths.append(part_path)
-                start_time = i * duration_per_part
-                
-                command = [
-                    'ffmpeg', '-ss', str(start_time), '-i', args.file_path,
-                    '-t', str(duration_per_part), '-c', 'copy', '-y', part_path
-                ]
-                subprocess.run(command, check=True, capture_output=True, text=True)
-            
-            status = "auto_split"
-        
-        else:
-            raise ValueError("Phải cung cấp --max-size-gb hoặc --start-times.")
-
-        # Sau khi chia xong (ở cả 2 chế độ), xóa file gốc
-        os.remove(args.file_path)
-
-        result = {"status": status, "files": part_paths}
+        if args.plan_only:
+            if not args.max_size_gb: raise ValueError("--plan-only cần --max-size-gb.")
+            print(json.dumps(plan_split(read_packet_index(args.file_path), args.max_size_gb * 1024 * 1024 * 1024), indent=4))
+            return
+        join_files = json.loads(args.join_files_json) if args.join_files_json else None
+        result = split_video(args.file_path, args.max_size_gb, args.start_times, args.workers, join_files)
         print(json.dumps(result))
 
     except Exception as e:
@@ -0,0 +1,148 @@
+# /core/file_transfer.py
+import errno
+import hashlib
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 8 * 1024 * 1024
+VERIFY_MODES = ['size', 'hash']
+# file: fsync từng file ngay sau khi chép; batch: chép cả lô rồi mới fsync (song song) trước khi đổi tên; no: không fsync
+FSYNC_MODES = ['file', 'batch', 'no']
+# Giá trị mặc định cho section [storage] trong config.ini
+DEFAULT_SETTINGS = {'staging_dir': '', 'copy_workers': 4, 'verify': 'size', 'fsync': 'no'}
+# Lỗi cho biết cách chép trong kernel không dùng được giữa hai file này (khác filesystem, FUSE không hỗ trợ...)
+FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+def same_device(src, dst_dir):
+    """Hai đường dẫn nằm trên cùng một filesystem: chuyển file chỉ cần đổi tên."""
+    return os.stat(src).st_dev == os.stat(dst_dir).st_dev
+
+def file_hash(file_path):
+    h = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''): h.update(chunk)
+    return h.hexdigest()
+
+def _copy_data(src, dst):
+    """
+    Chép toàn bộ nội dung bằng copy_file_range (dữ liệu không đi qua tiến trình, có thể được filesystem
+    xử lý luôn), lùi về sendfile rồi tới chép qua bộ đệm nếu kernel/filesystem không hỗ trợ.
+    """
+    size = os.fstat(src.fileno()).st_size
+    copied = 0
+    for method in ('copy_file_range', 'sendfile'):
+        if not hasattr(os, method): continue
+        try:
+            while copied < size:
+                count = min(CHUNK_SIZE, size - copied)
+                if method == 'copy_file_range': n = os.copy_file_range(src.fileno(), dst.fileno(), count, copied, copied)
+                else:
+                    os.lseek(dst.fileno(), copied, os.SEEK_SET)
+                    n = os.sendfile(dst.fileno(), src.fileno(), copied, count)
+                if n == 0: break
+                copied += n
+            return copied
+        except OSError as e:
+            if e.errno not in FALLBACK_ERRNOS: raise
+    src.seek(copied)
+    dst.seek(copied)
+    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    return size
+
+def _copy_part(src, tmp_path, verify, fsync):
+    """Chép src sang tmp_path và kiểm tra; file tạm bị xoá nếu có lỗi."""
+    if verify not in VERIFY_MODES: raise ValueError(f"Chế độ kiểm tra không hợp lệ: {verify}")
+    try:
+        with open(src, 'rb', buffering=0) as fsrc, open(tmp_path, 'wb', buffering=0) as fdst:
+            _copy_data(fsrc, fdst)
+            if fsync: os.fsync(fdst.fileno())
+        if os.path.getsize(tmp_path) != os.path.getsize(src):
+            raise IOError(f"Kích thước sau khi chép không khớp: {os.path.basename(src)}")
+        if verify == 'hash' and file_hash(tmp_path) != file_hash(src):
+            raise IOError(f"Hash sau khi chép không khớp: {os.path.basename(src)}")
+    except Exception:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+def _commit(src, tmp_path, dst):
+    os.replace(tmp_path, dst)
+    # Giữ thời gian sửa đổi như shutil.move; một số filesystem (FUSE) không cho đặt lại
+    try: shutil.copystat(src, dst)
+    except OSError: pass
+    return dst
+
+def _fsync_path(path, flags=os.O_RDONLY):
+    fd = os.open(path, flags)
+    try: os.fsync(fd)
+    finally: os.close(fd)
+
+def copy_file(src, dst, verify='size', fsync=True):
+    """
+    Chép src sang dst qua file tạm <dst>.part, kiểm tra kích thước (và hash nếu verify='hash')
+    rồi mới đổi tên thành dst, nên dst không bao giờ là một file chép dở.
+    """
+    tmp_path = dst + '.part'
+    _copy_part(src, tmp_path, verify, fsync)
+    return _commit(src, tmp_path, dst)
+
+def move_file(src, dst_dir, verify='size', fsync=True):
+    """Chuyển file vào dst_dir: đổi tên nếu cùng filesystem, ngược lại chép (có kiểm tra) rồi xoá file nguồn."""
+    dst = os.path.join(dst_dir, os.path.basename(src))
+    if same_device(src, dst_dir):
+        os.replace(src, dst)
+        return dst
+    copy_file(src, dst, verify, fsync)
+    os.remove(src)
+    return dst
+
+def move_files(files, dst_dir, workers=DEFAULT_SETTINGS['copy_workers'], verify='size', fsync=DEFAULT_SETTINGS['fsync']):
+    """
+    Chuyển nhiều file song song (tối đa `workers` file cùng lúc). Trả về list (nguồn, đích hoặc None, lỗi hoặc None).
+    fsync='batch': chép mọi file ra <tên>.part, fsync các file tạm song song, rồi mới đổi tên và fsync thư mục
+    đích một lần; việc ghi xuống đĩa của file này chồng lên lúc chép file sau thay vì chặn từng file.
+    """
+    if fsync not in FSYNC_MODES: raise ValueError(f"Chế độ fsync không hợp lệ: {fsync}")
+    os.makedirs(dst_dir, exist_ok=True)
+    pool = ThreadPoolExecutor(max_workers=max(1, int(workers)))
+
+    def move(src):
+        try: return src, move_file(src, dst_dir, verify, fsync == 'file'), None
+        except Exception as e: return src, None, e
+
+    def stage(src):
+        dst = os.path.join(dst_dir, os.path.basename(src))
+        try:
+            if same_device(src, dst_dir):
+                os.replace(src, dst)
+                return src, dst, None, None
+            _copy_part(src, dst + '.part', verify, False)
+            return src, dst, dst + '.part', None
+        except Exception as e: return src, None, None, e
+
+    def flush(item):
+        src, dst, tmp_path, error = item
+        if error or not tmp_path: return item
+        try:
+            _fsync_path(tmp_path)
+            return item
+        except Exception as e:
+            os.remove(tmp_path)
+            return src, None, None, e
+
+    with pool:
+        if fsync != 'batch': return list(pool.map(move, files))
+        staged = list(pool.map(flush, pool.map(stage, files)))
+
+    results = []
+    for src, dst, tmp_path, error in staged:
+        if tmp_path:
+            try:
+                _commit(src, tmp_path, dst)
+                os.remove(src)
+            except Exception as e: dst, error = None, e
+        results.append((src, dst, error))
+    if any(tmp_path for _, _, tmp_path, _ in staged):
+        try: _fsync_path(dst_dir)
+        except OSError: pass  # Một số filesystem (FUSE) không cho fsync thư mục
+    return results
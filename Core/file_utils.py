@@ -1,33 +1,28 @@
 # /core/file_utils.py
 import os
-from . import excel_handler 
+from . import content_index, dir_scanner, job_store
 
-def find_files_to_upload(source_dir, excel_file, sheet, table, host):
+def find_files_to_upload(source_dir, excel_file, sheet, table, host, hash_settings=None, entries=None):
     """
-    So sánh file trong thư mục với Excel để tìm các file cần upload cho một host.
+    So sánh file trong thư mục với các link đã upload (store SQLite, đồng bộ từ Excel khi Excel thay đổi)
+    để tìm các file cần upload cho một host. File được so theo hash nội dung (có cache), link cũ chưa có
+    hash được so theo tên như trước. entries: kết quả dir_scanner đã có (vd. dùng chung cho nhiều host).
     """
     try:
-        # Lấy danh sách tên file (không có phần mở rộng) đã được upload cho host này
-        all_uploaded_records = excel_handler.read_table(excel_file, sheet, table)
-        uploaded_for_host = {
-            str(record['Name']).rsplit('.', 1)[0]
-            for record in all_uploaded_records
-            if record.get('Host') == host
-        }
-        
-        files_to_upload = []
         if not os.path.isdir(source_dir):
             return []
-            
-        for file in os.listdir(source_dir):
-            full_path = os.path.join(source_dir, file)
-            if not os.path.isfile(full_path):
-                continue
-            file_name_no_ext = os.path.basename(file).rsplit('.', 1)[0]
-            if file_name_no_ext not in uploaded_for_host:
-                files_to_upload.append(full_path)
-                
-        return files_to_upload
+        store = job_store.get_store()
+        store.import_links(excel_file, sheet)
+
+        if entries is None: entries = dir_scanner.get_scanner().scan(source_dir).entries
+        names = sorted(entries)
+        settings = dict(content_index.DEFAULT_SETTINGS, **(hash_settings or {}))
+        hashes = content_index.index_files([entries[n].path for n in names], settings['mode'], settings['workers'],
+                                           {e.path: e.identity for e in entries.values()})
+        hashes = {os.path.basename(path): h for path, h in hashes.items()}
+        # Link cũ (từ Excel) cùng tên với file đang có được gắn hash, để lần sau nhận ra cả khi file bị đổi tên
+        store.record_hashes(excel_file, hashes)
+        return [entries[name].path for name in store.missing_for_host(excel_file, host, names, hashes)]
     except Exception as e:
         print(f"Lỗi khi tìm file cần upload: {e}")
         return []
@@ -0,0 +1,261 @@
+# /core/job_store.py
+import os
+import sqlite3
+import threading
+
+from . import excel_handler
+
+DEFAULT_DB_FILE = 'javshare.db'
+DONE_STATUS = 'downloaded'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    excel_file TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    name TEXT NOT NULL,
+    link TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT '',
+    excel_status TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (excel_file, sheet, name, link)
+);
+
+CREATE TABLE IF NOT EXISTS links (
+    excel_file TEXT NOT NULL,
+    name TEXT NOT NULL,
+    stem TEXT NOT NULL,
+    host TEXT NOT NULL,
+    link TEXT,
+    exported INTEGER NOT NULL DEFAULT 0,
+    content_hash TEXT,
+    full_hash TEXT,
+    UNIQUE (excel_file, name, host, link)
+);
+CREATE INDEX IF NOT EXISTS idx_links_name_host ON links (excel_file, stem, host);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    excel_file TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    mtime REAL,
+    size INTEGER,
+    PRIMARY KEY (excel_file, sheet)
+);
+"""
+
+# Cột được thêm sau khi bảng đã có trong database cũ: (bảng, cột, kiểu)
+ADDED_COLUMNS = [('links', 'content_hash', 'TEXT'), ('links', 'full_hash', 'TEXT')]
+# Index trên các cột thêm sau, tạo sau khi đã bổ sung cột
+POST_MIGRATION = """
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (excel_file, sheet, status);
+CREATE INDEX IF NOT EXISTS idx_links_hash ON links (excel_file, host, content_hash);
+"""
+
+def file_stem(name):
+    """Tên file bỏ phần mở rộng: cách so khớp file đã upload như trước đây."""
+    return str(name).rsplit('.', 1)[0]
+
+class JobStore:
+    """
+    Lưu tác vụ tải về và link đã upload trong SQLite (có index). Excel chỉ còn là nơi
+    nhập/xuất: import_* đọc lại sheet khi file Excel thay đổi, export_* ghi trạng thái ngược ra.
+    """
+
+    def __init__(self, db_file=DEFAULT_DB_FILE):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.executescript(SCHEMA)
+            self._migrate()
+
+    def _migrate(self):
+        """Bổ sung cột mới cho database tạo từ phiên bản trước."""
+        columns = {r['name'] for r in self.conn.execute('PRAGMA table_info(tasks)')}
+        if 'excel_status' not in columns:
+            # Bảng tasks cũ khoá theo số dòng: dựng lại với khoá (name, link), đọc lại sheet ở lần import tới
+            self.conn.executescript("""
+                ALTER TABLE tasks RENAME TO tasks_old;
+                DROP INDEX IF EXISTS idx_tasks_status;
+            """ + SCHEMA + """
+                INSERT OR REPLACE INTO tasks (excel_file, sheet, name, link, row_index, status)
+                    SELECT excel_file, sheet, COALESCE(name, ''), COALESCE(link, ''), row_index, status FROM tasks_old ORDER BY row_index;
+                DROP TABLE tasks_old;
+                DELETE FROM sync_state;
+            """)
+        for table, column, kind in ADDED_COLUMNS:
+            columns = {r['name'] for r in self.conn.execute(f'PRAGMA table_info({table})')}
+            if column not in columns: self.conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {kind}')
+        self.conn.executescript(POST_MIGRATION)
+
+    def _key(self, excel_file):
+        return os.path.abspath(excel_file)
+
+    def _changed(self, excel_file, sheet):
+        """Kiểm tra sheet có thay đổi so với lần import trước (theo mtime/size của file Excel)."""
+        st = os.stat(excel_file)
+        row = self.conn.execute('SELECT mtime, size FROM sync_state WHERE excel_file=? AND sheet=?',
+                                (self._key(excel_file), sheet)).fetchone()
+        return row is None or row['mtime'] != st.st_mtime or row['size'] != st.st_size
+
+    def _mark_synced(self, excel_file, sheet):
+        st = os.stat(excel_file)
+        self.conn.execute('INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)',
+                          (self._key(excel_file), sheet, st.st_mtime, st.st_size))
+
+    # --- TÁC VỤ TẢI VỀ ---
+
+    def import_tasks(self, excel_file, sheet, force=False):
+        """
+        Nạp sheet tác vụ (DownLoadUrl/DownLoadMagnetLink) vào store nếu Excel đã thay đổi. Trả về True nếu có đọc lại.
+        Tác vụ được nhận diện theo (Name, link) nên chèn/xoá/sắp xếp dòng trong Excel không làm lệch trạng thái.
+        Ô Downloaded khác với giá trị lần đồng bộ trước là do người dùng sửa: giá trị Excel thắng (xoá ô để tải lại);
+        ngược lại giữ trạng thái trong store (tác vụ đã tải xong nhưng chưa kịp ghi ra Excel).
+        """
+        with self.lock:
+            if not force and not self._changed(excel_file, sheet): return False
+        rows = excel_handler.read_table(excel_file, sheet, sheet)
+        key = self._key(excel_file)
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE tasks SET row_index=-1 WHERE excel_file=? AND sheet=?', (key, sheet))
+            self.conn.executemany(
+                """INSERT INTO tasks (excel_file, sheet, name, link, row_index, status, excel_status) VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (excel_file, sheet, name, link) DO UPDATE SET
+                       status = CASE WHEN excluded.excel_status = tasks.excel_status THEN tasks.status ELSE excluded.status END,
+                       excel_status = excluded.excel_status, row_index = excluded.row_index""",
+                [(key, sheet) + self._task_key(r) + (i,) + (str(r.get('Downloaded') or '').lower(),) * 2
+                 for i, r in enumerate(rows)],
+            )
+            # Dòng không còn trong sheet
+            self.conn.execute('DELETE FROM tasks WHERE excel_file=? AND sheet=? AND row_index=-1', (key, sheet))
+            self._mark_synced(excel_file, sheet)
+        return True
+
+    @staticmethod
+    def _task_key(row):
+        return str(row.get('Name') or ''), str(row.get('Url') or row.get('MagnetLink') or '')
+
+    def pending_tasks(self, excel_file, sheet):
+        """Các tác vụ chưa tải xong, theo thứ tự dòng hiện tại: list dict {row_index, name, link}."""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT row_index, name, link FROM tasks WHERE excel_file=? AND sheet=? AND status != ? ORDER BY row_index',
+                (self._key(excel_file), sheet, DONE_STATUS)).fetchall()
+        return [dict(r) for r in rows]
+
+    def set_task_status(self, excel_file, sheet, name, link, status=DONE_STATUS):
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE tasks SET status=? WHERE excel_file=? AND sheet=? AND name=? AND link=?',
+                              (status, self._key(excel_file), sheet, name, link))
+
+    def export_task_status(self, excel_file, sheet, column='Downloaded'):
+        """Ghi trạng thái 'downloaded' từ store ra cột Downloaded của sheet (một lần lưu workbook)."""
+        key = self._key(excel_file)
+        with self.lock:
+            done = {(r['name'], r['link']) for r in self.conn.execute(
+                'SELECT name, link FROM tasks WHERE excel_file=? AND sheet=? AND status=?', (key, sheet, DONE_STATUS))}
+        # Khớp theo nội dung dòng hiện tại của sheet, không theo vị trí lúc import
+        current = excel_handler.read_table(excel_file, sheet, sheet)
+        updates = {i: DONE_STATUS for i, r in enumerate(current)
+                   if self._task_key(r) in done and str(r.get(column) or '').lower() != DONE_STATUS}
+        if updates: excel_handler.update_cells(excel_file, sheet, sheet, column, updates)
+        with self.lock, self.conn:
+            self.conn.executemany('UPDATE tasks SET excel_status=? WHERE excel_file=? AND sheet=? AND name=? AND link=?',
+                                  [(DONE_STATUS, key, sheet) + k for k in done])
+            if updates: self._mark_synced(excel_file, sheet)
+        return len(updates)
+
+    # --- LINK ĐÃ UPLOAD ---
+
+    def import_links(self, excel_file, sheet='Host_Storage', force=False):
+        """Nạp bảng link đã upload vào store nếu Excel đã thay đổi. Trả về True nếu có đọc lại."""
+        with self.lock:
+            if not force and not self._changed(excel_file, sheet): return False
+        rows = excel_handler.read_table(excel_file, sheet, sheet)
+        key = self._key(excel_file)
+        with self.lock, self.conn:
+            self.conn.executemany(
+                """INSERT INTO links (excel_file, name, stem, host, link, exported) VALUES (?, ?, ?, ?, ?, 1)
+                   ON CONFLICT (excel_file, name, host, link) DO UPDATE SET exported = 1""",
+                [(key, str(r['Name']), file_stem(r['Name']), r.get('Host'), r.get('Link'))
+                 for r in rows if r.get('Name') and r.get('Host')],
+            )
+            self._mark_synced(excel_file, sheet)
+        return True
+
+    def add_link(self, excel_file, name, host, link, content_hash=None, full_hash=None, exported=False):
+        """
+        Thêm link vào store. exported=True: link đã/sẽ được ghi vào Excel theo đường khác (link_ledger),
+        export_links không ghi lại nó.
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                """INSERT INTO links (excel_file, name, stem, host, link, content_hash, full_hash, exported) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (excel_file, name, host, link) DO UPDATE SET
+                       content_hash = COALESCE(excluded.content_hash, links.content_hash),
+                       full_hash = COALESCE(excluded.full_hash, links.full_hash),
+                       exported = MAX(excluded.exported, links.exported)""",
+                (self._key(excel_file), name, file_stem(name), host, link, content_hash, full_hash, int(exported)))
+
+    def record_hashes(self, excel_file, hashes):
+        """
+        Gắn hash cho các link chưa có hash (vd. link nhập từ Excel) theo đúng tên file đang có trên đĩa;
+        hashes là dict tên file -> (hash mẫu, hash toàn bộ hoặc None).
+        """
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'UPDATE links SET content_hash=?, full_hash=COALESCE(?, full_hash) WHERE excel_file=? AND name=? AND content_hash IS NULL',
+                [(sample, full, self._key(excel_file), name) for name, (sample, full) in hashes.items()])
+
+    def missing_for_host(self, excel_file, host, names, hashes=None):
+        """
+        Trong các tên file `names`, trả về các tên chưa có trên host. File có hash (hashes: tên -> (hash mẫu,
+        hash toàn bộ)) được so theo nội dung, nên file đổi tên/chia lại giống hệt không bị upload lại và file khác
+        nội dung trùng tên vẫn được upload; chỉ link chưa có hash mới được so theo tên như trước.
+        """
+        hashes = hashes or {}
+        with self.lock, self.conn:
+            self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS candidates (name TEXT, stem TEXT, content_hash TEXT, full_hash TEXT)')
+            self.conn.execute('DELETE FROM candidates')
+            self.conn.executemany('INSERT INTO candidates VALUES (?, ?, ?, ?)',
+                                  [(n, file_stem(n)) + tuple(hashes.get(n, (None, None))) for n in names])
+            rows = self.conn.execute(
+                """SELECT name FROM candidates c
+                   WHERE NOT EXISTS (
+                       SELECT 1 FROM links l WHERE l.excel_file=:file AND l.host=:host AND l.content_hash=c.content_hash
+                           AND (l.full_hash IS NULL OR c.full_hash IS NULL OR l.full_hash=c.full_hash))
+                   AND NOT EXISTS (
+                       SELECT 1 FROM links l WHERE l.excel_file=:file AND l.stem=c.stem AND l.host=:host
+                           AND (l.content_hash IS NULL OR c.content_hash IS NULL))
+                   ORDER BY name""", {'file': self._key(excel_file), 'host': host}).fetchall()
+        return [r['name'] for r in rows]
+
+    def export_links(self, excel_file, sheet='Host_Storage'):
+        """
+        Ghi các link có trong store mà Excel chưa có vào bảng Host_Storage. Link upload mới đi vào Excel qua
+        link_ledger (add_link(..., exported=True)), nên ở đây chỉ còn các link thêm vào store theo cách khác.
+        """
+        with self.lock:
+            rows = self.conn.execute('SELECT rowid, name, link, host FROM links WHERE excel_file=? AND exported=0',
+                                     (self._key(excel_file),)).fetchall()
+        if not rows: return 0
+        written = excel_handler.write_rows(excel_file, sheet, sheet,
+                                           [{'Name': r['name'], 'Link': r['link'], 'Host': r['host']} for r in rows],
+                                           skip_existing=['Name', 'Link', 'Host'])
+        with self.lock, self.conn:
+            self.conn.executemany('UPDATE links SET exported=1 WHERE rowid=?', [(r['rowid'],) for r in rows])
+        return written
+
+    def close(self):
+        with self.lock: self.conn.close()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store(db_file=None):
+    """Store dùng chung trong tiến trình; lần gọi đầu quyết định đường dẫn file database."""
+    global _store
+    with _store_lock:
+        if _store is None: _store = JobStore(db_file or DEFAULT_DB_FILE)
+        return _store
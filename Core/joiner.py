@@ -3,53 +3,93 @@ import os
 import argparse
 import json
 import subprocess
+import sys
 import tempfile
+from typing import TYPE_CHECKING
 
-def main():
-    """Nối các file video thành một file duy nhất bằng ffmpeg."""
-    parser = argparse.ArgumentParser(description="Nối các file video bằng ffmpeg concat demuxer.")
-    parser.add_argument("--files-json", required=True, help="Chuỗi JSON chứa danh sách file cần nối, theo đúng thứ tự.")
-    parser.add_argument("--output-file", required=True, help="Đường dẫn file output sau khi nối.")
-    parser.add_argument("--delete-parts", action='store_true', help="Xóa các file thành phần sau khi nối thành công.")
-    args = parser.parse_args()
-    
-    temp_list_file = None
+try:
+    from . import probe_cache
+except ImportError:
+    import probe_cache
+
+if TYPE_CHECKING:
+    from core.worker_runner import JoinResult
+
+def warn_if_incompatible(files_to_join):
+    """
+    Cảnh báo (không chặn) khi các file có luồng/codec khác nhau, vì concat bằng stream copy có thể hỏng.
+    Thông tin luồng lấy qua cache probe dùng chung với splitter: file đã probe không bị chạy lại ffprobe,
+    và join_and_split dùng lại chính kết quả này khi lập chỉ mục gói.
+    """
     try:
-        files_to_join = json.loads(args.files_json)
-        if not files_to_join or len(files_to_join) < 2:
-            raise ValueError("Cần ít nhất 2 file để thực hiện việc nối.")
+        expected = probe_cache.stream_signature(files_to_join[0])
+        mismatched = [f for f in files_to_join[1:] if probe_cache.stream_signature(f) != expected]
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+        print(f"Cảnh báo: không đọc được luồng của file cần nối: {e}", file=sys.stderr); return
+    for file_path in mismatched:
+        print(f"Cảnh báo: luồng/codec của {os.path.basename(file_path)} khác {os.path.basename(files_to_join[0])}, "
+              f"file nối có thể bị lỗi.", file=sys.stderr)
 
-        # Tạo file text tạm thời chứa danh sách file cho ffmpeg
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt', encoding='utf-8') as tmp:
-            temp_list_file = tmp.name
+def write_concat_list(files_to_join):
+    """Ghi danh sách file cho concat demuxer ra một file text tạm, trả về đường dẫn file đó."""
+    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt', encoding='utf-8') as tmp:
+        try:
             for file_path in files_to_join:
                 if not os.path.exists(file_path): raise FileNotFoundError(f"File không tồn tại: {file_path}")
                 tmp.write(f"file '{os.path.abspath(file_path)}'\n")
-        
+        except Exception:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    return tmp.name
+
+def join_files(files_to_join, output_file, delete_parts=False) -> 'JoinResult':
+    """Nối các file video thành một file duy nhất bằng ffmpeg, trả về JoinResult."""
+    if not files_to_join or len(files_to_join) < 2:
+        raise ValueError("Cần ít nhất 2 file để thực hiện việc nối.")
+
+    temp_list_file = None
+    try:
+        # Tạo file text tạm thời chứa danh sách file cho ffmpeg
+        temp_list_file = write_concat_list(files_to_join)
+        warn_if_incompatible(files_to_join)
+
         # Lệnh ffmpeg để nối file mà không cần re-encode
         command = [
             'ffmpeg', '-f', 'concat', '-safe', '0', '-i', temp_list_file,
-            '-c', 'copy', '-y', args.output_file
+            '-c', 'copy', '-y', output_file
         ]
         subprocess.run(command, check=True, capture_output=True)
 
-        if not os.path.exists(args.output_file):
+        if not os.path.exists(output_file):
             raise RuntimeError("Nối file thất bại, không tìm thấy file output.")
 
-        if args.delete_parts:
+        if delete_parts:
             for file_path in files_to_join:
                 try: os.remove(file_path)
                 except OSError as e: print(f"Lỗi khi xóa {file_path}: {e}")
-        
-        print(json.dumps({"status": "success", "output_path": args.output_file}))
 
-    except Exception as e:
-        print(json.dumps({"status": "error", "message": str(e)}, indent=4))
-        exit(1)
+        return {"status": "success", "output_path": output_file}
     finally:
         # Luôn dọn dẹp file tạm
         if temp_list_file and os.path.exists(temp_list_file):
             os.remove(temp_list_file)
 
+def main():
+    """Nối các file video thành một file duy nhất bằng ffmpeg."""
+    parser = argparse.ArgumentParser(description="Nối các file video bằng ffmpeg concat demuxer.")
+    parser.add_argument("--files-json", required=True, help="Chuỗi JSON chứa danh sách file cần nối, theo đúng thứ tự.")
+    parser.add_argument("--output-file", required=True, help="Đường dẫn file output sau khi nối.")
+    parser.add_argument("--delete-parts", action='store_true', help="Xóa các file thành phần sau khi nối thành công.")
+    args = parser.parse_args()
+
+    try:
+        result = join_files(json.loads(args.files_json), args.output_file, args.delete_parts)
+        print(json.dumps(result))
+
+    except Exception as e:
+        print(json.dumps({"status": "error", "message": str(e)}, indent=4))
+        exit(1)
+
 if __name__ == '__main__':
     main()
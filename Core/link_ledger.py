@@ -0,0 +1,126 @@
+# /core/link_ledger.py
+import atexit
+import json
+import os
+import threading
+
+from . import excel_handler
+
+# Cột dùng để nhận ra một link đã có trong Excel (khi ghi lại journal sau sự cố)
+KEY_COLUMNS = ['Name', 'Link', 'Host']
+DEFAULT_SETTINGS = {'journal_dir': '.ledger', 'batch_size': 50, 'flush_interval': 60}
+
+class LinkLedger:
+    """
+    Sổ ghi link upload kiểu write-behind: mỗi link được ghi ngay (có fsync) vào journal
+    cục bộ, rồi được đẩy vào bảng Excel theo lô (đủ batch_size dòng, mỗi flush_interval
+    giây, hoặc khi close()). Journal chỉ được cắt bớt sau khi Excel đã lưu xong, nên nếu
+    tiến trình chết giữa chừng, lần chạy sau sẽ ghi nốt các link còn trong journal.
+    """
+
+    def __init__(self, excel_file, sheet_name='Host_Storage', table_name='Host_Storage',
+                 journal_dir='.ledger', batch_size=50, flush_interval=60):
+        self.excel_file = excel_file
+        self.sheet_name = sheet_name
+        self.table_name = table_name
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        os.makedirs(journal_dir, exist_ok=True)
+        name = f"{os.path.splitext(os.path.basename(excel_file))[0]}.{sheet_name}.jsonl"
+        self.journal_path = os.path.join(journal_dir, name)
+        self.lock = threading.Lock()
+        # Chỉ một luồng ghi Excel tại một thời điểm
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.pending = self._replay()
+        if self.pending: print(f" -> Journal còn {len(self.pending)} link chưa ghi vào Excel, sẽ ghi lại.")
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        self.thread = threading.Thread(target=self._run, name='link-ledger', daemon=True)
+        self.thread.start()
+
+    def _replay(self):
+        """Đọc các link còn nằm trong journal từ lần chạy trước."""
+        records = []
+        if not os.path.exists(self.journal_path): return records
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try: records.append(json.loads(line))
+                except ValueError: pass  # Dòng cuối bị ghi dở khi tiến trình chết
+        return records
+
+    def record(self, link_data):
+        """Ghi một link vào journal (bền vững ngay) và xếp hàng để đẩy vào Excel."""
+        with self.lock:
+            if self.closed: raise RuntimeError("Ledger đã đóng.")
+            self.journal.write(json.dumps(link_data, ensure_ascii=False) + '\n')
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.pending.append(link_data)
+            if len(self.pending) >= self.batch_size: self.wakeup.set()
+
+    def flush(self):
+        """Đẩy các link đang chờ vào Excel bằng một lần lưu workbook, rồi cắt chúng khỏi journal."""
+        with self.flush_lock:
+            with self.lock: batch = list(self.pending)
+            if not batch: return 0
+            written = excel_handler.write_rows(self.excel_file, self.sheet_name, self.table_name, batch, skip_existing=KEY_COLUMNS)
+            with self.lock:
+                # Giữ lại các link được ghi thêm trong lúc đang lưu Excel
+                self.pending = self.pending[len(batch):]
+                self._rewrite_journal()
+            print(f" -> Đã ghi {written} link vào Excel ({os.path.basename(self.excel_file)}).")
+            return written
+
+    def _rewrite_journal(self):
+        """Thay journal bằng danh sách link còn chờ (gọi khi đang giữ lock)."""
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for link_data in self.pending: f.write(json.dumps(link_data, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal.close()
+        os.replace(tmp_path, self.journal_path)
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def _run(self):
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            if self.closed: return
+            try: self.flush()
+            except Exception as e: print(f" -> Lỗi khi ghi link vào Excel, sẽ thử lại sau: {e}")
+
+    def close(self):
+        """Dừng luồng nền và ghi nốt mọi link còn chờ (link vẫn còn trong journal nếu ghi lỗi)."""
+        if self.closed: return
+        self.closed = True
+        self.wakeup.set()
+        self.thread.join()
+        try: self.flush()
+        except Exception as e: print(f" -> Lỗi khi ghi link vào Excel, {len(self.pending)} link vẫn còn trong journal: {e}")
+        with self.lock: self.journal.close()
+
+# --- LEDGER DÙNG CHUNG TRONG TIẾN TRÌNH (mỗi file Excel một ledger) ---
+
+_ledgers = {}
+_ledgers_lock = threading.Lock()
+
+def get_ledger(excel_file, settings=None):
+    with _ledgers_lock:
+        ledger = _ledgers.get(excel_file)
+        if ledger is None:
+            options = dict(DEFAULT_SETTINGS, **(settings or {}))
+            ledger = LinkLedger(excel_file, journal_dir=options['journal_dir'],
+                                batch_size=options['batch_size'], flush_interval=options['flush_interval'])
+            _ledgers[excel_file] = ledger
+        return ledger
+
+def close_all():
+    """Ghi nốt link của mọi ledger; được gọi khi kết thúc chương trình."""
+    with _ledgers_lock:
+        ledgers = list(_ledgers.values())
+        _ledgers.clear()
+    for ledger in ledgers: ledger.close()
+
+atexit.register(close_all)
@@ -0,0 +1,85 @@
+# /core/pipeline.py
+import queue
+import threading
+
+# Đánh dấu kết thúc luồng dữ liệu giữa các stage
+_STOP = object()
+
+class Stage:
+    """Một bước của pipeline: func(job) trả về job cho bước sau, hoặc None để dừng job đó."""
+
+    def __init__(self, name, func, workers=1, queue_size=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.inbox = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.threads = []
+
+class Pipeline:
+    """
+    Chạy các stage nối với nhau bằng hàng đợi có giới hạn. Khi một stage phía sau
+    chậm, hàng đợi đầy sẽ chặn stage phía trước (backpressure). max_inflight giới hạn
+    số job đã vào pipeline mà chưa ra khỏi stage cuối, để dung lượng đĩa không tăng mãi.
+    """
+
+    def __init__(self, stages, max_inflight=None, on_finish=None):
+        if not stages: raise ValueError("Pipeline cần ít nhất một stage.")
+        self.stages = stages
+        self.inflight = threading.BoundedSemaphore(int(max_inflight)) if max_inflight else None
+        self.on_finish = on_finish
+        self.closed = False
+        for index, stage in enumerate(self.stages):
+            stage.threads = [
+                threading.Thread(target=self._worker, args=(index,), name=f"{stage.name}-{n}", daemon=True)
+                for n in range(stage.workers)
+            ]
+        self.stoppers = []
+        for index, stage in enumerate(self.stages):
+            for t in stage.threads: t.start()
+            # Khi mọi worker của stage này thoát, báo dừng cho stage kế tiếp
+            stopper = threading.Thread(target=self._close_next, args=(index,), daemon=True)
+            stopper.start()
+            self.stoppers.append(stopper)
+
+    def put(self, job):
+        """Đưa job vào stage đầu tiên; chặn lại khi pipeline đang đầy."""
+        if self.closed: raise RuntimeError("Pipeline đã đóng.")
+        if self.inflight: self.inflight.acquire()
+        self.stages[0].inbox.put(job)
+
+    def _release(self, job, completed):
+        if self.inflight: self.inflight.release()
+        if self.on_finish:
+            try: self.on_finish(job, completed)
+            except Exception as e: print(f" -> Lỗi trong callback kết thúc job: {e}")
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        is_last = index == len(self.stages) - 1
+        while True:
+            job = stage.inbox.get()
+            if job is _STOP: return
+            try:
+                result = stage.func(job)
+            except Exception as e:
+                print(f" -> Lỗi ở bước '{stage.name}': {e}")
+                result = None
+            if result is None:
+                self._release(job, False)
+            elif is_last:
+                self._release(result, True)
+            else:
+                self.stages[index + 1].inbox.put(result)
+
+    def _close_next(self, index):
+        for t in self.stages[index].threads: t.join()
+        if index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1].workers):
+                self.stages[index + 1].inbox.put(_STOP)
+
+    def join(self):
+        """Không nhận thêm job, chờ mọi job đi hết pipeline."""
+        self.closed = True
+        for _ in range(self.stages[0].workers):
+            self.stages[0].inbox.put(_STOP)
+        for stopper in self.stoppers: stopper.join()
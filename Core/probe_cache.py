@@ -0,0 +1,100 @@
+# /core/probe_cache.py
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+
+# Có thể đổi qua biến môi trường (dùng chung cho cả khi chạy worker dạng subprocess)
+CACHE_FILE = os.environ.get('JAVSHARE_PROBE_CACHE', 'probe_cache.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    dev INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (path, kind)
+);
+CREATE INDEX IF NOT EXISTS idx_probes_inode ON probes (dev, inode, size, mtime_ns, kind);
+"""
+
+def file_identity(file_path):
+    st = os.stat(file_path)
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+class ProbeCache:
+    """
+    Lưu kết quả ffprobe (thông tin luồng, chỉ mục gói...) trong SQLite cục bộ, khoá theo
+    (đường dẫn, kích thước, mtime, inode). File không đổi thì không bị probe lại giữa các lần
+    chạy; file chỉ bị đổi tên (cùng inode, kích thước, mtime) vẫn dùng lại kết quả cũ.
+    """
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.executescript(SCHEMA)
+
+    def get(self, file_path, kind, compute, ident=None):
+        """
+        Trả về dữ liệu `kind` của file từ cache, hoặc gọi compute() (kết quả phải chuyển được sang JSON) rồi lưu lại.
+        ident: định danh file đã biết (vd. từ dir_scanner) để khỏi stat lại khi kết quả có sẵn trong cache.
+        """
+        path = os.path.abspath(file_path)
+        ident = tuple(ident) if ident else file_identity(file_path)
+        with self.lock, self.conn:
+            row = self.conn.execute('SELECT data FROM probes WHERE path=? AND kind=? AND dev=? AND inode=? AND size=? AND mtime_ns=?',
+                                    (path, kind) + ident).fetchone()
+            if row is None:
+                row = self.conn.execute('SELECT data FROM probes WHERE dev=? AND inode=? AND size=? AND mtime_ns=? AND kind=?',
+                                        ident + (kind,)).fetchone()
+                # File đã đổi tên: chuyển bản ghi sang đường dẫn mới
+                if row: self.conn.execute('UPDATE OR REPLACE probes SET path=? WHERE dev=? AND inode=? AND size=? AND mtime_ns=? AND kind=?',
+                                          (path,) + ident + (kind,))
+        if row: return json.loads(row[0])
+
+        data = compute()
+        # File thay đổi trong lúc probe (vd. đang tải dở) thì không lưu kết quả
+        if file_identity(file_path) == ident:
+            with self.lock, self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                  (path, kind) + ident + (json.dumps(data),))
+        return data
+
+    def close(self):
+        with self.lock: self.conn.close()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Cache dùng chung trong tiến trình."""
+    global _cache
+    with _cache_lock:
+        if _cache is None: _cache = ProbeCache()
+        return _cache
+
+# --- CÁC TRUY VẤN FFPROBE CÓ CACHE ---
+
+def probe_info(file_path):
+    """Thông tin format và các luồng của file (ffprobe -show_format -show_streams, dạng dict)."""
+    def run():
+        command = ['ffprobe', '-v', 'error', '-show_format', '-show_streams', '-of', 'json', file_path]
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        return json.loads(result.stdout)
+    return get_cache().get(file_path, 'info', run)
+
+def stream_signature(file_path):
+    """Danh sách (loại luồng, codec) theo thứ tự luồng: hai file nối được bằng stream copy khi giống nhau."""
+    return [(s.get('codec_type'), s.get('codec_name')) for s in probe_info(file_path).get('streams', [])]
+
+def get_duration(file_path):
+    """Thời lượng (giây), None nếu ffprobe không đọc được."""
+    try: return float(probe_info(file_path)['format']['duration'])
+    except (subprocess.CalledProcessError, OSError, KeyError, ValueError): return None
@@ -0,0 +1,163 @@
+# /core/upload_scheduler.py
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, wait
+
+from . import fair_scheduler
+
+STRATEGIES = ['fifo', 'size']
+
+class UploadScheduler:
+    """
+    Hàng đợi upload có giới hạn: tối đa max_concurrent upload cùng lúc và
+    tối đa host_limits[host] upload cho mỗi host. Ghi nhận thông lượng theo host.
+    Khi có weights (danh mục -> trọng số), slot trống được chia lượt theo trọng số giữa các danh mục.
+    """
+
+    def __init__(self, max_concurrent=4, host_limits=None, strategy='fifo', default_host_limit=None, weights=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Chiến lược hàng đợi không hợp lệ: {strategy}")
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.host_limits = {h: max(1, int(n)) for h, n in (host_limits or {}).items()}
+        self.default_host_limit = int(default_host_limit or self.max_concurrent)
+        self.strategy = strategy
+        self.share = fair_scheduler.FairShare(weights) if weights else None
+        self.pending = []
+        self.active = {}
+        self.stats = {}
+        self.cond = threading.Condition()
+        self.counter = itertools.count()
+        self.closed = False
+        self.workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.max_concurrent)]
+        for t in self.workers: t.start()
+
+    def submit(self, host, file_path, func, *args, category=None, **kwargs):
+        """Đưa một upload vào hàng đợi; func(*args, **kwargs) trả về True nếu thành công. Trả về Future."""
+        try: size = os.path.getsize(file_path)
+        except OSError: size = 0
+        future = Future()
+        with self.cond:
+            if self.closed: raise RuntimeError("Scheduler đã đóng, không nhận thêm upload.")
+            self.pending.append((next(self.counter), host, size, file_path, func, args, kwargs, future, category))
+            if self.strategy == 'size':
+                # File lớn chạy trước, cùng kích thước thì giữ thứ tự đưa vào
+                self.pending.sort(key=lambda job: (-job[2], job[0]))
+            self.cond.notify_all()
+        return future
+
+    def _host_limit(self, host):
+        return self.host_limits.get(host, self.default_host_limit)
+
+    def _take_job(self):
+        """
+        Lấy job đầu tiên trong hàng đợi mà host của nó còn slot trống (gọi khi đang giữ cond);
+        có chia lượt thì lấy job đầu tiên của danh mục tới lượt.
+        """
+        ready = [i for i, job in enumerate(self.pending) if self.active.get(job[1], 0) < self._host_limit(job[1])]
+        if not ready: return None
+        index = ready[0]
+        if self.share:
+            category = self.share.pick(list(dict.fromkeys(self.pending[i][8] for i in ready)))
+            index = next(i for i in ready if self.pending[i][8] == category)
+            self.share.charge(category)
+        host = self.pending[index][1]
+        self.active[host] = self.active.get(host, 0) + 1
+        return self.pending.pop(index)
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                job = self._take_job()
+                while job is None:
+                    if self.closed and not self.pending: return
+                    self.cond.wait()
+                    job = self._take_job()
+            _, host, size, file_path, func, args, kwargs, future, _ = job
+            started = time.monotonic()
+            try:
+                ok = bool(func(*args, **kwargs))
+                future.set_result(ok)
+            except Exception as e:
+                ok = False
+                print(f" -> Lỗi khi upload {os.path.basename(file_path)} lên {host}: {e}")
+                future.set_exception(e)
+            finished = time.monotonic()
+            with self.cond:
+                self.active[host] -= 1
+                self._record(host, size, started, finished, ok)
+                self.cond.notify_all()
+
+    def _record(self, host, size, started, finished, ok):
+        s = self.stats.setdefault(host, {'files': 0, 'failed': 0, 'bytes': 0, 'first_start': started, 'last_end': finished})
+        s['first_start'] = min(s['first_start'], started)
+        s['last_end'] = max(s['last_end'], finished)
+        if ok:
+            s['files'] += 1
+            s['bytes'] += size
+        else:
+            s['failed'] += 1
+
+    def join(self):
+        """Không nhận thêm upload, chờ mọi upload trong hàng đợi chạy xong."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        for t in self.workers: t.join()
+
+    def throughput(self):
+        """Trả về dict host -> {files, failed, bytes, seconds, mb_per_s}."""
+        report = {}
+        with self.cond:
+            for host, s in self.stats.items():
+                seconds = max(s['last_end'] - s['first_start'], 1e-6)
+                report[host] = {
+                    'files': s['files'], 'failed': s['failed'], 'bytes': s['bytes'],
+                    'seconds': round(seconds, 2), 'mb_per_s': round(s['bytes'] / seconds / (1024 * 1024), 2),
+                }
+        return report
+
+    def print_report(self):
+        for host, r in sorted(self.throughput().items()):
+            print(f" -> [{host}] {r['files']} file OK, {r['failed']} lỗi, "
+                  f"{r['bytes'] / (1024 * 1024):.1f}MB trong {r['seconds']}s ({r['mb_per_s']} MB/s)")
+
+    def view(self, category):
+        """Hàng đợi của một danh mục trên scheduler dùng chung (xem CategoryUploads)."""
+        return CategoryUploads(self, category)
+
+class CategoryUploads:
+    """
+    Cùng giao diện với UploadScheduler cho một danh mục, nhưng upload chạy trên scheduler dùng chung
+    (giới hạn tổng/theo host chung cho mọi danh mục); join() chỉ chờ các upload của danh mục này.
+    """
+
+    def __init__(self, scheduler, category):
+        self.scheduler = scheduler
+        self.category = category
+        self.futures = []
+        self.lock = threading.Lock()
+
+    def submit(self, host, file_path, func, *args, **kwargs):
+        future = self.scheduler.submit(host, file_path, func, *args, category=self.category, **kwargs)
+        with self.lock: self.futures.append(future)
+        return future
+
+    def join(self):
+        with self.lock: futures = list(self.futures)
+        wait(futures)
+
+    def print_report(self):
+        with self.lock: futures = list(self.futures)
+        failed = sum(1 for f in futures if f.exception() or not f.result())
+        print(f" -> [{self.category}] {len(futures) - failed} upload OK, {failed} lỗi (thống kê theo host in khi kết thúc)")
+
+def from_config(settings, host_settings, weights=None):
+    """Tạo scheduler từ section [upload] và [upload_hosts] của config.ini."""
+    return UploadScheduler(
+        max_concurrent=settings.get('max_concurrent', 4),
+        host_limits=host_settings,
+        strategy=settings.get('strategy', 'fifo'),
+        weights=weights,
+    )
@@ -0,0 +1,101 @@
+# /core/worker_runner.py
+import importlib
+import json
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, TypedDict, Union
+
+# --- KIỂU KẾT QUẢ CỦA CÁC WORKER (giống hệt hợp đồng JSON của các script CLI) ---
+
+class WorkerResult(TypedDict, total=False):
+    status: str
+    message: str
+
+class DownloadResult(WorkerResult, total=False):
+    save_path: str
+    files: List[str]
+
+class JoinResult(WorkerResult, total=False):
+    output_path: str
+
+class SplitResult(WorkerResult, total=False):
+    files: List[str]
+
+class UploadResult(WorkerResult, total=False):
+    upload_url: str
+    bytes_per_s: int
+
+# renamer trả về trực tiếp list đường dẫn mới
+RenameResult = List[str]
+# Kết quả của một worker bất kỳ (lỗi luôn ở dạng WorkerResult)
+AnyResult = Union[DownloadResult, JoinResult, SplitResult, UploadResult, RenameResult, WorkerResult]
+
+# Tên worker -> (module import được, hàm, script CLI tương ứng)
+WORKERS = {
+    'renamer': ('core.renamer', 'rename_files', 'core/renamer.py'),
+    'joiner': ('core.joiner', 'join_files', 'core/joiner.py'),
+    'splitter': ('core.ffmpeg_splitter', 'split_video', 'core/ffmpeg_splitter.py'),
+    'url_downloader': ('downloaders.url_downloader', 'download_url', 'downloaders/url_downloader.py'),
+    'torrent_downloader': ('downloaders.torrent_downloader', 'download_torrent', 'downloaders/torrent_downloader.py'),
+    'magnet_downloader': ('downloaders.magnet_downloader', 'download_magnet', 'downloaders/magnet_downloader.py'),
+    'nitroflare_uploader': ('uploaders.nitroflare_uploader', 'upload_file', 'uploaders/nitroflare_uploader.py'),
+    'keep2share_uploader': ('uploaders.keep2share_uploader', 'upload_file', 'uploaders/keep2share_uploader.py'),
+    'rapidgator_uploader': ('uploaders.rapidgator_uploader', 'upload_file', 'uploaders/rapidgator_uploader.py'),
+}
+
+# Chế độ thực thi: 'inprocess' gọi hàm trực tiếp, 'subprocess' chạy script như trước
+MODES = ['inprocess', 'subprocess']
+settings = {'mode': 'inprocess', 'pool_size': 1}
+
+def configure(mode=None, pool_size=None):
+    """Đặt chế độ thực thi và số worker song song cho toàn bộ tiến trình."""
+    if mode:
+        if mode not in MODES: raise ValueError(f"Chế độ thực thi không hợp lệ: {mode}")
+        settings['mode'] = mode
+    if pool_size: settings['pool_size'] = max(1, int(pool_size))
+
+def has_worker(name):
+    """Kiểm tra worker có được khai báo và script tương ứng có tồn tại không."""
+    return name in WORKERS and os.path.exists(WORKERS[name][2])
+
+def get_worker_function(name):
+    """Import (một lần, có cache của Python) và trả về hàm worker."""
+    module_name, func_name, _ = WORKERS[name]
+    return getattr(importlib.import_module(module_name), func_name)
+
+def run_module(command_args) -> AnyResult:
+    """Thực thi một module worker và trả về kết quả JSON một cách an toàn."""
+    try:
+        process = subprocess.run(
+            command_args, capture_output=True, text=True, check=True, encoding='utf-8'
+        )
+        if not process.stdout.strip(): return {}
+        return json.loads(process.stdout)
+    except json.JSONDecodeError:
+        return {"status": "error", "message": f"Invalid JSON: {process.stdout}"}
+    except subprocess.CalledProcessError as e:
+        return {"status": "error", "message": f"Lỗi thực thi: {e.stderr or e.stdout}"}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def run_inprocess(name, **kwargs) -> AnyResult:
+    """Gọi hàm worker ngay trong tiến trình hiện tại, lỗi được quy về dạng JSON như script."""
+    try:
+        return get_worker_function(name)(**kwargs)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def run_worker(name, cli_args, **kwargs) -> AnyResult:
+    """Chạy worker theo chế độ hiện tại; cli_args dùng cho subprocess, kwargs cho inprocess."""
+    if settings['mode'] == 'subprocess':
+        return run_module(['python3', WORKERS[name][2]] + [str(a) for a in cli_args])
+    return run_inprocess(name, **kwargs)
+
+def map_worker(name, calls: List[Tuple[list, dict]]) -> List[AnyResult]:
+    """Chạy nhiều lần cùng một worker trên pool (calls là list (cli_args, kwargs)), giữ nguyên thứ tự kết quả."""
+    if settings['pool_size'] <= 1 or len(calls) <= 1:
+        return [run_worker(name, cli_args, **kwargs) for cli_args, kwargs in calls]
+    with ThreadPoolExecutor(max_workers=settings['pool_size']) as pool:
+        futures = [pool.submit(run_worker, name, cli_args, **kwargs) for cli_args, kwargs in calls]
+        return [f.result() for f in futures]
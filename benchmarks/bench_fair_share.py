@@ -0,0 +1,55 @@
+# /benchmarks/bench_fair_share.py
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Chạy được từ thư mục gốc của repo: python3 benchmarks/bench_fair_share.py
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+from core import fair_scheduler
+
+def run(categories, limit, task_seconds, scheduler=None):
+    """Mỗi danh mục gửi các tác vụ của mình; trả về thời điểm (giây) danh mục xong tác vụ cuối cùng."""
+    fifo = threading.Semaphore(limit)
+    done = {}
+    start = time.perf_counter()
+
+    def task(category):
+        if scheduler: ctx = scheduler.slot('download', category)
+        else: ctx = fifo
+        with ctx: time.sleep(task_seconds)
+        done[category] = round(time.perf_counter() - start, 2)
+
+    # Danh mục nhiều việc gửi hết tác vụ trước, như khi một danh mục có cả trăm dòng mới trong Excel
+    tasks = [name for name, count, _ in categories for _ in range(count)]
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        for category in tasks:
+            pool.submit(task, category)
+            time.sleep(0.001)
+    return done
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh hàng đợi FIFO chung với fair_scheduler khi một danh mục có nhiều tác vụ.")
+    parser.add_argument("--busy-tasks", type=int, default=20, help="Số tác vụ của danh mục bận.")
+    parser.add_argument("--light-tasks", type=int, default=2, help="Số tác vụ của mỗi danh mục còn lại.")
+    parser.add_argument("--limit", type=int, default=2, help="Số tác vụ chạy cùng lúc.")
+    parser.add_argument("--task-seconds", type=float, default=0.1, help="Thời gian giả lập mỗi tác vụ.")
+    args = parser.parse_args()
+
+    categories = [('Censored', args.busy_tasks, 1), ('Demosaic', args.light_tasks, 1), ('Uncensored', args.light_tasks, 2)]
+    weights = {name: weight for name, _, weight in categories}
+    results = {
+        "fifo_finish_s": run(categories, args.limit, args.task_seconds),
+        "fair_finish_s": run(categories, args.limit, args.task_seconds,
+                             fair_scheduler.FairScheduler({'max_downloads': args.limit}, weights)),
+    }
+    print(json.dumps(results, indent=4))
+
+if __name__ == '__main__':
+    main()
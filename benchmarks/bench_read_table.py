@@ -0,0 +1,83 @@
+# /benchmarks/bench_read_table.py
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Chạy được từ thư mục gốc của repo: python3 benchmarks/bench_read_table.py
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+import openpyxl
+from openpyxl.worksheet.table import Table
+
+from core import excel_handler
+
+def make_workbook(path, num_rows):
+    """Tạo workbook có bảng Host_Storage với num_rows dòng."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'Host_Storage'
+    ws.append(['Name', 'Link', 'Host'])
+    for i in range(num_rows):
+        ws.append([f'ABC-{i:06d}_part1.mp4', f'https://rapidgator.net/file/{i:032x}', 'rapidgator.com'])
+    ws.add_table(Table(displayName='Host_Storage', ref=f'A1:C{num_rows + 1}'))
+    wb.save(path)
+
+def legacy_read_table(file_path, sheet_name, table_name):
+    """Cách đọc cũ: mở workbook đầy đủ, tạo mọi Cell trong vùng bảng, đi qua DataFrame của pandas."""
+    import pandas as pd
+    ws = openpyxl.load_workbook(file_path)[sheet_name]
+    rows = list(ws[ws.tables[table_name].ref])
+    header = [cell.value for cell in rows[0]]
+    data = [[cell.value for cell in row] for row in rows[1:]]
+    return pd.DataFrame(data, columns=header).to_dict(orient='records')
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def import_time(module):
+    """Thời gian import một module trong tiến trình python mới (giây)."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    return float(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=ROOT_DIR).stdout)
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh read_table cũ (pandas) với đường đọc streaming có cache.")
+    parser.add_argument("-n", "--num-rows", type=int, default=50000, help="Số dòng của bảng thử.")
+    args = parser.parse_args()
+
+    # pandas không còn trong requirements.txt; chỉ benchmark này cần để chạy lại cách đọc cũ
+    try: import pandas  # noqa: F401
+    except ImportError: sys.exit("Benchmark này cần pandas để so với cách đọc cũ: pip install pandas")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench_excel_') as work_dir:
+        path = os.path.join(work_dir, 'links.xlsx')
+        make_workbook(path, args.num_rows)
+
+        legacy_s, legacy_rows = timed(lambda: legacy_read_table(path, 'Host_Storage', 'Host_Storage'))
+        cold_s, rows = timed(lambda: excel_handler.read_table(path, 'Host_Storage', 'Host_Storage'))
+        cached_s, cached_rows = timed(lambda: excel_handler.read_table(path, 'Host_Storage', 'Host_Storage'))
+        first_s, _ = timed(lambda: next(excel_handler.iter_table(path, 'Host_Storage', 'Host_Storage')))
+        if rows != legacy_rows or cached_rows != rows: raise RuntimeError("Kết quả đọc khác với cách đọc cũ.")
+
+        results = {
+            "rows": len(rows),
+            "legacy_pandas_s": round(legacy_s, 2),
+            "streaming_cold_s": round(cold_s, 2),
+            "cached_s": round(cached_s, 4),
+            "iter_first_row_s": round(first_s, 3),
+            "import_pandas_s": round(import_time('pandas'), 2),
+            "import_excel_handler_s": round(import_time('core.excel_handler'), 2),
+            "speedup_cold": round(legacy_s / max(cold_s, 1e-9), 1),
+        }
+    print(json.dumps(results, indent=4))
+
+if __name__ == '__main__':
+    main()
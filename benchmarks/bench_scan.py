@@ -0,0 +1,63 @@
+# /benchmarks/bench_scan.py
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Chạy được từ thư mục gốc của repo: python3 benchmarks/bench_scan.py
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+from core import dir_scanner
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return round((time.perf_counter() - start) * 1000, 2), result
+
+def legacy_list(folder):
+    return [os.path.join(folder, f) for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f))]
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh liệt kê thư mục cũ (listdir + isfile) với dir_scanner (quét lần đầu/lặp lại/đọc lại thư mục).")
+    parser.add_argument("--folder", help="Thư mục cần quét (mặc định: tạo thư mục tạm với --files file rỗng).")
+    parser.add_argument("--files", type=int, default=5000, help="Số file tạo trong thư mục tạm.")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='bench_scan_')
+    folder = args.folder or os.path.join(work, 'files')
+    try:
+        if not args.folder:
+            os.makedirs(folder)
+            for i in range(args.files): open(os.path.join(folder, f'ABC-{i:05d}_part1.mp4'), 'wb').close()
+            # mtime cũ để các file không bị xem là đang ghi
+            old = time.time() - 3600
+            for name in os.listdir(folder): os.utime(os.path.join(folder, name), (old, old))
+            os.utime(folder, (old, old))
+
+        scanner = dir_scanner.DirScanner(os.path.join(work, 'snapshot.db'))
+        results = {"files": len(legacy_list(folder))}
+        results["legacy_listdir_isfile_ms"], _ = timed(lambda: legacy_list(folder))
+        results["scan_cold_ms"], cold = timed(lambda: scanner.scan(folder))
+        results["scan_warm_ms"], warm = timed(lambda: scanner.scan(folder))
+        results["warm_changes"] = len(warm.added) + len(warm.changed) + len(warm.removed)
+        # Như trên Drive FUSE (trust_dir_mtime=auto -> không tin): luôn đọc lại thư mục, chỉ stat file mới/bị thay
+        scanner.trust_dir_mtime = False
+        results["scan_warm_relist_ms"], relisted = timed(lambda: scanner.scan(folder))
+        results["relist_matches_cold"] = relisted.entries == cold.entries
+        scanner.trust_dir_mtime = 'auto'
+        if not args.folder:
+            open(os.path.join(folder, 'NEW-001.mp4'), 'wb').close()
+            results["scan_after_add_ms"], after = timed(lambda: scanner.scan(folder))
+            results["reported_added"] = after.added
+        scanner.close()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    print(json.dumps(results, indent=4))
+
+if __name__ == '__main__':
+    main()
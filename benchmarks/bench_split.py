@@ -0,0 +1,98 @@
+# /benchmarks/bench_split.py
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Chạy được từ thư mục gốc của repo: python3 benchmarks/bench_split.py
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+from core import ffmpeg_splitter
+
+READ_STATS = re.compile(r'Statistics: (\d+) bytes read')
+
+def make_source(path, seconds):
+    """Tạo video thử (H.264 + AAC) bằng nguồn lavfi của ffmpeg."""
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=1280x720:rate=30', '-f', 'lavfi', '-i', 'sine=frequency=440',
+        '-t', str(seconds), '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '60', '-c:a', 'aac', '-shortest', '-y', path,
+    ], check=True)
+
+def run_measured(command):
+    """Chạy ffmpeg ở mức log debug để lấy số byte đọc từ file nguồn (thống kê AVIOContext)."""
+    command = [a if a != 'error' else 'debug' for a in command]
+    result = subprocess.run(command, check=True, capture_output=True, text=True)
+    return sum(int(n) for n in READ_STATS.findall(result.stderr))
+
+def drop_caches():
+    """Xoá page cache (cần quyền root) để mô phỏng đọc từ ổ mạng chưa có cache."""
+    try:
+        subprocess.run(['sync'], check=True)
+        with open('/proc/sys/vm/drop_caches', 'w') as f: f.write('3')
+        return True
+    except OSError:
+        return False
+
+def legacy_split(file_path, num_parts, duration):
+    """Cách chia tự động cũ: mỗi phần một tiến trình ffmpeg (-ss trước -i, -t độ dài phần)."""
+    base_name, extension = os.path.splitext(file_path)
+    per_part = duration / num_parts
+    total_read = 0
+    for i in range(num_parts):
+        total_read += run_measured([
+            'ffmpeg', '-v', 'error', '-ss', str(i * per_part), '-i', file_path,
+            '-t', str(per_part), '-c', 'copy', '-y', f"{base_name}_part{i + 1}{extension}",
+        ])
+    return total_read
+
+def segment_split(file_path, num_parts, duration):
+    per_part = duration / num_parts
+    return run_measured(ffmpeg_splitter.segment_command(file_path, [i * per_part for i in range(1, num_parts)]))
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh số byte đọc và thời gian giữa chia từng phần (cũ) và segment muxer.")
+    parser.add_argument("--input", help="Video nguồn có sẵn (mặc định: tự tạo video thử).")
+    parser.add_argument("--seconds", type=int, default=300, help="Độ dài video thử tự tạo (giây).")
+    parser.add_argument("--parts", type=int, default=5, help="Số phần cần chia.")
+    parser.add_argument("--drop-caches", action='store_true', help="Xoá page cache trước mỗi lần chạy (cần root).")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench_split_') as work_dir:
+        source = os.path.join(work_dir, 'source' + (os.path.splitext(args.input)[1] if args.input else '.mp4'))
+        if args.input: shutil.copyfile(args.input, source)
+        else: make_source(source, args.seconds)
+        size = os.path.getsize(source)
+        duration = ffmpeg_splitter.get_video_duration(source)
+        if not duration: raise SystemExit(f"Không đọc được thời lượng của {args.input or source}.")
+        results["source_mb"] = round(size / (1024 * 1024), 1)
+        results["parts"] = args.parts
+
+        for label, func in (('legacy_per_part', legacy_split), ('segment_muxer', segment_split)):
+            cold = args.drop_caches and drop_caches()
+            start = time.perf_counter()
+            bytes_read = func(source, args.parts, duration)
+            elapsed = time.perf_counter() - start
+            parts = sorted(f for f in os.listdir(work_dir) if '_part' in f)
+            results[label] = {
+                "total_s": round(elapsed, 2),
+                "bytes_read": bytes_read,
+                "reads_of_source": round(bytes_read / size, 2),
+                "parts_written": len(parts),
+                "parts_total_mb": round(sum(os.path.getsize(os.path.join(work_dir, f)) for f in parts) / (1024 * 1024), 1),
+                "cold_cache": bool(cold),
+            }
+            for f in parts: os.remove(os.path.join(work_dir, f))
+
+    results["speedup"] = round(results['legacy_per_part']['total_s'] / max(results['segment_muxer']['total_s'], 1e-9), 2)
+    print(json.dumps(results, indent=4))
+
+if __name__ == '__main__':
+    main()
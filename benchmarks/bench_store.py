@@ -0,0 +1,74 @@
+# /benchmarks/bench_store.py
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Chạy được từ thư mục gốc của repo: python3 benchmarks/bench_store.py
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+from core import file_transfer
+
+def make_files(folder, count, size_mb):
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f'ABC-{i:03d}_part1.mp4')
+        with open(path, 'wb') as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(size_mb): f.write(block)
+        paths.append(path)
+    return paths
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return round(time.perf_counter() - start, 2)
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh bước lưu trữ cũ (shutil.move từng file) với file_transfer.move_files.")
+    parser.add_argument("--source-root", default='/dev/shm', help="Thư mục nguồn (ổ tạm nhanh).")
+    parser.add_argument("--target-root", default=tempfile.gettempdir(), help="Thư mục đích (nên ở filesystem khác nguồn).")
+    parser.add_argument("--files", type=int, default=4, help="Số file.")
+    parser.add_argument("--size-mb", type=int, default=256, help="Dung lượng mỗi file (MB).")
+    parser.add_argument("--workers", type=int, default=4, help="Số file chép song song.")
+    parser.add_argument("--verify", choices=file_transfer.VERIFY_MODES, default='size')
+    args = parser.parse_args()
+
+    source = tempfile.mkdtemp(prefix='bench_store_src_', dir=args.source_root)
+    target = tempfile.mkdtemp(prefix='bench_store_dst_', dir=args.target_root)
+    results = {"cross_device": not file_transfer.same_device(source, target)}
+    try:
+        paths = make_files(source, args.files, args.size_mb)
+        os.sync()
+        results["legacy_shutil_move_s"] = timed(lambda: [shutil.move(p, os.path.join(target, os.path.basename(p))) for p in paths])
+        # shutil.move không đợi dữ liệu xuống đĩa: thời gian tới khi bản chép thật sự bền vững
+        results["legacy_shutil_move_then_sync_s"] = round(results["legacy_shutil_move_s"] + timed(os.sync), 2)
+        for name in os.listdir(target): os.remove(os.path.join(target, name))
+
+        for mode in file_transfer.FSYNC_MODES:
+            paths = make_files(source, args.files, args.size_mb)
+            expected = file_transfer.file_hash(paths[0])
+            os.sync()
+            moved = []
+            results[f"move_files_fsync_{mode}_s"] = timed(lambda: moved.extend(file_transfer.move_files(paths, target, args.workers, args.verify, mode)))
+            results["errors"] = results.get("errors", []) + [str(e) for _, _, e in moved if e]
+            results["content_match"] = results.get("content_match", True) and file_transfer.file_hash(moved[0][1]) == expected
+            if mode != file_transfer.FSYNC_MODES[-1]:
+                for _, dst, _ in moved: os.remove(dst)
+
+        # Cùng filesystem: chỉ đổi tên
+        renamed_dir = os.path.join(target, 'renamed')
+        results["same_device_rename_s"] = timed(lambda: file_transfer.move_files([d for _, d, _ in moved], renamed_dir, args.workers))
+    finally:
+        shutil.rmtree(source, ignore_errors=True)
+        shutil.rmtree(target, ignore_errors=True)
+    print(json.dumps(results, indent=4))
+
+if __name__ == '__main__':
+    main()
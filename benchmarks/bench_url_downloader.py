@@ -0,0 +1,132 @@
+# /benchmarks/bench_url_downloader.py
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Chạy được từ thư mục gốc của repo: python3 benchmarks/bench_url_downloader.py
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+from downloaders import url_downloader
+
+def make_handler(file_path, rate_per_conn, support_range, budget):
+    """
+    Handler phục vụ một file, giới hạn tốc độ mỗi kết nối (giống host giới hạn theo TCP).
+    budget['bytes'] khác None thì server cắt mọi kết nối sau khi đã gửi chừng đó byte (giả lập mất mạng).
+    """
+    size = os.path.getsize(file_path)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args): pass
+
+        def do_GET(self):
+            start, end = 0, size - 1
+            range_header = self.headers.get('Range')
+            if support_range and range_header and range_header.startswith('bytes='):
+                first, _, last = range_header[6:].partition('-')
+                start, end = int(first), min(int(last) if last else size - 1, size - 1)
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+                self.send_header('Accept-Ranges', 'bytes')
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.end_headers()
+
+            block = 64 * 1024
+            began, sent = time.monotonic(), 0
+            with open(file_path, 'rb') as f:
+                f.seek(start)
+                remaining = end - start + 1
+                try:
+                    while remaining > 0:
+                        data = f.read(min(block, remaining))
+                        with lock:
+                            if budget['bytes'] is not None:
+                                if budget['bytes'] <= 0: return
+                                budget['bytes'] -= len(data)
+                        self.wfile.write(data)
+                        remaining -= len(data)
+                        sent += len(data)
+                        delay = sent / rate_per_conn - (time.monotonic() - began)
+                        if delay > 0: time.sleep(delay)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+    return Handler
+
+def serve(file_path, rate_per_conn, support_range, budget=None):
+    budget = budget if budget is not None else {'bytes': None}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(file_path, rate_per_conn, support_range, budget))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def timed_download(url, out_dir, name, connections):
+    start = time.perf_counter()
+    result = url_downloader.download_url(url, out_dir, name, connections=connections)
+    elapsed = time.perf_counter() - start
+    if result.get('status') != 'success': raise RuntimeError(result)
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh tải URL một kết nối và nhiều kết nối trên server HTTP cục bộ.")
+    parser.add_argument("--size-mb", type=int, default=64, help="Dung lượng file thử (MB).")
+    parser.add_argument("--rate-mb", type=float, default=8, help="Tốc độ tối đa mỗi kết nối (MB/s).")
+    parser.add_argument("-c", "--connections", type=int, default=8, help="Số kết nối cho chế độ chia đoạn.")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench_url_') as work_dir:
+        src = os.path.join(work_dir, 'source.bin')
+        with open(src, 'wb') as f:
+            for _ in range(args.size_mb): f.write(os.urandom(1024 * 1024))
+        rate = args.rate_mb * 1024 * 1024
+        out_dir = os.path.join(work_dir, 'out')
+
+        budget = {'bytes': None}
+        ranged = serve(src, rate, support_range=True, budget=budget)
+        url = f'http://127.0.0.1:{ranged.server_port}/source.bin'
+        for label, connections in (('single', 1), ('segmented', args.connections)):
+            elapsed = timed_download(url, out_dir, f'{label}.bin', connections)
+            results[label] = {"connections": connections, "total_s": round(elapsed, 2),
+                              "mb_per_s": round(args.size_mb / elapsed, 1)}
+
+        # Cắt kết nối khi mới tải được một nửa, rồi chạy lại: phần đã có được giữ trong .part/.part.json
+        budget['bytes'] = args.size_mb * 1024 * 1024 // 2
+        try:
+            timed_download(url, out_dir, 'resumed.bin', args.connections)
+            raise RuntimeError("Lần tải bị cắt kết nối lẽ ra phải thất bại.")
+        except Exception as e:
+            if not os.path.exists(os.path.join(out_dir, 'resumed.bin.part.json')): raise RuntimeError(f"Không còn file trạng thái: {e}")
+        with open(os.path.join(out_dir, 'resumed.bin.part.json'), encoding='utf-8') as f:
+            kept = sum(seg[2] for seg in json.load(f)['segments'])
+        budget['bytes'] = None
+        elapsed = timed_download(url, out_dir, 'resumed.bin', args.connections)
+        results['resume'] = {"mb_kept": round(kept / (1024 * 1024), 1), "total_s": round(elapsed, 2)}
+        ranged.shutdown()
+
+        plain = serve(src, rate, support_range=False)
+        elapsed = timed_download(f'http://127.0.0.1:{plain.server_port}/source.bin', out_dir, 'fallback.bin', args.connections)
+        results['no_range_fallback'] = {"total_s": round(elapsed, 2), "mb_per_s": round(args.size_mb / elapsed, 1)}
+        plain.shutdown()
+
+        with open(src, 'rb') as f: expected = f.read()
+        for name in ('single.bin', 'segmented.bin', 'resumed.bin', 'fallback.bin'):
+            path = os.path.join(out_dir, name)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    if f.read() != expected: raise RuntimeError(f"Nội dung {name} không khớp với file nguồn.")
+
+    results["speedup"] = round(results['single']['total_s'] / max(results['segmented']['total_s'], 1e-9), 1)
+    print(json.dumps(results, indent=4))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# /benchmarks/bench_worker_overhead.py
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Chạy được từ thư mục gốc của repo: python3 benchmarks/bench_worker_overhead.py
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+from core import worker_runner
+
+def run_renames(mode, work_dir, num_tasks):
+    """Tạo num_tasks file rỗng rồi đổi tên từng file một qua renamer, trả về tổng thời gian (giây)."""
+    worker_runner.configure(mode=mode)
+    paths = []
+    for i in range(num_tasks):
+        path = os.path.join(work_dir, f"{mode}_{i}.tmp")
+        open(path, 'wb').close()
+        paths.append(path)
+
+    start = time.perf_counter()
+    for i, path in enumerate(paths):
+        base_name = f"{mode}_renamed_{i}"
+        cli_args = ['--files-json', json.dumps([path]), '--base-name', base_name]
+        result = worker_runner.run_worker('renamer', cli_args, files_to_rename=[path], base_name=base_name)
+        if not isinstance(result, list): raise RuntimeError(f"Đổi tên thất bại ({mode}): {result}")
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh chi phí mỗi tác vụ giữa chế độ subprocess và inprocess.")
+    parser.add_argument("-n", "--num-tasks", type=int, default=50, help="Số tác vụ đổi tên cho mỗi chế độ.")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bench_worker_') as work_dir:
+        for mode in worker_runner.MODES:
+            elapsed = run_renames(mode, work_dir, args.num_tasks)
+            results[mode] = {"total_s": round(elapsed, 4), "per_task_ms": round(elapsed * 1000 / args.num_tasks, 3)}
+
+    results["speedup"] = round(results['subprocess']['total_s'] / max(results['inprocess']['total_s'], 1e-9), 1)
+    print(json.dumps(results, indent=4))
+
+if __name__ == '__main__':
+    main()
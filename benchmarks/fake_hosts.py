@@ -0,0 +1,197 @@
+# /benchmarks/fake_hosts.py
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Chạy được từ thư mục gốc của repo: python3 benchmarks/fake_hosts.py
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+# Thông tin tài khoản giả; token phiên/chữ ký form do server cấp (server.token) và có thể bị thu hồi
+USER_HASH = 'fake-user-hash'
+ACCESS_TOKEN = 'fake-access-token'
+
+class FakeHostHandler(BaseHTTPRequestHandler):
+    """Giả lập API upload của Nitroflare, Keep2Share và Rapidgator trên cùng một server cục bộ."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args): pass
+
+    def setup(self):
+        super().setup()
+        self.server.count('connections')
+
+    def send_json(self, data, status=200):
+        self.send_text(json.dumps(data), status, 'application/json')
+
+    def send_text(self, text, status=200, content_type='text/plain'):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def receive_multipart(self):
+        """Đọc body multipart theo từng khối (không giữ cả file trong RAM), trả về (các field, số byte của file)."""
+        boundary = self.headers['Content-Type'].split('boundary=', 1)[1].encode()
+        remaining = int(self.headers['Content-Length'])
+        head, tail, total = b'', b'', remaining
+        while remaining > 0:
+            data = self.rfile.read(min(1024 * 1024, remaining))
+            if not data: break
+            remaining -= len(data)
+            if len(head) < 64 * 1024: head += data[:64 * 1024 - len(head)]
+            tail = (tail + data)[-256:]
+
+        fields, file_start = {}, None
+        for part in head.split(b'--' + boundary)[1:]:
+            headers, sep, value = part.partition(b'\r\n\r\n')
+            if b'filename=' in headers:
+                file_start = head.index(headers) + len(headers) + len(sep)
+                break
+            name = headers.split(b'name="', 1)[1].split(b'"', 1)[0].decode()
+            fields[name] = value[:-2].decode()
+        closing = b'\r\n--' + boundary + b'--\r\n'
+        if file_start is None or not tail.endswith(closing): return fields, None
+        return fields, total - file_start - len(closing)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        base = f'http://127.0.0.1:{self.server.server_port}'
+        self.server.count('api_calls')
+        if url.path == '/plugins/fileupload/getServer':
+            return self.send_text(f'{base}/nf/upload')
+        if url.path == '/api/v2/file/upload':
+            query = parse_qs(url.query)
+            if query.get('token') != [self.server.token]: return self.send_json({'status': 401, 'response': None}, 401)
+            return self.send_json({'status': 200, 'response': {'url': f'{base}/rg/upload'}})
+        self.send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        base = f'http://127.0.0.1:{self.server.server_port}'
+        if url.path == '/api/v2/getUploadFormData':
+            self.server.count('api_calls')
+            if json.loads(self.read_body() or b'{}').get('access_token') != ACCESS_TOKEN:
+                return self.send_json({'status': 'error', 'code': 401}, 401)
+            return self.send_json({'form_action': f'{base}/k2s/upload', 'file_field': 'Filedata',
+                                   'form_data': {'ajax': 'true', 'params': 'p', 'signature': self.server.token}})
+        if url.path == '/api/v2/user/login':
+            self.server.count('api_calls')
+            form = parse_qs(self.read_body().decode())
+            if form.get('login') != ['user'] or form.get('password') != ['pass']:
+                return self.send_json({'status': 401, 'response': None}, 401)
+            return self.send_json({'status': 200, 'response': {'token': self.server.token}})
+
+        if url.path in ('/nf/upload', '/k2s/upload', '/rg/upload'):
+            fields, size = self.receive_multipart()
+            self.server.received.append((url.path, fields, size))
+            if size is None: return self.send_json({'error': 'multipart không hợp lệ'}, 400)
+            file_id = f'id{len(self.server.received)}'
+            if url.path == '/nf/upload':
+                if fields.get('user') != USER_HASH: return self.send_json({'files': []})
+                return self.send_json({'files': [{'url': f'https:\\/\\/nitroflare.com\\/view\\/{file_id}'}]})
+            if url.path == '/k2s/upload':
+                if fields.get('signature') != self.server.token: return self.send_json({'status': 'error', 'message': 'signature expired'})
+                return self.send_json({'status': 'success', 'link': f'https://k2s.cc/file/{file_id}'})
+            return self.send_json({'status': 200, 'response': {'file': {'id': file_id}}})
+        self.send_json({'error': 'not found'}, 404)
+
+class FakeHostServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeHostHandler)
+        self.stats = {'connections': 0, 'api_calls': 0}
+        self.received = []
+        self.lock = threading.Lock()
+        self.token = 'token-1'
+
+    def revoke_tokens(self):
+        """Thu hồi mọi token/chữ ký đã cấp (giả lập token hết hạn phía host)."""
+        self.token = f"token-{int(self.token.split('-')[1]) + 1}"
+
+    def count(self, key):
+        with self.lock: self.stats[key] += 1
+
+def serve():
+    """Chạy server giả lập ở một cổng trống và trỏ các uploader sang đó qua biến môi trường (phải gọi trước khi import uploader)."""
+    server = FakeHostServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    for host in ('NITROFLARE', 'KEEP2SHARE', 'RAPIDGATOR'):
+        os.environ[f'{host}_BASE_URL'] = base
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy ba uploader trên server giả lập cục bộ.")
+    parser.add_argument("--size-mb", type=int, default=256, help="Dung lượng mỗi file thử (MB).")
+    parser.add_argument("--files", type=int, default=3, help="Số file upload lên mỗi host.")
+    args = parser.parse_args()
+
+    server = serve()
+    work_dir = tempfile.mkdtemp(prefix='fake_hosts_')
+    os.environ['JAVSHARE_TOKEN_CACHE'] = os.path.join(work_dir, 'upload_cache.json')
+    from core import worker_runner
+    creds = {
+        'nitroflare_uploader': {'user_hash': USER_HASH},
+        'keep2share_uploader': {'access_token': ACCESS_TOKEN},
+        'rapidgator_uploader': {'username': 'user', 'password': 'pass'},
+    }
+    results = {}
+    try:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(work_dir, f'part_{i}.bin')
+            with open(path, 'wb') as f:
+                f.truncate(args.size_mb * 1024 * 1024)
+            paths.append(path)
+
+        for name, kwargs in creds.items():
+            before = dict(server.stats)
+            start = time.perf_counter()
+            links = []
+            for path in paths:
+                result = worker_runner.run_inprocess(name, file_path=path, **kwargs)
+                if result.get('status') != 'success': raise RuntimeError(f"{name}: {result}")
+                links.append(result['upload_url'])
+            elapsed = time.perf_counter() - start
+            results[name] = {
+                "links": links,
+                "total_s": round(elapsed, 2),
+                "mb_per_s": round(args.size_mb * args.files / elapsed, 1),
+                "connections_opened": server.stats['connections'] - before['connections'],
+                "api_calls": server.stats['api_calls'] - before['api_calls'],
+            }
+
+        # Token đã cache bị host thu hồi: uploader phải tự lấy token mới rồi upload tiếp
+        server.revoke_tokens()
+        for name, kwargs in creds.items():
+            result = worker_runner.run_inprocess(name, file_path=paths[0], **kwargs)
+            if result.get('status') != 'success': raise RuntimeError(f"{name} sau khi thu hồi token: {result}")
+            results[name]["after_revoke"] = result['upload_url']
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    sizes_ok = all(size == args.size_mb * 1024 * 1024 for _, _, size in server.received)
+    results["file_sizes_match"] = sizes_ok
+    results["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    server.shutdown()
+    print(json.dumps(results, indent=4))
+    if not sizes_ok: exit(1)
+
+if __name__ == '__main__':
+    main()
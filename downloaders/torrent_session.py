@@ -0,0 +1,437 @@
+# /downloaders/torrent_session.py
+import libtorrent as lt
+import atexit
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Giá trị mặc định cho section [torrent] trong config.ini
+DEFAULT_SETTINGS = {
+    'listen_interfaces': '0.0.0.0:6881',
+    'active_downloads': 3,
+    # Thư mục lưu fast-resume và metadata; để trống = <download_dir>/.resume
+    'resume_dir': '',
+    # Magnet không lấy được metadata sau chừng này giây sẽ bị báo lỗi
+    'metadata_timeout': 300,
+    # Chu kỳ (giây) lưu fast-resume cho các torrent đang tải
+    'resume_save_interval': 60,
+    # Chu kỳ (giây) gửi sự kiện tiến độ; session rảnh thì không thức dậy
+    'progress_interval': 2,
+}
+
+# Thư mục (trong save_path) chứa bản tách của các file giao cho bên gọi khi torrent chưa gỡ khỏi session
+HANDOFF_DIR = '.stream'
+# Khi không có torrent nào, vòng lặp chỉ thức dậy khi có alert (hoặc sau chừng này giây)
+IDLE_WAIT_SECONDS = 3600
+
+STATE_STR = ['queued', 'checking', 'downloading metadata', 'downloading', 'finished', 'seeding', 'allocating']
+
+def info_hash_key(info_hashes):
+    """Chuỗi hex dùng làm khóa cho một torrent (ưu tiên v1 để khớp với link magnet)."""
+    return str(info_hashes.v1) if info_hashes.has_v1() else str(info_hashes.v2)
+
+def make_file_filter(min_size_mb=None, include_exts=None, exclude_exts=None):
+    """Tạo bộ lọc file trong torrent; phần mở rộng được chuẩn hóa về dạng '.mp4'."""
+    normalize = lambda exts: {('.' + e.lower().lstrip('.')) for e in exts} if exts else None
+    return {'min_size_mb': min_size_mb or 0, 'include_exts': normalize(include_exts), 'exclude_exts': normalize(exclude_exts)}
+
+def select_files(torrent_info, file_filter):
+    """Trả về chỉ số các file cần tải theo bộ lọc (None = tải tất cả, trừ pad file)."""
+    files = torrent_info.files()
+    min_size_bytes = file_filter['min_size_mb'] * 1024 * 1024 if file_filter else 0
+    wanted = []
+    for i in range(files.num_files()):
+        if files.file_flags(i) & lt.file_storage.flag_pad_file: continue
+        if not file_filter:
+            wanted.append(i); continue
+        ext = os.path.splitext(files.file_path(i))[1].lower()
+        if files.file_size(i) < min_size_bytes: continue
+        if file_filter['include_exts'] and ext not in file_filter['include_exts']: continue
+        if file_filter['exclude_exts'] and ext in file_filter['exclude_exts']: continue
+        wanted.append(i)
+    return wanted
+
+def json_listener(event):
+    """Kênh sự kiện mặc định: mỗi sự kiện là một dòng JSON trên stderr, stdout chỉ dành cho kết quả."""
+    sys.stderr.write(json.dumps(event, ensure_ascii=False) + '\n')
+    sys.stderr.flush()
+
+def console_listener(event):
+    """Kênh sự kiện cho người đọc khi chạy trong main.py: tiến độ ghi đè trên một dòng."""
+    if event['event'] == 'progress':
+        parts = [f"{t['name'] or '?'}: {t['progress']:.1f}% {t['state']}" for t in event['torrents'][:3]]
+        sys.stdout.write(f"\r[{event['active']} torrent] down: {event['down_kbps']:.1f} kB/s | {' | '.join(parts)}")
+        sys.stdout.flush()
+    elif event.get('message'):
+        print(f"\n{event['message']}")
+
+def _write_atomic(path, data):
+    """Ghi file qua file tạm rồi đổi tên, để không bao giờ để lại file resume dở dang."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class TorrentSession:
+    """
+    Một lt.session dùng chung cho mọi torrent/magnet trong tiến trình. Các torrent được
+    libtorrent tự xếp hàng theo active_downloads; torrent nào xong sẽ bị gỡ khỏi session
+    ngay (không seed) và callback/Future của nó được gọi.
+
+    Fast-resume (<info-hash>.fastresume) và metadata (<info-hash>.torrent) được lưu trong
+    resume_dir, nên khi chạy lại torrent tiếp tục ngay mà không cần kiểm tra lại toàn bộ
+    piece và magnet không cần hỏi lại metadata từ peer.
+    """
+
+    def __init__(self, settings=None, listener=None):
+        settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        self.listener = listener or json_listener
+        self.progress_interval = float(settings['progress_interval'])
+        active_downloads = int(settings['active_downloads'])
+        self.resume_dir = settings['resume_dir']
+        self.metadata_timeout = float(settings['metadata_timeout'])
+        self.resume_save_interval = float(settings['resume_save_interval'])
+        self.ses = lt.session({
+            'listen_interfaces': settings['listen_interfaces'],
+            'active_downloads': active_downloads,
+            # Không seed: mọi slot active dành cho việc tải
+            'active_seeds': 0,
+            'active_limit': active_downloads,
+            'alert_mask': (lt.alert.category_t.status_notification | lt.alert.category_t.error_notification
+                           | lt.alert.category_t.storage_notification | lt.alert.category_t.file_progress_notification),
+        })
+        self.torrents = {}
+        self.lock = threading.Lock()
+        self.next_resume_save = time.monotonic() + self.resume_save_interval
+        self.next_progress = time.monotonic()
+        self.running = True
+        # Tách/giao file cho bên gọi chạy ở luồng riêng để vòng lặp alert không bị chặn khi phải chép file.
+        # Một luồng: việc của một torrent chạy theo thứ tự, kết quả torrent luôn đến sau các file của nó
+        self.handoff = ThreadPoolExecutor(max_workers=1, thread_name_prefix='torrent-handoff')
+        self.thread = threading.Thread(target=self._loop, name='torrent-session', daemon=True)
+        self.thread.start()
+        # Thread đang chặn trong wait_for_alert phải dừng trước khi interpreter thoát
+        atexit.register(self.shutdown)
+
+    # --- THÊM TORRENT ---
+
+    def add_torrent_file(self, torrent_file, save_path, on_complete=None, file_filter=None, on_file_complete=None, sequential=False):
+        """
+        Thêm một file .torrent vào hàng đợi tải, trả về Future của DownloadResult.
+        on_file_complete(file_path, position, total) được gọi (trên luồng giao file) ngay khi từng file được
+        chọn tải xong (position là thứ tự của file khi sắp theo đường dẫn). Bên gọi được đổi tên/xoá file_path
+        tuỳ ý: đó là bản tách trong <save_path>/.stream/<info-hash>/ khi torrent còn đang tải, hoặc chính file
+        gốc nếu file xong cùng lúc với cả torrent (được giao sau khi torrent đã gỡ khỏi session).
+        sequential tải piece theo thứ tự để các file xong lần lượt.
+        """
+        params = lt.add_torrent_params()
+        params.ti = lt.torrent_info(torrent_file)
+        params.save_path = save_path
+        return self._add(params, on_complete, file_filter, on_file_complete, sequential)
+
+    def add_magnet(self, magnet_uri, save_path, on_complete=None, file_filter=None, on_file_complete=None, sequential=False):
+        """Thêm một link magnet vào hàng đợi tải, trả về Future của DownloadResult (tham số như add_torrent_file)."""
+        params = lt.parse_magnet_uri(magnet_uri)
+        params.save_path = save_path
+        return self._add(params, on_complete, file_filter, on_file_complete, sequential)
+
+    def _resume_paths(self, save_path, key):
+        resume_dir = self.resume_dir or os.path.join(save_path, '.resume')
+        return os.path.join(resume_dir, f"{key}.fastresume"), os.path.join(resume_dir, f"{key}.torrent")
+
+    def _load_cached(self, params, key):
+        """Trả về add_torrent_params từ fast-resume/metadata đã lưu, nếu có."""
+        resume_path, metadata_path = self._resume_paths(params.save_path, key)
+        if os.path.exists(resume_path):
+            try:
+                with open(resume_path, 'rb') as f:
+                    cached = lt.read_resume_data(f.read())
+                cached.save_path = params.save_path
+                if not cached.ti and params.ti: cached.ti = params.ti
+                if not cached.ti and os.path.exists(metadata_path): cached.ti = lt.torrent_info(metadata_path)
+                self._emit('resumed', info_hash=key, message=f"Tiếp tục từ fast-resume: {key}")
+                return cached
+            except Exception as e:
+                self._emit('warning', info_hash=key, message=f" -> Bỏ qua fast-resume hỏng ({key}): {e}")
+        if not params.ti and os.path.exists(metadata_path):
+            try:
+                params.ti = lt.torrent_info(metadata_path)
+                self._emit('metadata_cached', info_hash=key, message=f"Dùng metadata đã lưu, bỏ qua bước hỏi metadata: {key}")
+            except Exception as e:
+                self._emit('warning', info_hash=key, message=f" -> Bỏ qua metadata hỏng ({key}): {e}")
+        return params
+
+    def _add(self, params, on_complete, file_filter, on_file_complete=None, sequential=False):
+        key = info_hash_key(params.ti.info_hashes() if params.ti else params.info_hashes)
+        with self.lock:
+            if key in self.torrents:
+                # Cùng một torrent được thêm hai lần: dùng chung kết quả
+                return self.torrents[key]['future']
+            params = self._load_cached(params, key)
+            wanted = None
+            if params.ti:
+                # Đã có metadata: đặt priority ngay từ đầu để file bị loại không bao giờ được tải
+                wanted = select_files(params.ti, file_filter)
+                params.file_priorities = self._priorities(params.ti, wanted)
+            if sequential: params.flags |= lt.torrent_flags.sequential_download
+            future = Future()
+            handle = self.ses.add_torrent(params)
+            self.torrents[key] = {
+                'handle': handle, 'save_path': params.save_path, 'on_complete': on_complete, 'future': future,
+                'added_at': time.monotonic(), 'has_metadata': bool(params.ti),
+                'result': None, 'file_filter': file_filter, 'wanted': wanted,
+                'on_file_complete': on_file_complete, 'emitted': set(), 'detached': [], 'deferred': [],
+            }
+        if wanted == []:
+            self._finish(handle, "Không có file nào trong torrent thỏa bộ lọc.")
+        return future
+
+    @staticmethod
+    def _priorities(torrent_info, wanted):
+        wanted = set(wanted)
+        return [4 if i in wanted else 0 for i in range(torrent_info.files().num_files())]
+
+    # --- VÒNG LẶP XỬ LÝ ALERT ---
+
+    def _entry(self, handle):
+        with self.lock:
+            return self.torrents.get(info_hash_key(handle.info_hashes()))
+
+    def _emit(self, event, **fields):
+        try: self.listener({'event': event, **fields})
+        except Exception: pass
+
+    def _next_wakeup(self, now):
+        """Số giây tới việc định kỳ gần nhất; không có torrent thì ngủ tới khi có alert."""
+        with self.lock:
+            entries = [e for e in self.torrents.values() if not e['result']]
+        if not entries: return IDLE_WAIT_SECONDS
+        deadlines = [self.next_progress, self.next_resume_save]
+        deadlines += [e['added_at'] + self.metadata_timeout for e in entries if not e['has_metadata']]
+        return max(0.0, min(deadlines) - now)
+
+    def _loop(self):
+        # Không poll: chặn trong wait_for_alert tới khi libtorrent có alert hoặc tới hạn việc định kỳ
+        while self.running:
+            timeout = self._next_wakeup(time.monotonic())
+            if self.ses.wait_for_alert(int(timeout * 1000)):
+                self._handle_alerts(self.ses.pop_alerts())
+            if self.running: self._run_timers(time.monotonic())
+
+    def _run_timers(self, now):
+        with self.lock:
+            entries = [e for e in self.torrents.values() if not e['result']]
+        if not entries: return
+        if now >= self.next_progress:
+            # Kết quả về qua state_update_alert, chỉ gồm các torrent có thay đổi
+            self.next_progress = now + self.progress_interval
+            self.ses.post_torrent_updates()
+        if now >= self.next_resume_save:
+            self.next_resume_save = now + self.resume_save_interval
+            for entry in entries:
+                if entry['handle'].need_save_resume_data(): entry['handle'].save_resume_data()
+        for entry in entries:
+            if not entry['has_metadata'] and now - entry['added_at'] > self.metadata_timeout:
+                self._finish(entry['handle'], f"Không lấy được metadata sau {self.metadata_timeout:.0f}s (magnet chết?)")
+
+    def _handle_alerts(self, alerts):
+        for alert in alerts:
+            if isinstance(alert, lt.torrent_finished_alert):
+                self._finish(alert.handle, None)
+            elif isinstance(alert, lt.torrent_error_alert):
+                self._finish(alert.handle, alert.message())
+            elif isinstance(alert, lt.file_completed_alert):
+                self._file_completed(alert.handle, alert.index)
+            elif isinstance(alert, lt.state_update_alert):
+                self._on_state_update(alert.status)
+            elif isinstance(alert, lt.metadata_received_alert):
+                entry = self._entry(alert.handle)
+                if entry: entry['has_metadata'] = True
+                self._save_metadata(alert.handle)
+                self._apply_file_filter(alert.handle)
+            elif isinstance(alert, lt.save_resume_data_alert):
+                self._save_resume(alert.handle, alert.params)
+            elif isinstance(alert, lt.save_resume_data_failed_alert):
+                entry = self._entry(alert.handle)
+                if entry and entry['result']: self._remove(alert.handle)
+
+    def _on_state_update(self, statuses):
+        tracked = []
+        for st in statuses:
+            entry = self._entry(st.handle)
+            if entry is None or entry['result']: continue
+            # Torrent đã đủ dữ liệu ngay sau khi kiểm tra (file có sẵn trên đĩa) cũng coi là xong
+            if st.has_metadata and st.is_finished:
+                self._finish(st.handle, None)
+                continue
+            tracked.append(st)
+        if not tracked: return
+        self._emit('progress', active=len(tracked),
+                   down_kbps=round(sum(st.download_rate for st in tracked) / 1000, 1),
+                   torrents=[{
+                       'name': st.name, 'info_hash': info_hash_key(st.info_hashes), 'progress': round(st.progress * 100, 2),
+                       'state': STATE_STR[st.state], 'down_kbps': round(st.download_rate / 1000, 1),
+                       'up_kbps': round(st.upload_rate / 1000, 1), 'peers': st.num_peers,
+                   } for st in tracked])
+
+    def _save_metadata(self, handle):
+        entry = self._entry(handle)
+        if entry is None: return
+        _, metadata_path = self._resume_paths(entry['save_path'], info_hash_key(handle.info_hashes()))
+        try:
+            os.makedirs(os.path.dirname(metadata_path), exist_ok=True)
+            _write_atomic(metadata_path, lt.bencode(lt.create_torrent(handle.torrent_file()).generate()))
+        except Exception as e:
+            self._emit('warning', message=f" -> Không lưu được metadata: {e}")
+
+    def _apply_file_filter(self, handle):
+        """Magnet vừa có metadata: bỏ các file không thỏa bộ lọc trước khi tải piece nào."""
+        entry = self._entry(handle)
+        if entry is None or entry['wanted'] is not None: return
+        torrent_info = handle.torrent_file()
+        entry['wanted'] = select_files(torrent_info, entry['file_filter'])
+        if not entry['wanted']:
+            self._finish(handle, "Không có file nào trong torrent thỏa bộ lọc.")
+            return
+        handle.prioritize_files(self._priorities(torrent_info, entry['wanted']))
+        skipped = len(select_files(torrent_info, None)) - len(entry['wanted'])
+        if skipped: self._emit('files_skipped', name=handle.name(), skipped=skipped, message=f"Bỏ qua {skipped} file không cần thiết trong: {handle.name()}")
+
+    def _detach(self, key, entry, relative_path):
+        """
+        Tách file đã tải xong khỏi libtorrent: torrent còn trong session vẫn giữ file gốc (có thể đọc để gửi
+        cho peer), nên bên gọi chỉ nhận một bản riêng để đổi tên/chia/xoá. Dùng hard link (không tốn chỗ),
+        filesystem không hỗ trợ (vd. FUSE) thì chép. File gốc được xoá khi torrent đã gỡ khỏi session.
+        """
+        file_path = os.path.join(entry['save_path'], relative_path)
+        detached = os.path.join(entry['save_path'], HANDOFF_DIR, key, relative_path)
+        os.makedirs(os.path.dirname(detached), exist_ok=True)
+        if os.path.exists(detached): os.remove(detached)
+        try: os.link(file_path, detached)
+        except OSError: shutil.copy2(file_path, detached)
+        entry['detached'].append(file_path)
+        return detached
+
+    def _file_completed(self, handle, index, final=False):
+        """
+        Báo cho bên gọi một file được chọn vừa tải xong, không đợi cả torrent. final: cả torrent cũng vừa
+        xong, file gốc được giao thẳng sau khi gỡ torrent (không cần tách/chép).
+        """
+        entry = self._entry(handle)
+        if entry is None or not entry['on_file_complete'] or not entry['wanted']: return
+        if index not in entry['wanted'] or index in entry['emitted']: return
+        entry['emitted'].add(index)
+        files = handle.torrent_file().files()
+        ordered = sorted(entry['wanted'], key=files.file_path)
+        relative_path = files.file_path(index)
+        if final:
+            entry['deferred'].append((os.path.join(entry['save_path'], relative_path), ordered.index(index), len(ordered)))
+            return
+        self.handoff.submit(self._handoff, handle.name(), info_hash_key(handle.info_hashes()), entry,
+                            relative_path, ordered.index(index), len(ordered))
+
+    def _handoff(self, name, key, entry, relative_path, position, total):
+        try: file_path = self._detach(key, entry, relative_path)
+        except OSError as e:
+            self._emit('warning', message=f" -> Không tách được file {relative_path} khỏi torrent: {e}"); return
+        self._deliver(entry, name, file_path, position, total)
+
+    def _deliver(self, entry, name, file_path, position, total):
+        try: entry['on_file_complete'](file_path, position, total)
+        except Exception as e: self._emit('warning', message=f" -> Lỗi trong callback hoàn thành file: {e}")
+        self._emit('file_completed', name=name, file=file_path)
+
+    def _save_resume(self, handle, params):
+        entry = self._entry(handle)
+        if entry is None: return
+        resume_path, _ = self._resume_paths(entry['save_path'], info_hash_key(handle.info_hashes()))
+        try:
+            os.makedirs(os.path.dirname(resume_path), exist_ok=True)
+            _write_atomic(resume_path, lt.write_resume_data_buf(params))
+        except Exception as e:
+            self._emit('warning', message=f" -> Không lưu được fast-resume: {e}")
+        # Torrent đã xong đang chờ lưu resume lần cuối: giờ mới gỡ khỏi session
+        if entry['result']: self._remove(handle)
+
+    # --- HOÀN THÀNH ---
+
+    def _finish(self, handle, error):
+        entry = self._entry(handle)
+        if entry is None or entry['result']: return
+
+        if error:
+            entry['result'] = {"status": "error", "message": f"Lỗi torrent: {error}"}
+            self._emit('error', name=handle.name(), message=entry['result']['message'])
+            self._remove(handle)
+            return
+
+        torrent_info = handle.torrent_file()
+        files = torrent_info.files()
+        if entry['wanted'] is None: entry['wanted'] = select_files(torrent_info, entry['file_filter'])
+        # Chỉ trả về các file được chọn tải
+        downloaded_files = [os.path.join(entry['save_path'], files.file_path(i)) for i in entry['wanted']]
+        # File xong cùng lúc với torrent (file cuối, file có sẵn nhờ fast-resume) được giao sau khi gỡ torrent
+        for i in entry['wanted']: self._file_completed(handle, i, final=True)
+        self._emit('finished', name=handle.name(), files=len(downloaded_files), message=f"Hoàn thành tải: {handle.name()}")
+        entry['result'] = {"status": "success", "save_path": entry['save_path'], "files": downloaded_files}
+        # Lưu fast-resume lần cuối (đánh dấu đủ piece) rồi mới gỡ torrent, xem _save_resume
+        handle.save_resume_data(lt.save_resume_flags_t.save_info_dict)
+
+    def _remove(self, handle):
+        key = info_hash_key(handle.info_hashes())
+        with self.lock:
+            entry = self.torrents.pop(key, None)
+        if entry is None: return
+        name = handle.name()
+        # Gỡ torrent ngay để không seed, trả băng thông cho các torrent còn lại (giữ nguyên file)
+        self.ses.remove_torrent(handle)
+        # Chạy sau mọi việc tách file đang chờ của torrent này (cùng luồng giao file)
+        self.handoff.submit(self._finalize, name, entry)
+
+    def _finalize(self, name, entry):
+        # File gốc đã giao cho bên gọi dưới dạng bản tách: libtorrent không còn dùng tới
+        for file_path in entry['detached']:
+            try: os.remove(file_path)
+            except OSError: pass
+        for file_path, position, total in entry['deferred']: self._deliver(entry, name, file_path, position, total)
+        if entry['on_complete']:
+            try: entry['on_complete'](entry['result'])
+            except Exception as e: self._emit('warning', message=f" -> Lỗi trong callback hoàn thành torrent: {e}")
+        entry['future'].set_result(entry['result'])
+
+    def shutdown(self, timeout=10):
+        """Lưu fast-resume cho các torrent dở dang rồi dừng vòng lặp xử lý alert."""
+        if not self.running: return
+        self.running = False
+        # Đánh thức wait_for_alert để vòng lặp thoát ngay
+        self.ses.post_torrent_updates()
+        self.thread.join()
+        with self.lock:
+            pending = [e for e in self.torrents.values() if not e['result']]
+        for entry in pending:
+            entry['result'] = {"status": "error", "message": "Session torrent đã dừng trước khi tải xong."}
+            entry['handle'].save_resume_data(lt.save_resume_flags_t.save_info_dict)
+        deadline = time.monotonic() + timeout
+        while self.torrents and time.monotonic() < deadline:
+            if self.ses.wait_for_alert(500): self._handle_alerts(self.ses.pop_alerts())
+        self.handoff.shutdown(wait=True)
+        with self.lock:
+            leftovers, self.torrents = list(self.torrents.values()), {}
+        for entry in leftovers:
+            if not entry['future'].done():
+                entry['future'].set_result(entry['result'] or {"status": "error", "message": "Session torrent đã dừng."})
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session(settings=None, listener=None):
+    """Trả về session dùng chung của tiến trình (tạo ở lần gọi đầu tiên)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = TorrentSession(settings, listener)
+        return _session
@@ -3,36 +3,188 @@ import requests
 import argparse
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
+if TYPE_CHECKING:
+    from core.worker_runner import DownloadResult
+
+# Mỗi lần ghi xuống đĩa 1 MiB thay vì 1 KiB: ít syscall, ít lần cập nhật tqdm
+CHUNK_SIZE = 1024 * 1024
+# Không chia nhỏ hơn mức này, file nhỏ không đáng mở nhiều kết nối
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+# Chu kỳ (giây) ghi file trạng thái .part.json
+STATE_SAVE_INTERVAL = 2
+RETRIES = 3
+TIMEOUT = (15, 60)
+# Số kết nối giữ sẵn cho mỗi server (>= số đoạn tải song song)
+POOL_SIZE = 16
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Session HTTP dùng chung trong tiến trình: giữ kết nối giữa các đoạn và giữa các lần tải."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+def probe(session, url):
+    """Trả về (tổng dung lượng hoặc None, server có hỗ trợ Range không, URL cuối sau redirect)."""
+    with session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        if response.status_code == 206:
+            content_range = response.headers.get('content-range', '')
+            total = content_range.rsplit('/', 1)[-1]
+            return (int(total) if total.isdigit() else None), True, response.url
+        length = response.headers.get('content-length')
+        return (int(length) if length and length.isdigit() else None), False, response.url
+
+def plan_segments(total_size, connections):
+    """Chia [0, total_size) thành tối đa `connections` đoạn; mỗi đoạn là [start, end, số byte đã tải]."""
+    count = max(1, min(connections, total_size // MIN_SEGMENT_SIZE))
+    step = -(-total_size // count)
+    return [[start, min(start + step, total_size) - 1, 0] for start in range(0, total_size, step)]
+
+def load_state(state_path, url, total_size):
+    """Đọc trạng thái tải dở nếu khớp URL và dung lượng, ngược lại trả về None."""
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('url') == url and state.get('size') == total_size: return state
+    except (OSError, ValueError):
+        pass
+    return None
+
+def save_state(state_path, state):
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+def preallocate(part_path, total_size):
+    """Cấp phát trước toàn bộ dung lượng để các đoạn ghi song song không làm phân mảnh file."""
+    fd = os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.fstat(fd).st_size != total_size:
+            try: os.posix_fallocate(fd, 0, total_size)
+            except (AttributeError, OSError): os.ftruncate(fd, total_size)
+    finally:
+        os.close(fd)
+
+def download_segment(url, fd, segment, lock, bar):
+    """Tải một đoạn bằng Range vào đúng vị trí trong file, thử lại từ byte đã có nếu lỗi."""
+    start, end = segment[0], segment[1]
+    for attempt in range(RETRIES):
+        offset = start + segment[2]
+        if offset > end: return
+        try:
+            with get_session().get(
+                url, headers={'Range': f'bytes={offset}-{end}'}, stream=True, timeout=TIMEOUT
+            ) as response:
+                if response.status_code != 206:
+                    raise ConnectionError(f"Server không trả về 206 cho Range {offset}-{end} (HTTP {response.status_code})")
+                for data in response.iter_content(chunk_size=CHUNK_SIZE):
+                    os.pwrite(fd, data, offset)
+                    offset += len(data)
+                    with lock: segment[2] = offset - start
+                    bar.update(len(data))
+            if offset > end: return
+        except (requests.RequestException, ConnectionError):
+            if attempt == RETRIES - 1: raise
+            time.sleep(2 ** attempt)
+    if start + segment[2] <= end:
+        raise ConnectionError(f"Đoạn {start}-{end} chưa tải xong.")
+
+def download_segmented(url, output_path, total_size, connections):
+    """Tải song song nhiều đoạn vào <file>.part, lưu tiến độ ở <file>.part.json để chạy lại thì tải tiếp."""
+    part_path, state_path = output_path + '.part', output_path + '.part.json'
+    state = load_state(state_path, url, total_size) if os.path.exists(part_path) else None
+    if state is None:
+        state = {'url': url, 'size': total_size, 'segments': plan_segments(total_size, connections)}
+    preallocate(part_path, total_size)
+    save_state(state_path, state)
+
+    segments = state['segments']
+    lock = threading.Lock()
+    done_bytes = sum(seg[2] for seg in segments)
+    stop = threading.Event()
+
+    def save_periodically():
+        while not stop.wait(STATE_SAVE_INTERVAL):
+            with lock: save_state(state_path, state)
+
+    fd = os.open(part_path, os.O_RDWR)
+    saver = threading.Thread(target=save_periodically, daemon=True)
+    saver.start()
+    try:
+        with tqdm(desc=os.path.basename(output_path), total=total_size, initial=done_bytes,
+                  unit='iB', unit_scale=True, unit_divisor=1024) as bar, \
+             ThreadPoolExecutor(max_workers=len(segments)) as pool:
+            futures = [pool.submit(download_segment, url, fd, seg, lock, bar) for seg in segments]
+            for f in futures: f.result()
+    finally:
+        stop.set()
+        saver.join()
+        os.close(fd)
+        with lock: save_state(state_path, state)
+
+    os.replace(part_path, output_path)
+    os.remove(state_path)
+
+def download_single(session, url, output_path, total_size):
+    """Server không hỗ trợ Range: tải một luồng duy nhất (không thể tải tiếp nếu bị ngắt)."""
+    part_path = output_path + '.part'
+    try:
+        with session.get(url, stream=True, timeout=TIMEOUT) as response, open(part_path, 'wb') as f, tqdm(
+            desc=os.path.basename(output_path), total=total_size or 0, unit='iB', unit_scale=True, unit_divisor=1024,
+        ) as bar:
+            response.raise_for_status()
+            for data in response.iter_content(chunk_size=CHUNK_SIZE):
+                bar.update(f.write(data))
+        os.replace(part_path, output_path)
+    except Exception:
+        if os.path.exists(part_path): os.remove(part_path)
+        raise
+
+def download_url(url, output_dir, filename, connections=4) -> 'DownloadResult':
+    """
+    Tải một URL về output_dir/filename, trả về DownloadResult. Nếu server hỗ trợ Range thì
+    tải song song `connections` đoạn và giữ lại file .part/.part.json khi lỗi để lần sau tải tiếp.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, filename)
+
+    session = get_session()
+    total_size, supports_range, final_url = probe(session, url)
+    if supports_range and total_size:
+        download_segmented(final_url, output_path, total_size, int(connections))
+    else:
+        download_single(session, url, output_path, total_size)
+    return {"status": "success", "files": [output_path]}
+
 def main():
     parser = argparse.ArgumentParser(description="Tải file từ một URL.")
     parser.add_argument("-u", "--url", required=True, help="URL của file cần tải.")
     parser.add_argument("-o", "--output-dir", required=True, help="Thư mục để lưu file.")
     parser.add_argument("-n", "--filename", required=True, help="Tên file để lưu.")
+    parser.add_argument("-c", "--connections", type=int, default=4, help="Số kết nối song song khi server hỗ trợ Range.")
     args = parser.parse_args()
-    
-    os.makedirs(args.output_dir, exist_ok=True)
-    output_path = os.path.join(args.output_dir, args.filename)
-    
-    try:
-        response = requests.get(args.url, stream=True)
-        response.raise_for_status() 
 
-        total_size = int(response.headers.get('content-length', 0))
-        
-        with open(output_path, 'wb') as f, tqdm(
-            desc=args.filename, total=total_size, unit='iB', unit_scale=True, unit_divisor=1024,
-        ) as bar:
-            for data in response.iter_content(chunk_size=1024):
-                size = f.write(data)
-                bar.update(size)
-
-        result = {"status": "success", "files": [output_path]}
+    try:
+        result = download_url(args.url, args.output_dir, args.filename, args.connections)
         print(json.dumps(result, indent=4))
 
     except Exception as e:
-        if os.path.exists(output_path): os.remove(output_path)
         print(json.dumps({"status": "error", "message": str(e)}, indent=4))
         exit(1)
 
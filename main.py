@@ -2,27 +2,29 @@
 import argparse
 import json
 import os
-import subprocess
-import threading
+import queue
 import shutil
-from core import config_manager, excel_handler, file_utils
-
-# --- CÁC HÀM TIỆN ÍCH ---
-
-def run_module(command_args):
-    """Thực thi một module worker và trả về kết quả JSON một cách an toàn."""
-    try:
-        process = subprocess.run(
-            command_args, capture_output=True, text=True, check=True, encoding='utf-8'
-        )
-        if not process.stdout.strip(): return {}
-        return json.loads(process.stdout)
-    except json.JSONDecodeError:
-        return {"status": "error", "message": f"Invalid JSON: {process.stdout}"}
-    except subprocess.CalledProcessError as e:
-        return {"status": "error", "message": f"Lỗi thực thi: {e.stderr or e.stdout}"}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from core import config_manager, content_index, dir_scanner, fair_scheduler, ffmpeg_splitter, file_transfer, file_utils, job_store, link_ledger, pipeline, upload_scheduler, worker_runner
+
+# Giá trị mặc định cho section [pipeline] trong config.ini
+PIPELINE_DEFAULTS = {
+    'download_workers': 1, 'prepare_workers': 1, 'split_workers': 1, 'upload_workers': 2, 'store_workers': 1,
+    'queue_size': 1, 'max_inflight_tasks': 3,
+}
+# Giá trị mặc định cho section [serve] trong config.ini
+SERVE_DEFAULTS = {'poll_interval': 30, 'retry_failed_after': 3600}
+# Sheet tác vụ trong Excel của từng workflow tải về
+TASK_SHEETS = {'url-download': 'DownLoadUrl', 'magnet-download': 'DownLoadMagnetLink'}
+# Workflow chạy được cho mọi danh mục cùng lúc (--category all)
+ALL_CATEGORY_WORKFLOWS = ['url-download', 'torrent-download', 'magnet-download', 'upload-local', 'sync-excel', 'serve']
+
+# Scheduler upload dùng chung cho mọi danh mục khi chạy --category all (None: mỗi workflow tự tạo)
+shared_uploads = None
+# Báo cho các vòng lặp thường trực (serve) dừng lại
+shutdown = threading.Event()
 
 # --- CÁC BƯỚC XỬ LÝ TRONG PIPELINE ---
 
@@ -52,8 +54,8 @@ def step_rename_files(files_to_rename, base_name):
     """Gọi renamer.py để đổi tên các file."""
     if not files_to_rename: return []
     print(f"\n[BƯỚC ĐỔI TÊN] Đổi tên {len(files_to_rename)} file theo '{base_name}'...")
-    cmd = ['python3', 'core/renamer.py', '--files-json', json.dumps(files_to_rename), '--base-name', base_name]
-    result = run_module(cmd)
+    cli_args = ['--files-json', json.dumps(files_to_rename), '--base-name', base_name]
+    result = worker_runner.run_worker('renamer', cli_args, files_to_rename=files_to_rename, base_name=base_name)
     if isinstance(result, list):
         print(" -> Đổi tên thành công.")
         return result
@@ -67,163 +69,417 @@ def step_join_files(file_list, output_name):
     output_dir = os.path.dirname(file_list[0])
     _, ext = os.path.splitext(file_list[0])
     output_path = os.path.join(output_dir, output_name + ext)
-    cmd = ['python3', 'core/joiner.py', '--files-json', json.dumps(sorted(file_list)), '--output-file', output_path, '--delete-parts']
-    result = run_module(cmd)
+    cli_args = ['--files-json', json.dumps(sorted(file_list)), '--output-file', output_path, '--delete-parts']
+    result = worker_runner.run_worker('joiner', cli_args, files_to_join=sorted(file_list), output_file=output_path, delete_parts=True)
     if result.get('status') == 'success': return [result.get('output_path')]
     print(f" -> Nối file thất bại: {result.get('message')}"); return []
 
-def step_split_files(file_list, max_gb, split_times):
-    """Chia nhỏ file, ưu tiên chế độ thủ công nếu có split_times."""
+def split_times_for(file_path, split_times):
+    """Mốc chia của một file: list áp dụng cho mọi file, dict tra theo tên file (có hoặc không có phần mở rộng)."""
+    if isinstance(split_times, dict):
+        name = os.path.basename(file_path)
+        return split_times.get(name) or split_times.get(os.path.splitext(name)[0])
+    return split_times
+
+def step_join_split_files(file_list, output_name, max_gb, on_part=None):
+    """Nối và chia tự động trong một lần đọc (không ghi file nối trung gian), kết quả giống nối rồi chia."""
+    if len(file_list) < 2: return step_split_files(file_list, max_gb, None, on_part)
+    print(f"\n[BƯỚC NỐI + CHIA FILE] Nối {len(file_list)} file thành '{output_name}', chia các phần lớn hơn {max_gb}GB...")
+    output_dir = os.path.dirname(file_list[0])
+    _, ext = os.path.splitext(file_list[0])
+    output_path = os.path.join(output_dir, output_name + ext)
+    files = sorted(file_list)
+    cli_args = ['--file-path', output_path, '--max-size-gb', max_gb, '--join-files-json', json.dumps(files)]
+    result = worker_runner.run_worker('splitter', cli_args, file_path=output_path, max_size_gb=max_gb, join_files=files, on_part=on_part)
+    if result.get('status') in ['auto_split', 'unsplit']: return result.get('files', [])
+    print(f" -> Nối và chia file thất bại: {result.get('message')}"); return []
+
+def step_split_files(file_list, max_gb, split_times, on_part=None):
+    """
+    Chia nhỏ file; file có mốc thời gian riêng được chia thủ công, các file còn lại chia tự động nếu có max_gb.
+    on_part(đường dẫn, thứ tự, tổng số phần) được gọi ngay khi từng phần cắt xong (chỉ khi worker chạy trong tiến trình).
+    """
+    if not split_times and not (max_gb and max_gb > 0): return file_list
+    if split_times: print(f"\n[BƯỚC CHIA FILE] Chế độ thủ công theo các mốc thời gian: {split_times}")
+    if max_gb and max_gb > 0: print(f"\n[BƯỚC CHIA FILE] Chế độ tự động, chia các file lớn hơn {max_gb}GB...")
+
+    to_split = [(f, split_times_for(f, split_times)) for f in file_list]
+    to_split = [(f, times) for f, times in to_split if times or (max_gb and max_gb > 0)]
+    # Tổng số ffmpeg chạy cùng lúc vẫn theo CPU/đĩa: các file chia cùng lúc chia nhau số phần được cắt song song
+    files_at_once = max(1, min(len(to_split), worker_runner.settings['pool_size']))
+    part_workers = max(1, ffmpeg_splitter.default_workers() // files_at_once)
+    calls = []
+    for f, times in to_split:
+        if times: calls.append((['--file-path', f, '--start-times'] + [str(t) for t in times] + ['--workers', part_workers],
+                               {'file_path': f, 'start_times': times, 'workers': part_workers, 'on_part': on_part}))
+        else: calls.append((['--file-path', f, '--max-size-gb', max_gb], {'file_path': f, 'max_size_gb': max_gb, 'on_part': on_part}))
+    to_split = [f for f, _ in to_split]
+
+    # Các file được chia song song trên pool worker; mỗi file giữ vị trí của nó trong danh sách kết quả
+    results = dict(zip(to_split, worker_runner.map_worker('splitter', calls)))
     final_files = []
-    if split_times:
-        print(f"\n[BƯỚC CHIA FILE] Chế độ thủ công theo các mốc thời gian: {split_times}")
-        if len(file_list) > 1: print(" -> Cảnh báo: Chế độ chia thủ công chỉ áp dụng cho file đầu tiên.")
-        file_to_split = file_list[0]
-        cmd = ['python3', 'core/ffmpeg_splitter.py', '--file-path', file_to_split, '--start-times'] + [str(t) for t in split_times]
-        result = run_module(cmd)
-        if result.get('status') == 'manual_split': final_files.extend(result.get('files', []))
-        else: print(f" -> Chia file thủ công thất bại cho: {os.path.basename(file_to_split)}.")
-        final_files.extend(file_list[1:])
-    elif max_gb and max_gb > 0:
-        print(f"\n[BƯỚC CHIA FILE] Chế độ tự động, chia các file lớn hơn {max_gb}GB...")
-        for f in file_list:
-            cmd = ['python3', 'core/ffmpeg_splitter.py', '--file-path', f, '--max-size-gb', str(max_gb)]
-            result = run_module(cmd)
-            if result.get('status') in ['auto_split', 'unsplit']: final_files.extend(result.get('files', []))
-            else: print(f" -> Chia file tự động thất bại cho {os.path.basename(f)}. Bỏ qua.")
-    else: return file_list
+    for f in file_list:
+        if f not in results: final_files.append(f); continue
+        result = results[f]
+        if result.get('status') in ['manual_split', 'auto_split', 'unsplit']: final_files.extend(result.get('files', []))
+        else: print(f" -> Chia file thất bại cho {os.path.basename(f)}: {result.get('message')}. Bỏ qua.")
     return final_files
 
 def uploader_task(host, file_path, creds, excel_config):
-    """Tác vụ upload chạy trong một thread riêng."""
+    """Tác vụ upload một file lên một host, trả về True nếu thành công."""
     print(f" -> Bắt đầu upload {os.path.basename(file_path)} lên {host}...")
-    uploader_script = f"uploaders/{host}_uploader.py"
-    if not os.path.exists(uploader_script): print(f"Lỗi: Không tìm thấy script uploader: {uploader_script}"); return
-    command = ['python3', uploader_script, '-f', file_path]
+    worker_name = f"{host}_uploader"
+    if not worker_runner.has_worker(worker_name): print(f"Lỗi: Không tìm thấy script uploader: uploaders/{worker_name}.py"); return False
+    cli_args = ['-f', file_path]
     for key, value in creds.items():
-        if value: command.extend([f'--{key}', str(value)])
-    upload_result = run_module(command)
-    if excel_config and upload_result.get('status') == 'success':
+        if value: cli_args.extend([f'--{key}', str(value)])
+    upload_result = worker_runner.run_worker(worker_name, cli_args, file_path=file_path, **{k: v for k, v in creds.items() if v})
+    if upload_result.get('status') != 'success':
+        print(f" -> Upload {os.path.basename(file_path)} lên {host} thất bại: {upload_result.get('message')}"); return False
+    if excel_config:
         link_data = {"Name": os.path.basename(file_path), "Link": upload_result.get('upload_url'), "Host": f"{host}.com"}
-        print(f" -> Ghi link vào Excel: {link_data['Name']}")
-        excel_handler.write_row(excel_config['excel_file'], 'Host_Storage', 'Host_Storage', link_data)
-
-def step_upload_files(file_list, upload_hosts, excel_config):
-    """Quản lý việc upload nhiều file lên nhiều host."""
-    if not upload_hosts or not file_list: return
-    print(f"\n[BƯỚC UPLOAD] Bắt đầu upload lên: {', '.join(upload_hosts)}...")
-    threads = []
+        print(f" -> Ghi link vào sổ: {link_data['Name']}")
+        # Excel (qua journal của ledger) là nơi lưu link duy nhất và được ghi trước; store chỉ là chỉ mục để
+        # tra nhanh/so hash. Chết giữa hai bước thì journal vẫn đưa link vào Excel và store nạp lại từ Excel.
+        link_ledger.get_ledger(excel_config['excel_file'], config_manager.get_settings('ledger')).record(link_data)
+        try: hashes = content_index.file_hashes(file_path, config_manager.get_settings('content_index', content_index.DEFAULT_SETTINGS)['mode'])
+        except OSError: hashes = (None, None)
+        job_store.get_store().add_link(excel_config['excel_file'], link_data['Name'], link_data['Host'], link_data['Link'], *hashes, exported=True)
+    return True
+
+def create_upload_scheduler(config=None):
+    """
+    Tạo scheduler upload với giới hạn tổng và theo host đọc từ config.ini. Khi chạy nhiều danh mục,
+    trả về hàng đợi của danh mục đó trên scheduler dùng chung.
+    """
+    if shared_uploads is not None and config: return shared_uploads.view(config['category'])
+    return upload_scheduler.from_config(config_manager.get_settings('upload'), config_manager.get_settings('upload_hosts'))
+
+def submit_uploads(file_list, upload_hosts, excel_config, scheduler):
+    """Đưa các file vào hàng đợi upload của scheduler cho từng host, trả về list Future."""
+    futures = []
     for host in upload_hosts:
         creds = config_manager.get_account_creds(host)
         if not creds: print(f"Cảnh báo: Không có tài khoản cho '{host}' trong accounts.ini. Bỏ qua."); continue
         for f in file_list:
-            thread = threading.Thread(target=uploader_task, args=(host, f, creds, excel_config))
-            threads.append(thread)
-            thread.start()
-    for t in threads: t.join()
+            futures.append(scheduler.submit(host, f, uploader_task, host, f, creds, excel_config))
+    return futures
+
+def step_upload_files(file_list, upload_hosts, excel_config, scheduler=None):
+    """Quản lý việc upload nhiều file lên nhiều host (dùng scheduler chung nếu được truyền vào)."""
+    if not upload_hosts or not file_list: return
+    print(f"\n[BƯỚC UPLOAD] Bắt đầu upload lên: {', '.join(upload_hosts)}...")
+    own_scheduler = scheduler is None
+    if own_scheduler: scheduler = create_upload_scheduler(excel_config)
+    futures = submit_uploads(file_list, upload_hosts, excel_config, scheduler)
+    if own_scheduler:
+        scheduler.join()
+        scheduler.print_report()
+    else:
+        wait(futures)
+
+def split_with_uploads(split, upload_hosts, excel_config, scheduler):
+    """
+    Chạy split(on_part) (trả về list file sau khi chia). Mỗi phần được đưa vào hàng đợi upload ngay khi
+    splitter báo cắt xong, nên phần đầu đã upload trong lúc các phần sau còn đang cắt; các file còn lại
+    (không cần chia, hoặc worker chạy subprocess) được đưa vào sau. Trả về (list file, list Future upload).
+    """
+    futures, submitted, lock = [], set(), threading.Lock()
+
+    def on_part(part_path, position, total):
+        print(f" -> Phần {position}/{total} đã cắt xong, đưa vào hàng đợi upload: {os.path.basename(part_path)}")
+        part_futures = submit_uploads([part_path], upload_hosts, excel_config, scheduler)
+        with lock:
+            submitted.add(part_path)
+            futures.extend(part_futures)
+
+    print(f"\n[BƯỚC UPLOAD] Upload lên {', '.join(upload_hosts)} ngay khi từng phần được cắt xong...")
+    files = split(on_part)
+    futures.extend(submit_uploads([f for f in files if f not in submitted], upload_hosts, excel_config, scheduler))
+    return files, futures
 
 def step_store_files(file_list, save_dir):
-    """Di chuyển các file đã xử lý vào thư mục lưu trữ cuối cùng."""
+    """Chuyển các file đã xử lý vào thư mục lưu trữ cuối cùng (song song; đổi tên nếu cùng filesystem)."""
+    file_list = [f for f in file_list if os.path.exists(f)]
     if not file_list: return
     print(f"\n[BƯỚC LƯU TRỮ] Di chuyển {len(file_list)} file đến: {save_dir}")
-    os.makedirs(save_dir, exist_ok=True)
-    for f in file_list:
-        if os.path.exists(f):
-            try: shutil.move(f, os.path.join(save_dir, os.path.basename(f)))
-            except Exception as e: print(f" -> Lỗi khi di chuyển {os.path.basename(f)}: {e}")
+    settings = config_manager.get_settings('storage', file_transfer.DEFAULT_SETTINGS)
+    for src, _, error in file_transfer.move_files(file_list, save_dir, settings['copy_workers'], settings['verify'], settings['fsync']):
+        if error: print(f" -> Lỗi khi di chuyển {os.path.basename(src)}: {error}")
 
 
 # --- CÁC WORKFLOW CHÍNH ---
 
+def make_task_stages(args, config, scheduler=None):
+    """
+    Các bước xử lý một tác vụ tải về (download -> lọc/đổi tên -> chia -> upload -> lưu trữ).
+    Mỗi bước nhận job (dict) và trả về job cho bước sau, hoặc None để dừng tác vụ.
+    """
+    category = config.get('category')
+
+    def download(job):
+        with fair_scheduler.slot('download', category):
+            download_result = job['download']()
+        if download_result.get('status') != 'success':
+            print(f" -> Tải về thất bại ({job['name']}): {download_result.get('message')}"); return None
+        job['files'] = download_result.get('files', [])
+        if not job['files']: print(f" -> Downloader không trả về file nào ({job['name']})."); return None
+        return job
+
+    def prepare(job):
+        filtered_files = step_filter_files(job['files'], args.min_size_mb)
+        if not filtered_files: print(f" -> Không còn file nào sau khi lọc ({job['name']})."); return None
+        job['files'] = step_rename_files(filtered_files, job['base_name'])
+        if not job['files']: print(f" -> Dừng tác vụ do đổi tên thất bại ({job['name']})."); return None
+        return job
+
+    def split(job):
+        with fair_scheduler.slot('split', category):
+            if not args.uploaders:
+                job['files'] = step_split_files(job['files'], args.split_max_gb, args.split_at_times)
+                return job
+            # Các phần được upload ngay khi cắt xong; bước upload chỉ còn chờ chúng hoàn tất
+            job['scheduler'] = scheduler or create_upload_scheduler(config)
+            job['files'], job['upload_futures'] = split_with_uploads(
+                lambda on_part: step_split_files(job['files'], args.split_max_gb, args.split_at_times, on_part),
+                args.uploaders, config, job['scheduler'])
+        return job
+
+    def upload(job):
+        if 'upload_futures' not in job: return job
+        if job['scheduler'] is scheduler: wait(job['upload_futures'])
+        else:
+            job['scheduler'].join()
+            job['scheduler'].print_report()
+        return job
+
+    def store(job):
+        step_store_files(job['files'], config['save_dir'])
+        job['on_done']()
+        print(f"--- Hoàn thành tác vụ: {job['name']} ---")
+        return job
+
+    return [('download', download), ('prepare', prepare), ('split', split), ('upload', upload), ('store', store)]
+
+def run_tasks(jobs, args, config, total=None):
+    """Chạy các tác vụ tuần tự (mặc định) hoặc theo pipeline nhiều stage nếu có --pipeline."""
+    if total is None and isinstance(jobs, list): total = len(jobs)
+    label = lambda i: f"{i+1}/{total}" if total is not None else f"{i+1}"
+    if not args.pipeline:
+        for i, job in enumerate(jobs):
+            print(f"\n--- Bắt đầu xử lý tác vụ {label(i)}: {job['name']} ---")
+            for _, func in make_task_stages(args, config):
+                job = func(job)
+                if job is None: break
+        return
+
+    settings = config_manager.get_settings('pipeline', PIPELINE_DEFAULTS)
+    queue_size = int(settings['queue_size'])
+    print(f"\n[PIPELINE] Chạy {total if total is not None else 'các'} tác vụ theo pipeline (tối đa {settings['max_inflight_tasks']} tác vụ cùng lúc)...")
+    scheduler = create_upload_scheduler(config)
+    stages = [
+        pipeline.Stage(name, func, workers=settings[f'{name}_workers'], queue_size=queue_size)
+        for name, func in make_task_stages(args, config, scheduler)
+    ]
+    pipe = pipeline.Pipeline(stages, max_inflight=int(settings['max_inflight_tasks']))
+    for i, job in enumerate(jobs):
+        print(f"\n--- Đưa tác vụ {label(i)} vào pipeline: {job['name']} ---")
+        pipe.put(job)
+    pipe.join()
+    scheduler.join()
+    scheduler.print_report()
+
+def get_torrent_session():
+    """Session libtorrent dùng chung cho cả tiến trình (chỉ import libtorrent khi cần)."""
+    from downloaders import torrent_session
+    return torrent_session.get_session(config_manager.get_settings('torrent'), torrent_session.console_listener)
+
+def torrent_filter_options(args):
+    """Tham số lọc file cho downloader torrent/magnet: file bị loại không bao giờ được tải."""
+    cli_args = []
+    if args.min_size_mb: cli_args.extend(['--min-size-mb', args.min_size_mb])
+    if args.include_ext: cli_args.extend(['--include-ext'] + args.include_ext)
+    if args.exclude_ext: cli_args.extend(['--exclude-ext'] + args.exclude_ext)
+    kwargs = {'min_size_mb': args.min_size_mb, 'include_exts': args.include_ext, 'exclude_exts': args.exclude_ext}
+    return cli_args, kwargs
+
+def torrent_file_filter(args):
+    """Bộ lọc file dùng cho session torrent chung."""
+    from downloaders import torrent_session
+    _, kwargs = torrent_filter_options(args)
+    return torrent_session.make_file_filter(**kwargs)
+
+def session_download(add_to_session):
+    """Thêm torrent/magnet vào session chung ngay (để tải song song), trả về hàm chờ DownloadResult."""
+    def start():
+        try:
+            future = add_to_session(get_torrent_session())
+        except Exception as e:
+            message = str(e)
+            return lambda: {"status": "error", "message": message}
+        return future.result
+    # Chạy nhiều danh mục: chỉ thêm vào session khi bước tải về tới lượt, để giới hạn tải chung có tác dụng
+    if fair_scheduler.enabled(): return lambda: start()()
+    return start()
+
+def run_streamed_tasks(sources, args, config):
+    """
+    Chế độ --stream-files: mỗi file của torrent/magnet thành một tác vụ riêng ngay khi file đó tải
+    xong, nên file đầu đã chia/upload trong khi các file sau còn đang tải. sources là list dict
+    {name, base_name, add, on_done}; add(on_file_complete) thêm nguồn vào session và trả về Future.
+    on_done của một nguồn chỉ được gọi khi mọi file của nó đã xử lý xong.
+    """
+    events = queue.Queue()
+    remaining = {}
+    lock = threading.Lock()
+    started = 0
+    for source in sources:
+        try:
+            future = source['add'](lambda path, position, total, src=source: events.put((src, path, position, total)))
+        except Exception as e:
+            print(f" -> Không thể thêm {source['name']} vào session: {e}"); continue
+        # Kết quả cả torrent luôn đến sau các sự kiện file của nó (cùng một hàng đợi)
+        future.add_done_callback(lambda f, src=source: events.put((src, None, f.result(), None)))
+        started += 1
+
+    def file_done(source):
+        with lock:
+            remaining[source['name']] -= 1
+            finished = remaining[source['name']] == 0
+        if finished: source['on_done']()
+
+    def file_jobs():
+        pending_sources = started
+        while pending_sources:
+            source, path, position, total = events.get()
+            if path is None:
+                pending_sources -= 1
+                if position.get('status') != 'success': print(f" -> Tải thất bại ({source['name']}): {position.get('message')}")
+                continue
+            with lock: remaining.setdefault(source['name'], total)
+            # Cùng quy tắc đặt tên với renamer: nhiều file thì thêm hậu tố _A, _B...
+            base_name = source['base_name'] if total == 1 else f"{source['base_name']}_{chr(65 + position)}"
+            yield {'name': f"{source['name']} [{os.path.basename(path)}]", 'base_name': base_name,
+                   'download': lambda p=path: {"status": "success", "files": [p]},
+                   'on_done': lambda src=source: file_done(src)}
+
+    run_tasks(file_jobs(), args, config)
+
+def make_link_job(args, config, workflow, task_name, link, on_done):
+    """Tác vụ tải một link (URL hoặc magnet) đọc từ sheet Excel."""
+    if workflow == 'magnet-download' and worker_runner.settings['mode'] == 'inprocess':
+        # Thêm magnet vào session chung ngay để các tác vụ tải song song
+        download = session_download(lambda ses: ses.add_magnet(link, config['download_dir'], file_filter=torrent_file_filter(args)))
+    else:
+        cli_download = ['-o', config['download_dir']]
+        if workflow == 'url-download':
+            connections = config_manager.get_settings('http', {'connections': 4})['connections']
+            cli_download.extend(['-u', link, '-n', task_name, '-c', connections])
+            kwargs_download = {'url': link, 'output_dir': config['download_dir'], 'filename': task_name, 'connections': connections}
+        else:
+            filter_cli, filter_kwargs = torrent_filter_options(args)
+            cli_download.extend(['-m', link] + filter_cli)
+            kwargs_download = {'magnet_uri': link, 'output_dir': config['download_dir'], **filter_kwargs}
+        downloader_name = f"{workflow.split('-')[0]}_downloader"
+        download = lambda: worker_runner.run_worker(downloader_name, cli_download, **kwargs_download)
+    return {'name': task_name, 'base_name': task_name, 'download': download, 'on_done': on_done}
+
 def workflow_url_magnet_download(args, config):
     """Quy trình cho URL và Magnet (đọc Excel trước)."""
-    sheet_map = {'url-download': 'DownLoadUrl', 'magnet-download': 'DownLoadMagnetLink'}
-    sheet_name = sheet_map[args.workflow]
-    tasks = excel_handler.read_table(config['excel_file'], sheet_name, sheet_name)
-    if not tasks: print(f"Không có tác vụ trong sheet '{sheet_name}'."); return
-    
-    pending_tasks = [t for t in tasks if str(t.get('Downloaded', '')).lower() != 'downloaded']
+    sheet_name = TASK_SHEETS[args.workflow]
+    store = job_store.get_store()
+    store.import_tasks(config['excel_file'], sheet_name)
+    pending_tasks = store.pending_tasks(config['excel_file'], sheet_name)
+    if not pending_tasks: print(f"Không có tác vụ cần xử lý trong sheet '{sheet_name}'."); return
     print(f"Tìm thấy {len(pending_tasks)} tác vụ cần xử lý từ Excel.")
 
-    for i, task in enumerate(pending_tasks):
-        task_name = task.get('Name')
-        if not task_name: print(f"Bỏ qua tác vụ dòng {i+2} vì thiếu 'Name'."); continue
-        print(f"\n--- Bắt đầu xử lý tác vụ {i+1}/{len(pending_tasks)}: {task_name} ---")
-        
-        downloader_script = f"downloaders/{args.workflow.split('-')[0]}_downloader.py"
-        cmd_download = ['python3', downloader_script, '-o', config['download_dir']]
-        link = task.get('Url') or task.get('MagnetLink')
+    use_session = args.workflow == 'magnet-download' and worker_runner.settings['mode'] == 'inprocess'
+    jobs, sources = [], []
+    for task in pending_tasks:
+        row_index, task_name, link = task['row_index'], task['name'], task['link']
+        if not task_name: print(f"Bỏ qua tác vụ dòng {row_index+2} vì thiếu 'Name'."); continue
         if not link: print(f"Lỗi: Tác vụ '{task_name}' thiếu link."); continue
-        
-        if args.workflow == 'url-download': cmd_download.extend(['-u', link, '-n', task_name])
-        else: cmd_download.extend(['-m', link])
-        
-        download_result = run_module(cmd_download)
-        if download_result.get('status') != 'success': print(f" -> Tải về thất bại."); continue
-        
-        newly_downloaded_files = download_result.get('files', [])
-        if not newly_downloaded_files: print(" -> Downloader không trả về file nào."); continue
-
-        filtered_files = step_filter_files(newly_downloaded_files, args.min_size_mb)
-        if not filtered_files: print(" -> Không còn file nào sau khi lọc."); continue
+        on_done = lambda n=task_name, l=link: store.set_task_status(config['excel_file'], sheet_name, n, l)
 
-        renamed_files = step_rename_files(filtered_files, task_name)
-        if not renamed_files: print(" -> Dừng tác vụ do đổi tên thất bại."); continue
-        
-        processed_files = step_split_files(renamed_files, args.split_max_gb, args.split_at_times)
-        step_upload_files(processed_files, args.uploaders, config)
-        step_store_files(processed_files, config['save_dir'])
-        excel_handler.update_cell(config['excel_file'], sheet_name, sheet_name, tasks.index(task), 'Downloaded', 'downloaded')
-        print(f"--- Hoàn thành tác vụ: {task_name} ---")
+        if use_session and args.stream_files:
+            sources.append({'name': task_name, 'base_name': task_name, 'on_done': on_done,
+                            'add': lambda cb, l=link: get_torrent_session().add_magnet(
+                                l, config['download_dir'], file_filter=torrent_file_filter(args),
+                                on_file_complete=cb, sequential=args.sequential_files)})
+            continue
+        jobs.append(make_link_job(args, config, args.workflow, task_name, link, on_done))
+    try:
+        if sources: run_streamed_tasks(sources, args, config)
+        else: run_tasks(jobs, args, config)
+    finally:
+        # Ghi trạng thái 'downloaded' ra Excel một lần cho cả lượt chạy
+        try: store.export_task_status(config['excel_file'], sheet_name)
+        except Exception as e: print(f"Lỗi khi ghi trạng thái tác vụ ra Excel (vẫn còn trong database): {e}")
+
+def move_processed_torrent(config, torrent_filename):
+    torrent_path = os.path.join(config['torrent_dir'], torrent_filename)
+    dest_path = os.path.join(config['torrent_downloaded_dir'], torrent_filename)
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    shutil.move(torrent_path, dest_path)
+    print(f" -> Đã di chuyển {torrent_filename} sang thư mục đã xử lý.")
+
+def make_torrent_job(args, config, torrent_filename, download=None):
+    """Tác vụ tải một file .torrent trong torrent_dir; download mặc định: worker riêng hoặc session chung tuỳ --exec-mode."""
+    torrent_path = os.path.join(config['torrent_dir'], torrent_filename)
+    if download is None and worker_runner.settings['mode'] == 'subprocess':
+        filter_cli, filter_kwargs = torrent_filter_options(args)
+        cli_download = ['-t', torrent_path, '-o', config['download_dir']] + filter_cli
+        download = lambda: worker_runner.run_worker('torrent_downloader', cli_download, torrent_file=torrent_path,
+                                                    output_dir=config['download_dir'], **filter_kwargs)
+    elif download is None:
+        download = session_download(lambda ses: ses.add_torrent_file(torrent_path, config['download_dir'], file_filter=torrent_file_filter(args)))
+    base_name, _ = os.path.splitext(torrent_filename)
+    return {'name': torrent_filename, 'base_name': base_name, 'download': download,
+            'on_done': lambda: move_processed_torrent(config, torrent_filename)}
 
 def workflow_torrent_download(args, config):
     """Quy trình cho Torrent (duyệt thư mục trước)."""
-    print(">>> DEBUG: Đã vào trong hàm workflow_torrent_download.") # DÒNG DEBUG 1
     torrent_dir = config['torrent_dir']
     if not os.path.isdir(torrent_dir):
         print(f"Lỗi: Thư mục torrent '{torrent_dir}' không tồn tại."); return
 
-    print(f">>> DEBUG: Sẽ đọc các file từ thư mục: {torrent_dir}") # DÒNG DEBUG 2
-    torrent_files = [f for f in os.listdir(torrent_dir) if f.endswith('.torrent')]
-    
-    print(f">>> DEBUG: Danh sách file .torrent tìm thấy: {torrent_files}") # DÒNG DEBUG 3
+    torrent_files = [os.path.basename(p) for p in dir_scanner.list_files(torrent_dir, '.torrent')]
     if not torrent_files:
         print(f"Không tìm thấy file .torrent nào trong '{torrent_dir}'."); return
-        
-    print(f"Tìm thấy {len(torrent_files)} file .torrent để xử lý.") # Dòng code gốc
-    
-    print(">>> DEBUG: Sẽ bắt đầu vòng lặp xử lý file.") # DÒNG DEBUG 4
-    for i, torrent_filename in enumerate(sorted(torrent_files)):
-        print(f"\n--- Bắt đầu xử lý file {i+1}/{len(torrent_files)}: {torrent_filename} ---")
+    print(f"Tìm thấy {len(torrent_files)} file .torrent để xử lý.")
+
+    if worker_runner.settings['mode'] == 'subprocess':
+        run_tasks([make_torrent_job(args, config, f) for f in sorted(torrent_files)], args, config)
+        return
+
+    file_filter = torrent_file_filter(args)
+    if args.stream_files:
+        sources = []
+        for torrent_filename in sorted(torrent_files):
+            torrent_path = os.path.join(torrent_dir, torrent_filename)
+            sources.append({'name': torrent_filename, 'base_name': os.path.splitext(torrent_filename)[0],
+                            'on_done': lambda f=torrent_filename: move_processed_torrent(config, f),
+                            'add': lambda cb, p=torrent_path: get_torrent_session().add_torrent_file(
+                                p, config['download_dir'], file_filter=file_filter,
+                                on_file_complete=cb, sequential=args.sequential_files)})
+        run_streamed_tasks(sources, args, config)
+        return
+
+    if fair_scheduler.enabled():
+        # Torrent chỉ được thêm vào session khi tới lượt tải (xem session_download)
+        run_tasks([make_torrent_job(args, config, f) for f in sorted(torrent_files)], args, config)
+        return
+
+    # Thêm mọi torrent vào session chung cùng lúc, xử lý torrent nào tải xong trước
+    futures = {}
+    for torrent_filename in sorted(torrent_files):
         torrent_path = os.path.join(torrent_dir, torrent_filename)
-
-        cmd_download = ['python3', 'downloaders/torrent_downloader.py', '-t', torrent_path, '-o', config['download_dir']]
-        download_result = run_module(cmd_download)
-        if download_result.get('status') != 'success':
-            print(f" -> Tải torrent thất bại: {download_result.get('message')}"); continue
-
-        newly_downloaded_files = download_result.get('files', [])
-        if not newly_downloaded_files:
-            print(" -> Downloader không trả về file nào."); continue
-
-        filtered_files = step_filter_files(newly_downloaded_files, args.min_size_mb)
-        if not filtered_files:
-            print(" -> Không còn file nào sau khi lọc."); continue
-
-        base_name, _ = os.path.splitext(torrent_filename)
-        renamed_files = step_rename_files(filtered_files, base_name)
-        if not renamed_files:
-            print(" -> Dừng xử lý file này do đổi tên thất bại."); continue
-
-        processed_files = step_split_files(renamed_files, args.split_max_gb, args.split_at_times)
-        step_upload_files(processed_files, args.uploaders, config)
-        step_store_files(processed_files, config['save_dir'])
-
-        dest_path = os.path.join(config['torrent_downloaded_dir'], torrent_filename)
-        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-        shutil.move(torrent_path, dest_path)
-        print(f" -> Đã di chuyển {torrent_filename} sang thư mục đã xử lý.")
-        print(f"--- Hoàn thành xử lý: {torrent_filename} ---")
+        try:
+            futures[get_torrent_session().add_torrent_file(torrent_path, config['download_dir'], file_filter=file_filter)] = torrent_filename
+        except Exception as e:
+            print(f" -> Không thể thêm {torrent_filename} vào session: {e}")
+    jobs = (make_torrent_job(args, config, futures[f], f.result) for f in as_completed(futures))
+    run_tasks(jobs, args, config, total=len(futures))
 
 def workflow_process_local(args, config):
     """Quy trình xử lý các file có sẵn trong thư mục."""
@@ -232,7 +488,7 @@ def workflow_process_local(args, config):
     if not args.output_name:
         print("Lỗi: Workflow 'process-local' yêu cầu --output-name."); return
 
-    initial_files = [os.path.join(args.source_dir, f) for f in os.listdir(args.source_dir) if os.path.isfile(os.path.join(args.source_dir, f))]
+    initial_files = dir_scanner.list_files(args.source_dir)
     if not initial_files:
         print(f"Không tìm thấy file nào trong {args.source_dir}."); return
 
@@ -244,10 +500,21 @@ def workflow_process_local(args, config):
     if not renamed_files: print("Dừng do đổi tên thất bại."); return
 
     processed_files = renamed_files
-    if args.join_files: processed_files = step_join_files(processed_files, args.output_name)
-    processed_files = step_split_files(processed_files, args.split_max_gb, args.split_at_times)
-
-    step_upload_files(processed_files, args.uploaders, config)
+    if args.join_files and args.split_max_gb and not args.split_at_times:
+        split = lambda on_part: step_join_split_files(processed_files, args.output_name, args.split_max_gb, on_part)
+    else:
+        if args.join_files: processed_files = step_join_files(processed_files, args.output_name)
+        split = lambda on_part: step_split_files(processed_files, args.split_max_gb, args.split_at_times, on_part)
+
+    with fair_scheduler.slot('split', config.get('category')):
+        if args.uploaders:
+            scheduler = create_upload_scheduler(config)
+            processed_files, _ = split_with_uploads(split, args.uploaders, config, scheduler)
+        else:
+            processed_files = split(None)
+    if args.uploaders:
+        scheduler.join()
+        scheduler.print_report()
     step_store_files(processed_files, config['save_dir'])
     print("\nQuy trình 'process-local' đã hoàn tất!")
     
@@ -255,10 +522,20 @@ def workflow_upload_local(args, config):
     """Quy trình chỉ upload các file còn thiếu từ thư mục lưu trữ."""
     if not args.uploaders:
         print("Lỗi: Workflow 'upload-local' yêu cầu --uploaders."); return
+    # Link còn nằm trong journal (lần chạy trước bị ngắt) phải có trong Excel trước khi tìm file còn thiếu
+    link_ledger.get_ledger(config['excel_file'], config_manager.get_settings('ledger')).flush()
+    if not os.path.isdir(config['save_dir']):
+        print(f"Lỗi: Thư mục nguồn '{config['save_dir']}' không tồn tại."); return
+    # Quét thư mục một lần cho mọi host
+    scan = dir_scanner.get_scanner().scan(config['save_dir'])
+    entries = scan.entries
+    print(f" -> {len(entries)} file trong thư mục nguồn ({len(scan.added)} mới, {len(scan.changed)} thay đổi, "
+          f"{len(scan.removed)} đã xoá so với lần quét trước).")
         
     for host in args.uploaders:
         print(f"\n--- Tìm file cần upload cho host: {host}.com ---")
-        files_to_upload = file_utils.find_files_to_upload(config['save_dir'], config['excel_file'], 'Host_Storage', 'Host_Storage', f"{host}.com")
+        files_to_upload = file_utils.find_files_to_upload(config['save_dir'], config['excel_file'], 'Host_Storage', 'Host_Storage', f"{host}.com",
+                                                          config_manager.get_settings('content_index', content_index.DEFAULT_SETTINGS), entries)
         if not files_to_upload:
             print(f" -> Không có file mới nào cần upload cho {host}.com.")
             continue
@@ -266,38 +543,193 @@ def workflow_upload_local(args, config):
         step_upload_files(files_to_upload, [host], config)
     print("\nQuy trình 'upload-local' đã hoàn tất!")
 
+def workflow_sync_excel(args, config):
+    """Đồng bộ hai chiều giữa database và file Excel của danh mục (nhập sheet mới sửa, xuất trạng thái/link còn thiếu)."""
+    store = job_store.get_store()
+    link_ledger.get_ledger(config['excel_file'], config_manager.get_settings('ledger')).flush()
+    for sheet_name in ['DownLoadUrl', 'DownLoadMagnetLink']:
+        try:
+            store.import_tasks(config['excel_file'], sheet_name, force=True)
+            print(f" -> [{sheet_name}] Đã ghi {store.export_task_status(config['excel_file'], sheet_name)} trạng thái ra Excel.")
+        except Exception as e: print(f" -> [{sheet_name}] Bỏ qua: {e}")
+    store.import_links(config['excel_file'], force=True)
+    print(f" -> [Host_Storage] Đã ghi {store.export_links(config['excel_file'])} link ra Excel.")
+
+def workflow_serve(args, config):
+    """
+    Chạy thường trực: định kỳ quét torrent_dir và các sheet tác vụ trong Excel, đưa tác vụ mới vào một pipeline
+    dùng chung. Session libtorrent, kết nối HTTP và cấu hình đã đọc được giữ lại giữa các tác vụ.
+    Tác vụ thất bại chỉ được thử lại sau retry_failed_after giây. Dừng bằng Ctrl+C (chờ các tác vụ đang chạy xong).
+    """
+    settings = config_manager.get_settings('serve', SERVE_DEFAULTS)
+    interval, retry_after = float(settings['poll_interval']), float(settings['retry_failed_after'])
+    store = job_store.get_store()
+    lock = threading.Lock()
+    active, failed, finished_sheets, sheet_errors = set(), {}, set(), {}
+
+    def on_finish(job, completed):
+        with lock:
+            active.discard(job['key'])
+            if not completed: failed[job['key']] = time.time()
+            elif job['key'][0] in TASK_SHEETS.values(): finished_sheets.add(job['key'][0])
+
+    def waiting(key):
+        with lock: return key not in active and time.time() - failed.get(key, float('-inf')) >= retry_after
+
+    def new_jobs():
+        """(khoá, hàm tạo job) của các tác vụ chưa chạy; job chỉ được tạo (thêm vào session) khi pipeline nhận."""
+        torrent_dir = config.get('torrent_dir')
+        if torrent_dir and os.path.isdir(torrent_dir):
+            for path in dir_scanner.list_files(torrent_dir, '.torrent'):
+                key = ('torrent', os.path.basename(path))
+                if waiting(key): yield key, lambda f=key[1]: make_torrent_job(args, config, f)
+        for workflow, sheet in TASK_SHEETS.items():
+            # Excel chỉ được đọc lại khi file thay đổi
+            try: store.import_tasks(config['excel_file'], sheet)
+            except Exception as e:
+                if sheet_errors.get(sheet) != str(e): print(f" -> [{sheet}] Bỏ qua: {e}")
+                sheet_errors[sheet] = str(e); continue
+            sheet_errors.pop(sheet, None)
+            for task in store.pending_tasks(config['excel_file'], sheet):
+                key = (sheet, task['name'], task['link'])
+                # Dòng thiếu Name/link bị bỏ qua cho tới khi được sửa trong Excel
+                if not task['name'] or not task['link'] or not waiting(key): continue
+                on_done = lambda t=task, s=sheet: store.set_task_status(config['excel_file'], s, t['name'], t['link'])
+                yield key, lambda w=workflow, t=task, d=on_done: make_link_job(args, config, w, t['name'], t['link'], d)
+
+    def export_status():
+        with lock:
+            sheets = set(finished_sheets)
+            finished_sheets.clear()
+        for sheet in sheets:
+            try: store.export_task_status(config['excel_file'], sheet)
+            except Exception as e: print(f"Lỗi khi ghi trạng thái tác vụ ra Excel (vẫn còn trong database): {e}")
+
+    pipeline_settings = config_manager.get_settings('pipeline', PIPELINE_DEFAULTS)
+    scheduler = create_upload_scheduler(config)
+    stages = [
+        pipeline.Stage(name, func, workers=pipeline_settings[f'{name}_workers'], queue_size=pipeline_settings['queue_size'])
+        for name, func in make_task_stages(args, config, scheduler)
+    ]
+    pipe = pipeline.Pipeline(stages, max_inflight=int(pipeline_settings['max_inflight_tasks']), on_finish=on_finish)
+    print(f"[SERVE] Theo dõi '{config.get('torrent_dir')}' và '{config['excel_file']}' mỗi {interval:g} giây (Ctrl+C để dừng)...")
+    try:
+        while not shutdown.is_set():
+            for key, make_job in new_jobs():
+                job = make_job()
+                job['key'] = key
+                with lock: active.add(key)
+                print(f"\n--- Đưa tác vụ mới vào hàng đợi: {job['name']} ---")
+                pipe.put(job)
+            export_status()
+            shutdown.wait(interval)
+    except KeyboardInterrupt:
+        print("\n[SERVE] Đang dừng: chờ các tác vụ đang chạy hoàn tất...")
+    pipe.join()
+    scheduler.join()
+    scheduler.print_report()
+    export_status()
+
+def load_category_config(category):
+    """Cấu hình của một danh mục (None nếu không có), download_dir chuyển sang staging_dir nếu được cấu hình."""
+    config = config_manager.get_category_config(category)
+    if not config: return None
+    config['category'] = category
+    staging_dir = config_manager.get_settings('storage', file_transfer.DEFAULT_SETTINGS)['staging_dir']
+    if staging_dir:
+        # Tải/nối/chia trên ổ cục bộ nhanh; bước lưu trữ chỉ chép các phần cuối cùng sang save_dir một lần
+        config['download_dir'] = os.path.join(staging_dir, category)
+        os.makedirs(config['download_dir'], exist_ok=True)
+    return config
+
+def run_workflow(args, config):
+    """Bộ điều phối workflow."""
+    if args.workflow in ['url-download', 'magnet-download']:
+        workflow_url_magnet_download(args, config)
+    elif args.workflow == 'torrent-download':
+        workflow_torrent_download(args, config)
+    elif args.workflow == 'process-local':
+        workflow_process_local(args, config)
+    elif args.workflow == 'upload-local':
+        workflow_upload_local(args, config)
+    elif args.workflow == 'sync-excel':
+        workflow_sync_excel(args, config)
+    elif args.workflow == 'serve':
+        workflow_serve(args, config)
+
+def run_all_categories(args):
+    """
+    --category all: chạy workflow cho mọi danh mục (section có excel_file) trong một tiến trình, mỗi danh mục
+    một luồng. Tải về, chia file và upload dùng chung giới hạn ([scheduler], [upload], [upload_hosts]) và được
+    chia lượt theo trọng số `weight` của từng danh mục, nên một danh mục nhiều việc không chặn các danh mục khác.
+    """
+    global shared_uploads
+    if args.workflow not in ALL_CATEGORY_WORKFLOWS:
+        print(f"Lỗi: Workflow '{args.workflow}' không chạy được với --category all."); return
+    configs = [c for c in map(load_category_config, config_manager.get_categories()) if c]
+    if not configs:
+        print("Lỗi: Không có danh mục nào (section có excel_file) trong config.ini."); return
+    weights = {c['category']: c.get('weight', 1) for c in configs}
+    fair_scheduler.configure(config_manager.get_settings('scheduler', fair_scheduler.DEFAULT_LIMITS), weights)
+    shared_uploads = upload_scheduler.from_config(config_manager.get_settings('upload'), config_manager.get_settings('upload_hosts'), weights)
+    print(f"[TẤT CẢ DANH MỤC] {', '.join(f'{name} (x{weight})' for name, weight in weights.items())}")
+
+    with ThreadPoolExecutor(max_workers=len(configs)) as pool:
+        futures = {pool.submit(run_workflow, args, c): c['category'] for c in configs}
+        try:
+            for future in as_completed(futures):
+                try: future.result()
+                except Exception as e: print(f"Lỗi ở danh mục {futures[future]}: {e}")
+        except KeyboardInterrupt:
+            # Các luồng serve dừng nhận việc mới; các workflow khác chạy nốt
+            print("\n[TẤT CẢ DANH MỤC] Đang dừng: chờ các tác vụ đang chạy hoàn tất...")
+            shutdown.set()
+    shared_uploads.join()
+    shared_uploads.print_report()
+
 # --- HÀM MAIN CHÍNH ---
 def main():
     parser = argparse.ArgumentParser(description="Công cụ tự động hóa xử lý và upload file.", formatter_class=argparse.RawTextHelpFormatter)
     
     req_args = parser.add_argument_group('Tham số bắt buộc')
-    req_args.add_argument("-c", "--category", required=True, help="Tên danh mục trong config.ini.")
-    req_args.add_argument("-w", "--workflow", required=True, choices=['url-download', 'torrent-download', 'magnet-download', 'process-local', 'upload-local'], help="Quy trình cần chạy.")
+    req_args.add_argument("-c", "--category", required=True, help="Tên danh mục trong config.ini, hoặc 'all' để chạy mọi danh mục trong một tiến trình.")
+    req_args.add_argument("-w", "--workflow", required=True, choices=['url-download', 'torrent-download', 'magnet-download', 'process-local', 'upload-local', 'sync-excel', 'serve'], help="Quy trình cần chạy (serve: chạy thường trực, tự nhận torrent/tác vụ Excel mới).")
     
     opt_args = parser.add_argument_group('Tham số tùy chọn')
     opt_args.add_argument("--min-size-mb", type=int, default=10, help="Lọc file nhỏ hơn dung lượng này (MB).")
+    opt_args.add_argument("--include-ext", nargs='+', help="Torrent/magnet: chỉ tải các file có phần mở rộng này (vd: mp4 mkv).")
+    opt_args.add_argument("--exclude-ext", nargs='+', help="Torrent/magnet: không tải các file có phần mở rộng này (vd: txt jpg).")
+    opt_args.add_argument("--stream-files", action='store_true', help="Torrent/magnet: xử lý (đổi tên/chia/upload) từng file ngay khi file đó tải xong.")
+    opt_args.add_argument("--sequential-files", action='store_true', help="Torrent/magnet: tải piece theo thứ tự để các file xong lần lượt (dùng với --stream-files).")
     opt_args.add_argument("--source-dir", help="Thư mục nguồn cho 'process-local'.")
     opt_args.add_argument("--output-name", help="Tên file output cho 'process-local'.")
     opt_args.add_argument("--join-files", action='store_true', help="Nối các file thành một.")
     opt_args.add_argument("--split-max-gb", type=int, help="Chia file tự động theo dung lượng (GB).")
-    opt_args.add_argument("--split-at-times", nargs='+', type=float, help="Chia file thủ công theo các mốc thời gian (giây).")
+    opt_args.add_argument("--split-at-times", nargs='+', type=float, help="Chia file thủ công theo các mốc thời gian (giây), áp dụng cho mọi file.")
+    opt_args.add_argument("--split-times-json", help="File JSON {tên file: [mốc thời gian, ...]} để chia thủ công từng file theo mốc riêng.")
     opt_args.add_argument("-up", "--uploaders", nargs='+', help="Danh sách host để upload (vd: nitroflare keep2share).")
+    opt_args.add_argument("--exec-mode", choices=worker_runner.MODES, default='inprocess', help="Gọi worker trực tiếp trong tiến trình (mặc định) hoặc chạy script python3 riêng như trước.")
+    opt_args.add_argument("--pipeline", action='store_true', help="Chạy các tác vụ tải về theo pipeline: tải tác vụ sau trong khi tác vụ trước đang chia/upload.")
+    opt_args.add_argument("--worker-pool", type=int, help="Số file được chia song song (mặc định: min(số CPU, 4), như số phần cắt song song).")
     
     args = parser.parse_args()
+    worker_runner.configure(args.exec_mode, args.worker_pool or ffmpeg_splitter.default_workers())
+    if args.split_times_json:
+        with open(args.split_times_json, 'r', encoding='utf-8') as f: args.split_at_times = json.load(f)
     
-    config = config_manager.get_category_config(args.category)
-    if not config:
-        print(f"Lỗi: Không có cấu hình cho '{args.category}'."); return
-    
-    # Bộ điều phối workflow
-    if args.workflow in ['url-download', 'magnet-download']:
-        workflow_url_magnet_download(args, config)
-    elif args.workflow == 'torrent-download':
-        workflow_torrent_download(args, config)
-    elif args.workflow == 'process-local':
-        workflow_process_local(args, config)
-    elif args.workflow == 'upload-local':
-        workflow_upload_local(args, config)
+    job_store.get_store(config_manager.get_settings('store', {'db_file': job_store.DEFAULT_DB_FILE})['db_file'])
+    dir_scanner.get_scanner(config_manager.get_settings('scanner', dir_scanner.DEFAULT_SETTINGS))
+    try:
+        if args.category == 'all':
+            run_all_categories(args)
+            return
+        config = load_category_config(args.category)
+        if not config:
+            print(f"Lỗi: Không có cấu hình cho '{args.category}'."); return
+        run_workflow(args, config)
+    finally:
+        # Ghi nốt các link upload còn chờ vào Excel
+        link_ledger.close_all()
 
 if __name__ == '__main__':
     main()
@@ -2,41 +2,60 @@
 import argparse
 import json
 import os
-import subprocess
+from typing import TYPE_CHECKING
+
+try:
+    from . import upload_client
+except ImportError:
+    import upload_client
+
+if TYPE_CHECKING:
+    from core.worker_runner import UploadResult
+
+# Form upload (có chữ ký) được dùng lại cho nhiều file trong khoảng này (giây); host từ chối chữ ký thì lấy form mới
+FORM_TTL = 600
+# Phản hồi lỗi của Keep2Share chứa các từ này nghĩa là chữ ký form/access token không còn hợp lệ
+AUTH_ERROR_WORDS = ('signature', 'token', 'auth')
+
+def get_upload_form(access_token):
+    get_form_url = f"{upload_client.base_url('keep2share')}/api/v2/getUploadFormData"
+    form_data = upload_client.request_json('keep2share', 'POST', get_form_url, json={"access_token": access_token})
+    if not form_data.get('form_action') or not form_data.get('file_field'):
+        raise ValueError(f"Không lấy được form upload: {form_data}")
+    return form_data
+
+def upload_with_form(form_data, file_path):
+    upload_response, bytes_per_s = upload_client.upload(
+        'keep2share', form_data['form_action'], file_path, form_data['file_field'], form_data.get('form_data', {}))
+    if upload_response.get('status') == 'success':
+        return {"status": "success", "upload_url": upload_response.get('link'), "bytes_per_s": bytes_per_s}
+    message = str(upload_response.get('message', '')).lower()
+    if any(word in message for word in AUTH_ERROR_WORDS):
+        raise upload_client.AuthError(f"Upload bị từ chối: {upload_response}")
+    # Lỗi khác (hết quota, file quá lớn, lỗi server...): upload lại cũng không khác, báo lỗi luôn
+    raise RuntimeError(f"Upload thất bại: {upload_response}")
+
+def upload_file(file_path, access_token) -> 'UploadResult':
+    """Upload một file lên Keep2Share (form upload lấy từ cache), trả về UploadResult."""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File không tồn tại: {file_path}")
+    # Chữ ký hết hạn/bị từ chối (AuthError): bỏ form cũ, lấy form mới và thử lại đúng một lần
+    return upload_client.with_token(
+        upload_client.cache_key('keep2share', access_token),
+        lambda: get_upload_form(access_token),
+        lambda form_data: upload_with_form(form_data, file_path),
+        FORM_TTL,
+    )
 
 def main():
     parser = argparse.ArgumentParser(description="Tải file lên Keep2Share.")
     parser.add_argument("-f", "--file", required=True, help="Đường dẫn file cần upload.")
     parser.add_argument("--access_token", required=True, help="Access token của tài khoản Keep2Share.")
     args = parser.parse_args()
-    
+
     try:
-        if not os.path.exists(args.file):
-            raise FileNotFoundError(f"File không tồn tại: {args.file}")
-
-        get_form_url = "https://k2s.cc/api/v2/getUploadFormData"
-        form_payload = json.dumps({"access_token": args.access_token})
-        form_cmd = ['curl', '-s', '-X', 'POST', '-H', 'Content-type: application/json', '-d', form_payload, get_form_url]
-        form_data = json.loads(subprocess.run(form_cmd, capture_output=True, text=True, check=True).stdout)
-
-        form_action = form_data.get('form_action')
-        file_field = form_data.get('file_field')
-        if not form_action or not file_field:
-            raise ValueError(f"Không lấy được form upload: {form_data}")
-
-        upload_cmd = ['curl', '-s']
-        for key, value in form_data.get('form_data', {}).items():
-            upload_cmd.extend(['-F', f'{key}={value}'])
-        upload_cmd.extend(['-F', f'{file_field}=@{args.file}'])
-        upload_cmd.append(form_action)
-        
-        upload_response = json.loads(subprocess.run(upload_cmd, capture_output=True, text=True, check=True).stdout)
-        
-        if upload_response.get('status') == 'success':
-            result = {"status": "success", "upload_url": upload_response.get('link')}
-            print(json.dumps(result, indent=4))
-        else:
-            raise RuntimeError(f"Upload thất bại: {upload_response}")
+        result = upload_file(args.file, args.access_token)
+        print(json.dumps(result, indent=4))
 
     except Exception as e:
         print(json.dumps({"status": "error", "message": str(e)}, indent=4))
@@ -2,35 +2,66 @@
 import argparse
 import json
 import os
-import subprocess
+from typing import TYPE_CHECKING
+
+import requests
+
+try:
+    from . import upload_client
+except ImportError:
+    import upload_client
+
+if TYPE_CHECKING:
+    from core.worker_runner import UploadResult
+
+# Server upload được dùng lại cho nhiều file trong khoảng này (giây)
+SERVER_TTL = 1800
+
+class ServerRejected(RuntimeError):
+    """Server upload đã cache trả lời nhưng không nhận file (HTTP 4xx): cần lấy server khác."""
+
+def get_server():
+    base = upload_client.base_url('nitroflare')
+    server_url = upload_client.request('nitroflare', 'GET', f"{base}/plugins/fileupload/getServer").text.strip()
+    if not server_url:
+        raise ConnectionError("Không lấy được server upload từ Nitroflare.")
+    return server_url
+
+def upload_to_server(server_url, file_path, user_hash):
+    try:
+        response_json, bytes_per_s = upload_client.upload('nitroflare', server_url, file_path, 'files', {'user': user_hash})
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else None
+        if status is not None and 400 <= status < 500: raise ServerRejected(str(e)) from e
+        raise
+    file_info = (response_json.get('files') or [{}])[0]
+    upload_url = file_info.get('url')
+
+    if upload_url:
+        return {"status": "success", "upload_url": upload_url.replace('\\/', '/'), "bytes_per_s": bytes_per_s}
+    raise ValueError(f"Upload thất bại hoặc kết quả không hợp lệ: {response_json}")
+
+def upload_file(file_path, user_hash) -> 'UploadResult':
+    """Upload một file lên Nitroflare (server upload lấy từ cache), trả về UploadResult."""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File không tồn tại: {file_path}")
+    # Server cũ không còn nhận file thì lấy server mới và thử lại. Lỗi mạng/timeout/5xx đã được
+    # upload_client.upload thử lại, không upload lại cả file lần nữa.
+    return upload_client.with_token(
+        upload_client.cache_key('nitroflare', 'server'), get_server,
+        lambda server_url: upload_to_server(server_url, file_path, user_hash),
+        SERVER_TTL, refresh_on=(upload_client.AuthError, ServerRejected),
+    )
 
 def main():
     parser = argparse.ArgumentParser(description="Tải file lên Nitroflare.")
     parser.add_argument("-f", "--file", required=True, help="Đường dẫn file cần upload.")
     parser.add_argument("--user_hash", required=True, help="User hash của tài khoản Nitroflare.")
     args = parser.parse_args()
-    
+
     try:
-        if not os.path.exists(args.file):
-            raise FileNotFoundError(f"File không tồn tại: {args.file}")
-
-        get_server_cmd = ['curl', '-s', 'http://nitroflare.com/plugins/fileupload/getServer']
-        server_url = subprocess.run(get_server_cmd, capture_output=True, text=True, check=True).stdout.strip()
-        if not server_url:
-            raise ConnectionError("Không lấy được server upload từ Nitroflare.")
-
-        upload_cmd = ['curl', '-s', '-F', f"user={args.user_hash}", '-F', f"files=@{args.file}", server_url]
-        response_text = subprocess.run(upload_cmd, capture_output=True, text=True, check=True).stdout
-        
-        response_json = json.loads(response_text)
-        file_info = response_json.get('files', [{}])[0]
-        upload_url = file_info.get('url')
-
-        if upload_url:
-            result = {"status": "success", "upload_url": upload_url.replace('\\/', '/')}
-            print(json.dumps(result, indent=4))
-        else:
-            raise ValueError(f"Upload thất bại hoặc kết quả không hợp lệ: {response_text}")
+        result = upload_file(args.file, args.user_hash)
+        print(json.dumps(result, indent=4))
 
     except Exception as e:
         print(json.dumps({"status": "error", "message": str(e)}, indent=4))
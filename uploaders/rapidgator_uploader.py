@@ -2,15 +2,59 @@
 import argparse
 import json
 import os
-import subprocess
-import time
+from typing import TYPE_CHECKING
 
-def run_curl(cmd):
-    """Hàm phụ để chạy lệnh curl và trả về stdout."""
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise subprocess.CalledProcessError(result.returncode, cmd, output=result.stdout, stderr=result.stderr)
-    return result.stdout
+try:
+    from . import upload_client
+except ImportError:
+    import upload_client
+
+if TYPE_CHECKING:
+    from core.worker_runner import UploadResult
+
+# Token đăng nhập được dùng lại cho mọi file trong khoảng này (giây)
+TOKEN_TTL = 3600
+
+def login(username, password):
+    """Đăng nhập và trả về access token."""
+    login_response = upload_client.request_json('rapidgator', 'POST', f"{upload_client.base_url('rapidgator')}/api/v2/user/login",
+                                                 data={'login': username, 'password': password})
+    token = (login_response.get('response') or {}).get('token')
+    if not token:
+        raise ValueError("Lấy access token thất bại.")
+    return token
+
+def upload_with_token(token, file_path):
+    # 1. Lấy URL để upload
+    file_name = os.path.basename(file_path)
+    upload_info_response = upload_client.request_json('rapidgator', 'GET', f"{upload_client.base_url('rapidgator')}/api/v2/file/upload",
+                                                      params={'token': token, 'name': file_name})
+    if upload_info_response.get('status') in upload_client.AUTH_STATUS:
+        raise upload_client.AuthError(f"Token bị từ chối: {upload_info_response}")
+    upload_url = (upload_info_response.get('response') or {}).get('url')
+    if not upload_url:
+        raise ValueError(f"Lấy upload URL thất bại: {upload_info_response}")
+
+    # 2. Upload file
+    upload_response, bytes_per_s = upload_client.upload('rapidgator', upload_url, file_path, 'file')
+    file_id = ((upload_response.get('response') or {}).get('file') or {}).get('id')
+    if not file_id:
+         raise RuntimeError(f"Upload file thất bại: {upload_response}")
+
+    # 3. Trả về kết quả thành công với link file
+    file_link = f"https://rapidgator.net/file/{file_id}"
+    return {"status": "success", "upload_url": file_link, "bytes_per_s": bytes_per_s}
+
+def upload_file(file_path, username, password) -> 'UploadResult':
+    """Upload một file lên Rapidgator (token lấy từ cache, tự đăng nhập lại khi hết hạn), trả về UploadResult."""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File không tồn tại: {file_path}")
+    return upload_client.with_token(
+        upload_client.cache_key('rapidgator', username, password),
+        lambda: login(username, password),
+        lambda token: upload_with_token(token, file_path),
+        TOKEN_TTL,
+    )
 
 def main():
     parser = argparse.ArgumentParser(description="Tải file lên Rapidgator.")
@@ -20,34 +64,7 @@ def main():
     args = parser.parse_args()
 
     try:
-        if not os.path.exists(args.file):
-            raise FileNotFoundError(f"File không tồn tại: {args.file}")
-
-        # 1. Lấy token
-        login_cmd = ['curl', '-s', '-X', 'POST', 'https://rapidgator.net/api/v2/user/login', '-d', f'login={args.username}', '-d', f'password={args.password}']
-        login_response = json.loads(run_curl(login_cmd))
-        token = login_response.get('response', {}).get('token')
-        if not token:
-            raise ValueError("Lấy access token thất bại.")
-
-        # 2. Lấy URL để upload
-        file_name = os.path.basename(args.file)
-        get_url_cmd = ['curl', '-s', '-G', 'https://rapidgator.net/api/v2/file/upload', '--data-urlencode', f'token={token}', '--data-urlencode', f'name={file_name}']
-        upload_info_response = json.loads(run_curl(get_url_cmd))
-        upload_url = upload_info_response.get('response', {}).get('url')
-        if not upload_url:
-            raise ValueError(f"Lấy upload URL thất bại: {upload_info_response}")
-
-        # 3. Upload file
-        upload_cmd = ['curl', '-s', '-X', 'POST', upload_url, '-F', f'file=@{args.file}']
-        upload_response = json.loads(run_curl(upload_cmd))
-        file_id = upload_response.get('response', {}).get('file', {}).get('id')
-        if not file_id:
-             raise RuntimeError(f"Upload file thất bại: {upload_response}")
-
-        # 4. Trả về kết quả thành công với link file
-        file_link = f"https://rapidgator.net/file/{file_id}"
-        result = {"status": "success", "upload_url": file_link}
+        result = upload_file(args.file, args.username, args.password)
         print(json.dumps(result, indent=4))
 
     except Exception as e:
@@ -0,0 +1,252 @@
+# /uploaders/upload_client.py
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+from urllib3.util.retry import Retry
+
+# Địa chỉ API của từng host; đặt biến môi trường để trỏ sang server thử (xem benchmarks/fake_hosts.py)
+BASE_URLS = {
+    'nitroflare': os.environ.get('NITROFLARE_BASE_URL', 'http://nitroflare.com'),
+    'keep2share': os.environ.get('KEEP2SHARE_BASE_URL', 'https://k2s.cc'),
+    'rapidgator': os.environ.get('RAPIDGATOR_BASE_URL', 'https://rapidgator.net'),
+}
+
+# Mỗi lần đọc file / gửi lên socket 1 MiB (mặc định của urllib3 chỉ 16 KiB)
+CHUNK_SIZE = 1024 * 1024
+# Số kết nối giữ sẵn cho mỗi host (>= số upload đồng thời lên một host)
+POOL_SIZE = 16
+RETRIES = 3
+# (kết nối, đọc): gọi API thì chờ ngắn, upload thì chờ server xử lý file lâu hơn
+API_TIMEOUT = (15, 60)
+UPLOAD_TIMEOUT = (15, 600)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+AUTH_STATUS = {401, 403}
+# Nơi lưu token / form upload / server upload giữa các lần chạy (chứa thông tin đăng nhập: quyền 0600)
+TOKEN_CACHE_FILE = os.environ.get('JAVSHARE_TOKEN_CACHE', 'upload_cache.json')
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+class _PooledAdapter(HTTPAdapter):
+    """HTTPAdapter gửi body theo khối CHUNK_SIZE thay vì 16 KiB."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['blocksize'] = CHUNK_SIZE
+        super().init_poolmanager(*args, **kwargs)
+
+class AuthError(Exception):
+    """Host từ chối token/phiên đăng nhập: cần lấy token mới rồi thử lại."""
+
+def base_url(host):
+    return BASE_URLS[host].rstrip('/')
+
+def get_session(host):
+    """Session HTTP dùng chung (giữ kết nối) cho một host, an toàn khi nhiều luồng upload cùng lúc."""
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            # Chỉ tự thử lại lỗi kết nối (chưa gửi byte nào); lỗi khác do request() xử lý
+            adapter = _PooledAdapter(pool_connections=4, pool_maxsize=POOL_SIZE,
+                                     max_retries=Retry(total=RETRIES, connect=RETRIES, read=0, status=0, backoff_factor=0.5))
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[host] = session
+        return session
+
+class MultipartFile:
+    """Body multipart/form-data đọc dần từ đĩa: bộ nhớ dùng cố định dù file nặng nhiều GB."""
+
+    def __init__(self, file_path, file_field, fields=None, on_read=None):
+        boundary = uuid.uuid4().hex
+        name = os.path.basename(file_path).replace('"', '%22')
+        head = b''.join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode('utf-8')
+            for key, value in (fields or {}).items()
+        )
+        head += (f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{name}"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n').encode('utf-8')
+        tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self.length = len(head) + os.path.getsize(file_path) + len(tail)
+        self.parts = [io.BytesIO(head), open(file_path, 'rb'), io.BytesIO(tail)]
+        self.on_read = on_read
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0: size = self.length
+        chunks = []
+        while size > 0 and self.parts:
+            data = self.parts[0].read(size)
+            if not data:
+                self.parts.pop(0).close()
+                continue
+            chunks.append(data)
+            size -= len(data)
+        data = b''.join(chunks)
+        if data and self.on_read: self.on_read(len(data))
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(CHUNK_SIZE)
+            if not data: return
+            yield data
+
+    def close(self):
+        for part in self.parts: part.close()
+        self.parts = []
+
+def _check_auth(response):
+    if response.status_code in AUTH_STATUS:
+        raise AuthError(f"HTTP {response.status_code} từ {response.url}: {response.text[:200]}")
+
+def _should_retry(response):
+    return response.status_code in RETRY_STATUS
+
+def request(host, method, url, retries=RETRIES, **kwargs):
+    """Gọi API của host qua session dùng chung, thử lại khi mất kết nối, hết thời gian hoặc lỗi 429/5xx."""
+    kwargs.setdefault('timeout', API_TIMEOUT)
+    for attempt in range(retries + 1):
+        try:
+            response = get_session(host).request(method, url, **kwargs)
+            _check_auth(response)
+            if not _should_retry(response) or attempt == retries:
+                response.raise_for_status()
+                return response
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries: raise
+        time.sleep(2 ** attempt)
+
+def parse_json(response):
+    try:
+        return response.json()
+    except ValueError:
+        raise ValueError(f"Phản hồi không phải JSON từ {response.url}: {response.text[:200]}")
+
+def request_json(host, method, url, **kwargs):
+    return parse_json(request(host, method, url, **kwargs))
+
+def upload(host, url, file_path, file_field, fields=None, retries=RETRIES, progress=True):
+    """
+    POST file dạng multipart (stream từ đĩa) lên url. Mỗi lần thử lại gửi lại từ đầu.
+    Trả về (JSON phản hồi, tốc độ byte/s).
+    """
+    name = os.path.basename(file_path)
+    with tqdm(desc=f"{host}: {name}", total=os.path.getsize(file_path), unit='iB', unit_scale=True,
+              unit_divisor=1024, disable=not progress) as bar:
+        for attempt in range(retries + 1):
+            body = MultipartFile(file_path, file_field, fields, on_read=bar.update)
+            bar.reset(total=body.length)
+            started = time.monotonic()
+            try:
+                response = get_session(host).post(url, data=body, headers={'Content-Type': body.content_type},
+                                                  timeout=UPLOAD_TIMEOUT)
+                _check_auth(response)
+                if not _should_retry(response) or attempt == retries:
+                    response.raise_for_status()
+                    bytes_per_s = body.length / max(time.monotonic() - started, 1e-6)
+                    return parse_json(response), round(bytes_per_s)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == retries: raise
+            finally:
+                body.close()
+            tqdm.write(f" -> Upload {name} lên {host} lỗi, thử lại lần {attempt + 1}...", file=sys.stderr)
+            time.sleep(2 ** attempt)
+
+# --- CACHE TOKEN DÙNG CHUNG ---
+
+class TokenCache:
+    """
+    Cache token/phiên của các host theo key, có TTL, dùng chung giữa các luồng upload
+    (nhiều luồng cần cùng một key thì chỉ một luồng đăng nhập) và lưu xuống file để dùng lại ở lần chạy sau.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = None
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    def _load(self):
+        """Đọc file cache một lần (gọi khi đang giữ lock), bỏ các mục đã hết hạn."""
+        if self.entries is not None: return
+        self.entries = {}
+        if not self.path or not os.path.exists(self.path): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            now = time.time()
+            self.entries = {k: v for k, v in data.items() if v.get('expires_at', 0) > now}
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        if not self.path: return
+        tmp_path = self.path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    def _peek(self, key):
+        with self.lock:
+            self._load()
+            entry = self.entries.get(key)
+            if entry and entry['expires_at'] > time.time(): return entry['value']
+            return None
+
+    def get(self, key, fetch, ttl):
+        """Trả về giá trị còn hạn của key, hoặc gọi fetch() để lấy mới và lưu lại trong ttl giây."""
+        value = self._peek(key)
+        if value is not None: return value
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Luồng khác có thể vừa lấy xong trong lúc chờ
+            value = self._peek(key)
+            if value is not None: return value
+            value = fetch()
+            with self.lock:
+                self.entries[key] = {'value': value, 'expires_at': time.time() + ttl}
+                self._save()
+            return value
+
+    def invalidate(self, key, stale_value=None):
+        """Xoá key; nếu truyền stale_value thì chỉ xoá khi cache vẫn đang giữ đúng giá trị cũ đó."""
+        with self.lock:
+            self._load()
+            entry = self.entries.get(key)
+            if entry and (stale_value is None or entry['value'] == stale_value):
+                del self.entries[key]
+                self._save()
+
+token_cache = TokenCache(TOKEN_CACHE_FILE)
+
+def cache_key(host, *parts):
+    """Key cache không chứa thông tin đăng nhập ở dạng rõ."""
+    digest = hashlib.sha1('\0'.join(str(p) for p in parts).encode('utf-8')).hexdigest()[:16]
+    return f"{host}:{digest}"
+
+def with_token(key, fetch, use, ttl, refresh_on=(AuthError,)):
+    """
+    Gọi use(token) với token lấy từ cache (hoặc fetch() nếu chưa có/hết hạn).
+    Nếu host từ chối token (refresh_on), bỏ token cũ, lấy token mới và thử lại đúng một lần.
+    """
+    token = token_cache.get(key, fetch, ttl)
+    try:
+        return use(token)
+    except refresh_on:
+        token_cache.invalidate(key, token)
+        return use(token_cache.get(key, fetch, ttl))